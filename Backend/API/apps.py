@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'API'
+
+    def ready(self):
+        """Connects the receivers that keep the version stamps behind
+        the ETags in step with the models"""
+        from API import versions  # noqa
@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Pages through a list by the last key seen instead of an OFFSET,
+    so a deep page costs as little as the first"""
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
+
+class NewestFirstPagination(KeysetPagination):
+    ordering = '-id'
+
+
+class HistoryPagination(KeysetPagination):
+    ordering = '-result_id'
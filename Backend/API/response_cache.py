@@ -0,0 +1,174 @@
+"""A cache for computed response data, keyed by the version stamps of
+the data it was computed from.
+
+A key is the fragment's name, the generation of every version it
+depends on and its parameters, so bumping a version leaves the old
+entries unreachable rather than deleting them; they age out of a small
+LRU in each process and out of the shared Django cache by their timeout.
+
+When a key is missing only one caller computes it: other threads in the
+process wait on it, and other processes wait while a lock key added to
+the shared cache is held, up to `lock_seconds`, before giving up and
+computing it themselves."""
+from collections import Counter, OrderedDict
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from API import versions
+
+
+_MISSING = object()
+POLL_SECONDS = 0.01
+
+
+class LocalLRU:
+    """A bounded in-process map that evicts the least recently used
+    entry, with entries expiring after `timeout` seconds"""
+
+    def __init__(self, max_entries, timeout, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= self._clock():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache:
+    """Computes each (name, versions, parameters) fragment once and
+    serves it from the local LRU, then the shared cache, until one of
+    its versions is bumped"""
+
+    def __init__(self, cache_alias=None, local_entries=None, timeout=None,
+                 lock_seconds=5, clock=time.monotonic):
+        self._alias = cache_alias or settings.RESPONSE_CACHE
+        self.timeout = timeout or settings.RESPONSE_CACHE_SECONDS
+        self.lock_seconds = lock_seconds
+        self._clock = clock
+        self._local = LocalLRU(
+            local_entries or settings.RESPONSE_CACHE_LOCAL_ENTRIES,
+            self.timeout, clock)
+        self._lock = threading.Lock()
+        self._computing = {}
+        self._metrics = Counter()
+
+    @property
+    def _cache(self):
+        return caches[self._alias]
+
+    def metrics(self):
+        """Returns the hit, miss, compute and wait counts so far"""
+        with self._lock:
+            return dict(self._metrics)
+
+    def _count(self, metric):
+        with self._lock:
+            self._metrics[metric] += 1
+
+    def key(self, name, depends_on, parameters):
+        generations = ':'.join(
+            '%d' % versions.current(version)[0] for version in depends_on)
+        digest = hashlib.sha1(repr(parameters).encode()).hexdigest()
+        return 'response:%s:%s:%s' % (name, generations, digest)
+
+    def get_or_set(self, name, compute, depends_on=(), parameters=()):
+        """Returns the cached value of `compute()` for the current
+        versions of `depends_on` and the given parameters"""
+        key = self.key(name, depends_on, parameters)
+
+        value = self._local.get(key)
+        if value is not _MISSING:
+            self._count('local_hits')
+            return value
+        value = self._cache.get(key, _MISSING)
+        if value is not _MISSING:
+            self._count('hits')
+            self._local.set(key, value)
+            return value
+
+        self._count('misses')
+        return self._compute_once(key, compute)
+
+    def _compute_once(self, key, compute):
+        with self._lock:
+            done = self._computing.get(key)
+            leader = done is None
+            if leader:
+                done = self._computing[key] = threading.Event()
+
+        if not leader:
+            self._count('waits')
+            done.wait(self.lock_seconds)
+            value = self._local.get(key)
+            return compute() if value is _MISSING else value
+
+        try:
+            lock_key = key + ':lock'
+            locked = self._cache.add(lock_key, 1, self.lock_seconds)
+            try:
+                if not locked:
+                    self._count('waits')
+                    value = self._wait_for(key)
+                    if value is not _MISSING:
+                        self._local.set(key, value)
+                        return value
+
+                self._count('computes')
+                value = compute()
+                self._cache.set(key, value, self.timeout)
+                self._local.set(key, value)
+
+                return value
+            finally:
+                # Released even if compute raised, so other processes
+                # don't wait out lock_seconds for a value never coming
+                if locked:
+                    self._cache.delete(lock_key)
+        finally:
+            with self._lock:
+                del self._computing[key]
+            done.set()
+
+    def _wait_for(self, key):
+        deadline = self._clock() + self.lock_seconds
+        while self._clock() < deadline:
+            time.sleep(POLL_SECONDS)
+            value = self._cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+        return _MISSING
+
+    def clear_local(self):
+        self._local.clear()
+
+
+response_cache = ResponseCache()
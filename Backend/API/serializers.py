@@ -0,0 +1,32 @@
+from rest_framework import serializers
+
+from Database.models import Answers, Games, Placements, Questions
+
+
+class AnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Answers
+        fields = ['correct_answer', 'incorrect_answer', 'incorrect_answer2',
+                  'incorrect_answer3']
+
+
+class QuestionSerializer(serializers.ModelSerializer):
+    answers = AnswerSerializer(many=True, source='answers_set')
+
+    class Meta:
+        model = Questions
+        fields = ['id', 'category', 'difficulty', 'question_type', 'text',
+                  'answers']
+
+
+class GameSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Games
+        fields = ['id', 'category', 'number_of_questions',
+                  'number_of_players', 'start_time', 'created_by', 'winner']
+
+
+class PlacementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Placements
+        fields = ['result', 'position']
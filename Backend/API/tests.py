@@ -1,3 +1,544 @@
-from django.test import TestCase
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from decimal import Decimal
+import csv
+from importlib import import_module
+import io
+import json
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+from API import versions
+from API.response_cache import LocalLRU, ResponseCache
+from Database.avatars import AvatarProcessor, digest, render
+from Database.games import Standing
+from Database.leaderboard import Leaderboards
+from Database.matchmaking import Matchmaker
+from Database.models import Questions, Answers, Games, Placements, \
+    Practice, Ratings, Results, UserAnswers, UserCategoryStats, UserScores
+from Database.signals import rows_changed
+
+
+class CatalogTests(TestCase):
+    """Tests to be performed on the read-only catalog endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        for number in range(5):
+            question = Questions.objects.create(
+                category='history' if number % 2 else 'science',
+                difficulty='easy', question_type='multiple',
+                text='Question %d' % number)
+            Answers.objects.create(
+                question=question, correct_answer='right',
+                incorrect_answer='x', incorrect_answer2='y',
+                incorrect_answer3='z')
+
+    def test_questions_paginated_by_cursor(self):
+        """Test that following the next links returns every question
+        once, in order, with its answers"""
+        url = reverse('question-list') + '?page_size=2'
+        seen = []
+        while url:
+            page = self.client.get(url).json()
+            seen.extend(question['id'] for question in page['results'])
+            url = page['next']
+
+        self.assertEqual(seen, list(Questions.objects.order_by('id')
+                                    .values_list('id', flat=True)))
+        first = self.client.get(reverse('question-list')).json()
+        self.assertEqual(first['results'][0]['answers'][0]['correct_answer'],
+                         'right')
+
+    def test_questions_filtered(self):
+        """Test that the query parameters filter the questions"""
+        page = self.client.get(reverse('question-list'),
+                               {'category': 'history'}).json()
+
+        self.assertEqual(len(page['results']), 2)
+
+    def test_conditional_get(self):
+        """Test that a matching ETag or Last-Modified gets a 304 without
+        running a query, and that a change gives a new ETag"""
+        url = reverse('question-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        ).status_code, 304)
+        self.assertNotEqual(
+            self.client.get(url + '?page_size=1')['ETag'], etag)
+
+        Questions.objects.filter(text='Question 0').update(text='Changed')
+        rows_changed.send(sender=Questions)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_user_history(self):
+        """Test that a user's placements are listed newest first and a
+        new result changes the history ETag"""
+        users = [get_user_model().objects.create_user(
+            username='Historian%d' % number,
+            email='historian%d@gmail.com' % number,
+        ) for number in range(2)]
+        Games.objects.create(number_of_questions=1, number_of_players=2,
+                             category='history', created_by=users[0])
+        first = Results.objects.create(winner=users[0],
+                                       second_place=users[1])
+        url = reverse('user-history', args=[users[1].id])
+        etag = self.client.get(url)['ETag']
+
+        second = Results.objects.create(winner=users[1],
+                                        second_place=users[0])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(placement['result'], placement['position'])
+             for placement in response.json()['results']],
+            [(second.id, 1), (first.id, 2)])
+        self.assertEqual(
+            len(self.client.get(reverse('game-list')).json()['results']), 1)
+
+
+class ResponseCacheTests(TestCase):
+    """Tests to be performed on the versioned response cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.responses = ResponseCache(local_entries=10, lock_seconds=1)
+        self.calls = []
+
+    def compute(self, value='value', delay=0):
+        def compute():
+            time.sleep(delay)
+            self.calls.append(value)
+            return value
+        return compute
+
+    def test_bumped_version_recomputes(self):
+        """Test that a value is computed once per version and parameters
+        and served from the local LRU, then the shared cache"""
+        for _ in range(3):
+            self.assertEqual(self.responses.get_or_set(
+                'fragment', self.compute(), ('questions',), (1,)), 'value')
+        self.responses.clear_local()
+        self.responses.get_or_set('fragment', self.compute(),
+                                  ('questions',), (1,))
+        self.responses.get_or_set('fragment', self.compute(),
+                                  ('questions',), (2,))
+        versions.bump('questions')
+        self.responses.get_or_set('fragment', self.compute(),
+                                  ('questions',), (1,))
+
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual(self.responses.metrics(), {
+            'local_hits': 2, 'hits': 1, 'misses': 3, 'computes': 3})
+
+    def test_local_lru_evicts_least_recently_used(self):
+        """Test that the local map keeps the most recently used entries
+        and expires entries after the timeout"""
+        now = [0]
+        local = LocalLRU(2, timeout=10, clock=lambda: now[0])
+        local.set('a', 1)
+        local.set('b', 2)
+        local.get('a')
+        local.set('c', 3)
+
+        self.assertEqual(local.get('a'), 1)
+        self.assertIsNot(local.get('b'), 2)
+        now[0] = 10
+        self.assertIsNot(local.get('c'), 3)
+        self.assertEqual(len(local), 1)
+
+    def test_concurrent_misses_compute_once(self):
+        """Test that threads missing the same key wait for one of them
+        to compute it"""
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.responses.get_or_set('slow', self.compute(delay=0.1))))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(self.calls, ['value'])
+
+    def test_waits_for_another_process(self):
+        """Test that a key locked in the shared cache is waited for
+        rather than computed again"""
+        key = self.responses.key('shared', (), ())
+        cache.add(key + ':lock', 1)
+        threading.Timer(0.05, cache.set, (key, 'theirs')).start()
+
+        self.assertEqual(self.responses.get_or_set(
+            'shared', self.compute('ours')), 'theirs')
+        self.assertEqual(self.calls, [])
+
+    def test_failed_compute_releases_lock(self):
+        """Test that the shared lock is released when computing fails"""
+        def fail():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            self.responses.get_or_set('failing', fail)
+
+        self.assertIsNone(cache.get(
+            self.responses.key('failing', (), ()) + ':lock'))
+
+    def test_category_counts_cached(self):
+        """Test that category counts are served without a query until a
+        question is added"""
+        for difficulty in ('easy', 'easy', 'hard'):
+            Questions.objects.create(category='science',
+                                     difficulty=difficulty,
+                                     question_type='multiple', text='?')
+        url = reverse('category-list')
+
+        self.assertEqual(self.client.get(url).json(), [{
+            'category': 'science', 'count': 3,
+            'difficulties': {'easy': 2, 'hard': 1}}])
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        Questions.objects.create(category='art', difficulty='easy',
+                                 question_type='multiple', text='?')
+        self.assertEqual(len(self.client.get(url).json()), 2)
+
+    def test_leaderboard_page(self):
+        """Test that a leaderboard page has ranks and usernames, and an
+        unknown window is not found"""
+        users = [get_user_model().objects.create_user(
+            username='Leader%d' % number,
+            email='leader%d@gmail.com' % number,
+        ) for number in range(2)]
+        boards = Leaderboards(today=lambda: date(2020, 7, 16))
+        boards.record_game('history', [
+            Standing(users[1].id, 5, Decimal('1.000')),
+            Standing(users[0].id, 2, Decimal('0.000')),
+        ])
+
+        with mock.patch('API.views.leaderboards', boards):
+            page = self.client.get(
+                reverse('leaderboard', args=['history', 'weekly']),
+                {'count': 1, 'offset': 1}).json()
+            missing = self.client.get(
+                reverse('leaderboard', args=['history', 'monthly']))
+
+        self.assertEqual(page['results'], [{
+            'rank': 2, 'user': users[0].id, 'username': 'Leader0',
+            'score': 2.0, 'wins': 0}])
+        self.assertEqual(missing.status_code, 404)
+
+    def test_leaderboard_page_follows_period(self):
+        """Test that a cached page and its ETag are not served once its
+        period is over"""
+        user = get_user_model().objects.create_user(
+            username='Leader', email='leader@gmail.com')
+        today = [date(2020, 7, 16)]
+        boards = Leaderboards(today=lambda: today[0])
+        boards.record_game('history', [Standing(user.id, 5, Decimal(0))])
+        url = reverse('leaderboard', args=['history', 'weekly'])
+
+        with mock.patch('API.views.leaderboards', boards):
+            first = self.client.get(url)
+            today[0] = date(2020, 7, 20)
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(len(first.json()['results']), 1)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['results'], [])
+
+
+def image_bytes(size):
+    output = io.BytesIO()
+    Image.new('RGBA', size, 'red').save(output, 'PNG')
+    return output.getvalue()
+
+
+class AvatarTests(TransactionTestCase):
+    """Tests to be performed on avatar uploads and their variants"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.processor = AvatarProcessor(
+            workers=1, sizes=(16, 48),
+            storage=FileSystemStorage(self.directory.name))
+        patcher = mock.patch('API.views.avatar_processor', self.processor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users = [get_user_model().objects.create_user(
+            username='Avatar%d' % number, email='avatar%d@gmail.com' % number,
+        ) for number in range(2)]
+        self.client = APIClient()
+
+    def upload(self, user, data):
+        self.client.force_authenticate(user)
+        return self.client.post(
+            reverse('user-avatar', args=[user.id]),
+            {'avatar': SimpleUploadedFile('avatar.png', data)})
+
+    def test_upload_rendered_and_served(self):
+        """Test that an upload is rendered in the background, becomes the
+        user's avatar and is served with immutable caching"""
+        response = self.upload(self.users[0], image_bytes((300, 200)))
+        self.processor.shutdown()
+
+        self.assertEqual(response.status_code, 202)
+        avatar_hash = response.json()['avatar']
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].avatar_hash, avatar_hash)
+        variant = self.client.get(response.json()['urls']['48'])
+        self.assertEqual(variant['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', variant['Cache-Control'])
+        image = Image.open(io.BytesIO(b''.join(variant.streaming_content)))
+        self.assertEqual((image.format, image.size), ('JPEG', (48, 48)))
+        self.assertEqual(self.client.get(
+            reverse('avatar', args=[avatar_hash, 20])).status_code, 404)
+
+    def test_broken_pool_replaced(self):
+        """Test that a pool broken by a dead worker is replaced, and an
+        upload that can't be submitted isn't left waiting"""
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool
+        self.processor._pool = broken
+        response = self.upload(self.users[0], image_bytes((32, 32)))
+        self.processor.shutdown()
+
+        self.assertEqual(response.status_code, 202)
+        broken.shutdown.assert_called_once_with(wait=False)
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].avatar_hash, response.json()['avatar'])
+
+        with mock.patch.object(self.processor, '_executor') as executor:
+            executor.return_value.submit.side_effect = RuntimeError
+            with self.assertRaises(RuntimeError):
+                self.processor.process(self.users[1].id,
+                                       image_bytes((20, 20)))
+        self.assertEqual(self.processor._waiting, {})
+
+    def test_uploaded_avatars_kept_by_migration(self):
+        """Test that the avatar_hash migration stores the variants of
+        avatars uploaded before it and skips unreadable ones"""
+        migration = import_module(
+            'Database.migrations.0020_customuser_avatar_hash')
+        data = image_bytes((40, 30))
+        users = [mock.Mock(id=number) for number in range(2)]
+        users[0].avatar.open.return_value = io.BytesIO(data)
+        users[1].avatar.open.return_value = io.BytesIO(b'not an image')
+        model = mock.Mock()
+        model.objects.exclude.return_value.exclude.return_value.only \
+            .return_value.iterator.return_value = users
+        apps = mock.Mock(get_model=mock.Mock(return_value=model))
+
+        with mock.patch.object(migration, 'default_storage',
+                               self.processor.storage), \
+                self.settings(AVATAR_SIZES=self.processor.sizes), \
+                self.assertLogs(migration.logger, 'WARNING'):
+            migration.hash_avatars(apps, None)
+
+        avatar_hash = digest(data)
+        self.assertTrue(self.processor.stored(avatar_hash))
+        model.objects.filter.assert_called_once_with(pk=users[0].pk)
+        model.objects.filter.return_value.update.assert_called_once_with(
+            avatar_hash=avatar_hash)
+
+    def test_same_upload_stored_once(self):
+        """Test that an image already stored is assigned without being
+        rendered again, and users can only set their own avatar"""
+        data = image_bytes((64, 64))
+        first = self.upload(self.users[0], data)
+        self.processor.shutdown()
+        with mock.patch.object(self.processor, '_executor') as executor:
+            second = self.upload(self.users[1], data)
+        forbidden = self.client.post(
+            reverse('user-avatar', args=[self.users[0].id]),
+            {'avatar': SimpleUploadedFile('avatar.png', data)})
+
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['avatar'], first.json()['avatar'])
+        executor.assert_not_called()
+        self.users[1].refresh_from_db()
+        self.assertEqual(self.users[1].avatar_hash, first.json()['avatar'])
+        self.assertEqual(forbidden.status_code, 403)
+
+    def test_render(self):
+        """Test that variants are turned upright, cropped square and
+        saved without metadata, and oversized images are refused"""
+        # Red on the left and blue on the right, to be shown rotated a
+        # quarter turn clockwise, so red on top
+        upload = Image.new('RGB', (120, 60), 'red')
+        upload.paste('blue', (60, 0, 120, 60))
+        exif = upload.getexif()
+        exif[0x0112] = 6
+        output = io.BytesIO()
+        upload.save(output, 'JPEG', exif=exif.tobytes())
+        variants = render(output.getvalue(), (8, 30))
+
+        self.assertEqual(sorted(variants), [8, 30])
+        image = Image.open(io.BytesIO(variants[30]))
+        self.assertEqual(image.size, (30, 30))
+        self.assertNotIn('exif', image.info)
+        top, bottom = image.getpixel((15, 2)), image.getpixel((15, 27))
+        self.assertGreater(top[0], top[2])
+        self.assertGreater(bottom[2], bottom[0])
+        with self.assertRaises(ValueError):
+            render(image_bytes((120, 60)), (8,), max_pixels=100)
+
+
+class HistoryExportTests(TestCase):
+    """Tests to be performed on the streamed export of a user's history"""
+
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(
+            username='Export%d' % number, email='export%d@gmail.com' % number,
+        ) for number in range(2)]
+        result = Results.objects.create(winner=self.users[1],
+                                        second_place=self.users[0])
+        Placements.objects.sync(result)
+        self.game = Games.objects.create(
+            number_of_questions=10, number_of_players=2, category='art',
+            created_by=self.users[0], winner=result)
+        UserScores.objects.create(
+            user=self.users[0], base_score=3, bonus_score=0, total_score=3,
+            time_taken_seconds='60.000')
+        Practice.objects.create(user=self.users[0], score=4,
+                                time_taken_seconds='30.000')
+        question = Questions.objects.create(
+            category='art', difficulty='easy', question_type='multiple',
+            text='?')
+        UserAnswers.objects.create(user=self.users[0], question=question,
+                                   result='correct', count_correct=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def test_ndjson(self):
+        """Test that every record of the user's play is streamed as a line
+        of JSON"""
+        response = self.client.get(reverse('user-history-export',
+                                           args=[self.users[0].id, 'ndjson']))
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        records = [json.loads(line) for line in b''.join(
+            response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['record'] for record in records],
+                         ['game', 'score', 'practice', 'answer'])
+        self.assertEqual(records[0]['game'], self.game.id)
+        self.assertEqual(records[0]['position'], 2)
+        self.assertEqual(records[1]['base_score'], 3)
+        self.assertEqual(records[3]['count_correct'], 2)
+
+    def test_csv_and_permissions(self):
+        """Test that the CSV has a row per record under one header, and
+        only the user or staff may export it"""
+        response = self.client.get(reverse('user-history-export',
+                                           args=[self.users[0].id, 'csv']))
+        forbidden = self.client.get(reverse('user-history-export',
+                                            args=[self.users[1].id, 'csv']))
+        unknown = self.client.get(reverse('user-history-export',
+                                          args=[self.users[0].id, 'xml']))
+
+        rows = list(csv.DictReader(io.StringIO(b''.join(
+            response.streaming_content).decode())))
+        self.assertEqual([row['record'] for row in rows],
+                         ['game', 'score', 'practice', 'answer'])
+        self.assertEqual(rows[0]['category'], 'art')
+        self.assertEqual(rows[1]['bonus_score'], '0.000')
+        self.assertEqual(rows[2]['game'], '')
+        self.assertEqual(forbidden.status_code, 403)
+        self.assertEqual(unknown.status_code, 404)
+
+
+class UserStatsTests(TestCase):
+    """Tests to be performed on a user's statistics"""
+
+    def test_stats(self):
+        """Test that a user's totals are read from the statistics tables
+        and an unknown user is not found"""
+        user = get_user_model().objects.create_user(
+            username='Counted', email='counted@gmail.com')
+        Practice.objects.create(user=user, score=8,
+                                time_taken_seconds='20.000')
+        question = Questions.objects.create(
+            category='art', difficulty='easy', question_type='multiple',
+            text='?')
+        UserCategoryStats.objects.create(user=user, category='art',
+                                         correct=3, incorrect=1)
+        Ratings.objects.create(user=user, rating=1532.5, games=1)
+
+        with self.assertNumQueries(3):
+            stats = self.client.get(reverse('user-stats',
+                                            args=[user.id])).json()
+        missing = self.client.get(reverse('user-stats', args=[user.id + 1]))
+
+        self.assertEqual((stats['practice_played'],
+                          stats['best_practice_score'],
+                          stats['average_position'], stats['rating']),
+                         (1, 8, None, 1532.5))
+        self.assertEqual(stats['categories'], [{
+            'category': question.category, 'games_played': 0, 'wins': 0,
+            'correct': 3, 'incorrect': 1, 'accuracy': 0.75}])
+        self.assertEqual(missing.status_code, 404)
+
+
+class MatchmakingTests(TestCase):
+    """Tests to be performed on the matchmaking endpoint"""
+
+    def setUp(self):
+        self.matchmaker = Matchmaker()
+        patcher = mock.patch('API.views.matchmaker', self.matchmaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users = [get_user_model().objects.create_user(
+            username='Match%d' % number, email='match%d@gmail.com' % number,
+        ) for number in range(2)]
+        self.client = APIClient()
+
+    def test_join_wait_and_match(self):
+        """Test that a signed in player waits in the queue until a second
+        player fills the room, and both are told its game"""
+        url = reverse('matchmaking')
+        Ratings.objects.create(user=self.users[0], rating=1540)
+        self.assertEqual(self.client.post(url, {
+            'category': 'art', 'players': 2}).status_code, 403)
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.post(url, {
+            'category': 'art', 'players': 9}).status_code, 400)
+        self.assertEqual(self.client.post(url, {
+            'category': 'art', 'players': 2}).status_code, 202)
+        self.assertEqual(self.client.get(url).status_code, 202)
+        self.assertEqual(self.matchmaker.poll(self.users[0].id), None)
+        self.assertEqual(self.matchmaker._tickets[self.users[0].id].skill,
+                         1540)
+
+        self.client.force_authenticate(self.users[1])
+        response = self.client.post(url, {'category': 'art', 'players': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['players'],
+                         [self.users[0].id, self.users[1].id])
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get(url).json(), response.json())
+        self.assertTrue(Games.objects.filter(
+            id=response.json()['game'], number_of_players=2).exists())
@@ -0,0 +1,23 @@
+from django.urls import path
+
+from API import views
+
+
+urlpatterns = [
+    path('questions/', views.QuestionList.as_view(), name='question-list'),
+    path('categories/', views.CategoryList.as_view(), name='category-list'),
+    path('leaderboards/<str:category>/<str:window>/',
+         views.LeaderboardPage.as_view(), name='leaderboard'),
+    path('games/', views.GameList.as_view(), name='game-list'),
+    path('matchmaking/', views.Matchmaking.as_view(), name='matchmaking'),
+    path('users/<int:user_id>/history/', views.UserHistory.as_view(),
+         name='user-history'),
+    path('users/<int:user_id>/history.<str:export_format>',
+         views.UserHistoryExport.as_view(), name='user-history-export'),
+    path('users/<int:user_id>/stats/', views.UserStatsView.as_view(),
+         name='user-stats'),
+    path('users/<int:user_id>/avatar/', views.UserAvatar.as_view(),
+         name='user-avatar'),
+    path('avatars/<str:avatar_hash>/<int:size>/',
+         views.AvatarVariant.as_view(), name='avatar'),
+]
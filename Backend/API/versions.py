@@ -0,0 +1,58 @@
+"""Version stamps for the data each endpoint serves.
+
+Saving, deleting or bulk writing a model that an endpoint reads gives
+the endpoint a new stamp in the cache, so its ETag and Last-Modified
+come from one cache read instead of a query over the rows."""
+import random
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from Database.signals import rows_changed
+
+
+DEPENDENCIES = {
+    'questions': ('Database.Questions', 'Database.Answers'),
+    'games': ('Database.Games',),
+    'history': ('Database.Results', 'Database.Placements'),
+    'leaderboards': ('Database.LeaderboardEntries',),
+}
+
+_names_by_model = {}
+for _name, _labels in DEPENDENCIES.items():
+    for _label in _labels:
+        _names_by_model.setdefault(_label, []).append(_name)
+
+
+def _key(name):
+    return 'api_version:%s' % name
+
+
+def _new_version():
+    # A random generation rather than a counter, so a stamp evicted from
+    # the cache never comes back with a value a client already holds
+    return random.getrandbits(48), timezone.now().replace(microsecond=0)
+
+
+def current(name):
+    """Returns the (generation, last modified) stamp for `name`"""
+    version = cache.get(_key(name))
+    if version is None:
+        cache.add(_key(name), _new_version(), timeout=None)
+        version = cache.get(_key(name))
+
+    return version
+
+
+def bump(name):
+    cache.set(_key(name), _new_version(), timeout=None)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+@receiver(rows_changed)
+def bump_dependent_versions(sender, **kwargs):
+    for name in _names_by_model.get(sender._meta.label, ()):
+        bump(name)
@@ -1,3 +1,337 @@
-from django.shortcuts import render
+from calendar import timegm
+from collections import OrderedDict
+import hashlib
 
-# Create your views here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import generics, status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from API import versions
+from API.pagination import HistoryPagination, NewestFirstPagination
+from API.response_cache import response_cache
+from API.serializers import GameSerializer, PlacementSerializer, \
+    QuestionSerializer
+from Database.avatars import CONTENT_TYPE, avatar_processor, is_hash, \
+    variant_name
+from Database.history_export import FORMATS, export
+from Database.leaderboard import ALL_CATEGORIES, WINDOWS, leaderboards
+from Database.matchmaking import ROOM_SIZES, matchmaker
+from Database.models import Games, Placements, Questions, \
+    UserCategoryStats, UserStats
+from Database.ratings import rating_of
+
+
+class ConditionalMixin:
+    """Gives a read-only view an ETag and Last-Modified from its
+    `version` stamp, so a conditional GET that still matches is answered
+    with 304 before anything is queried or serialized"""
+    version = None
+
+    def conditional(self, request, respond, variant=()):
+        """Answers with `respond()` unless the request's validators match
+        the version, the path and `variant`, anything else the response
+        depends on"""
+        generation, modified = versions.current(self.version)
+        etag = '"%s"' % hashlib.sha1(('%d:%s:%r' % (
+            generation, request.get_full_path(), variant)).encode()
+        ).hexdigest()
+        last_modified = timegm(modified.utctimetuple())
+
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is None:
+            response = respond()
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'no-cache'
+
+        return response
+
+
+class ConditionalListView(ConditionalMixin, generics.ListAPIView):
+    """A read-only list answered conditionally on its `version`"""
+
+    def get(self, request, *args, **kwargs):
+        return self.conditional(request, lambda: super(
+            ConditionalListView, self).get(request, *args, **kwargs))
+
+
+class CachedView(ConditionalMixin, APIView):
+    """A read-only view answered by `cached`, whose data is computed once
+    per version of the data and query, and then served from the
+    response cache until the version is bumped"""
+
+    def cached(self, request, compute, parameters=()):
+        """Answers with the data `compute()` returns, keyed by the query
+        and `parameters`, which must hold everything else it depends on"""
+        def respond():
+            return Response(response_cache.get_or_set(
+                type(self).__name__, compute,
+                depends_on=(self.version,),
+                parameters=(parameters,
+                            sorted(request.query_params.lists())),
+            ))
+
+        return self.conditional(request, respond, parameters)
+
+
+class QuestionList(ConditionalListView):
+    """Questions with their answers, filtered by the category,
+    difficulty and question_type query parameters"""
+    serializer_class = QuestionSerializer
+    version = 'questions'
+
+    def get_queryset(self):
+        questions = Questions.objects.prefetch_related('answers_set')
+        for field in ('category', 'difficulty', 'question_type'):
+            value = self.request.query_params.get(field)
+            if value:
+                questions = questions.filter(**{field: value})
+
+        return questions
+
+
+class GameList(ConditionalListView):
+    """Games, newest first, filtered by the category query parameter"""
+    serializer_class = GameSerializer
+    pagination_class = NewestFirstPagination
+    version = 'games'
+
+    def get_queryset(self):
+        games = Games.objects.all()
+        category = self.request.query_params.get('category')
+        if category:
+            games = games.filter(category=category)
+
+        return games
+
+
+class UserHistory(ConditionalListView):
+    """Where a user placed in each of their games, newest first"""
+    serializer_class = PlacementSerializer
+    pagination_class = HistoryPagination
+    version = 'history'
+
+    def get_queryset(self):
+        return Placements.objects.history(self.kwargs['user_id'])
+
+
+class UserHistoryExport(APIView):
+    """Streams everything recorded about a user's play as NDJSON or CSV,
+    to the user or a superuser"""
+
+    def get(self, request, user_id, export_format):
+        if export_format not in FORMATS:
+            raise Http404
+        if request.user.pk != user_id and \
+                not request.user.is_superuser:
+            raise PermissionDenied
+
+        response = StreamingHttpResponse(
+            export(user_id, export_format),
+            content_type=FORMATS[export_format])
+        response['Content-Disposition'] = \
+            'attachment; filename="history-%d.%s"' % (user_id, export_format)
+
+        return response
+
+
+class UserStatsView(APIView):
+    """A user's totals, overall and per category, read from the tables
+    kept up to date as games finish rather than aggregated per request"""
+
+    def get(self, request, user_id):
+        stats = UserStats.objects.filter(user_id=user_id).first()
+        if stats is None:
+            if not get_user_model().objects.filter(id=user_id).exists():
+                raise Http404
+            stats = UserStats(user_id=user_id)
+
+        return Response({
+            'user': user_id,
+            'rating': rating_of(user_id),
+            'games_played': stats.games_played,
+            'wins': stats.wins,
+            'average_position': stats.average_position,
+            'practice_played': stats.practice_played,
+            'best_practice_score': stats.best_practice_score,
+            'categories': [
+                {'category': category.category,
+                 'games_played': category.games_played,
+                 'wins': category.wins, 'correct': category.correct,
+                 'incorrect': category.incorrect,
+                 'accuracy': category.accuracy}
+                for category in UserCategoryStats.objects.filter(
+                    user_id=user_id).order_by('category')
+            ],
+        })
+
+
+class CategoryList(CachedView):
+    """Each category with its number of questions, in total and per
+    difficulty"""
+    version = 'questions'
+
+    def get(self, request):
+        return self.cached(request, self.categories)
+
+    def categories(self):
+        counts = Questions.objects.values('category', 'difficulty') \
+            .annotate(count=Count('id')).order_by('category', 'difficulty')
+        categories = OrderedDict()
+        for row in counts:
+            category = categories.setdefault(row['category'], {
+                'category': row['category'], 'count': 0,
+                'difficulties': {}})
+            category['count'] += row['count']
+            category['difficulties'][row['difficulty']] = row['count']
+
+        return list(categories.values())
+
+
+class LeaderboardPage(CachedView):
+    """A page of a category's leaderboard for a window, ranked from
+    `offset`, with each player's username"""
+    version = 'leaderboards'
+    max_count = 100
+
+    def get(self, request, category, window):
+        if window not in WINDOWS or category != ALL_CATEGORIES and \
+                category not in dict(Games.CATEGORY):
+            raise Http404
+        try:
+            offset = max(0, int(request.query_params.get('offset', 0)))
+            count = min(self.max_count, max(1, int(
+                request.query_params.get('count', self.max_count))))
+        except ValueError:
+            offset, count = 0, self.max_count
+
+        # A new period starts an empty board without bumping the version
+        return self.cached(
+            request, lambda: self.page(category, window, count, offset),
+            (category, window, leaderboards.current_period(window)))
+
+    def page(self, category, window, count, offset):
+        rows = leaderboards.top(category, window, count, offset)
+        usernames = dict(get_user_model().objects.filter(
+            id__in=[row[1] for row in rows],
+        ).values_list('id', 'username'))
+
+        return {
+            'category': category,
+            'window': window,
+            'results': [
+                {'rank': rank, 'user': user_id,
+                 'username': usernames.get(user_id), 'score': score,
+                 'wins': wins}
+                for rank, user_id, score, wins in rows
+            ],
+        }
+
+
+class UserAvatar(APIView):
+    """Takes a user's avatar as the multipart `avatar` file. The upload
+    is rendered in the background, so the response, 202 until the
+    avatar is ready, lists the URLs it will be served from"""
+
+    def post(self, request, user_id):
+        if request.user.pk != user_id:
+            raise PermissionDenied
+        upload = request.FILES.get('avatar')
+        if upload is None:
+            raise ValidationError({'avatar': 'No file was uploaded'})
+        if upload.size > settings.AVATAR_MAX_BYTES:
+            raise ValidationError({'avatar': 'The file is larger than '
+                                             '%d bytes' %
+                                             settings.AVATAR_MAX_BYTES})
+
+        avatar_hash, done = avatar_processor.process(user_id, upload.read())
+        if done.done() and done.exception() is not None:
+            raise ValidationError({'avatar': 'The file could not be read '
+                                             'as an image'})
+
+        return Response({
+            'avatar': avatar_hash,
+            'urls': {
+                size: request.build_absolute_uri(reverse(
+                    'avatar', args=(avatar_hash, size)))
+                for size in avatar_processor.sizes
+            },
+        }, status=status.HTTP_200_OK if done.done()
+            else status.HTTP_202_ACCEPTED)
+
+
+class AvatarVariant(APIView):
+    """An avatar at one of the sizes. Its URL names the content, so it
+    may be cached for good"""
+
+    def get(self, request, avatar_hash, size):
+        if not is_hash(avatar_hash) or size not in avatar_processor.sizes:
+            raise Http404
+        try:
+            variant = avatar_processor.storage.open(
+                variant_name(avatar_hash, size))
+        except FileNotFoundError:
+            raise Http404
+
+        response = FileResponse(variant, content_type=CONTENT_TYPE)
+        response['ETag'] = '"%s-%d"' % (avatar_hash, size)
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+
+        return response
+
+
+class Matchmaking(APIView):
+    """The signed in user's place in the matchmaking queues. POST joins
+    the queue for a `category` and number of `players` at the user's
+    rating, GET asks whether a room has filled and DELETE leaves the
+    queue. A room answers 200 with its game, a player still waiting
+    202. The queues are kept in the memory of the process serving the
+    request, so the API must be served by a single process for players
+    to be matched with each other"""
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def respond(room):
+        if room is None:
+            return Response({'waiting': True},
+                            status=status.HTTP_202_ACCEPTED)
+        return Response({'game': room.game_id, 'category': room.category,
+                         'players': room.user_ids})
+
+    def post(self, request):
+        category = request.data.get('category')
+        if category not in dict(Games.CATEGORY):
+            raise ValidationError({'category': 'Unknown category'})
+        try:
+            players = int(request.data.get('players'))
+        except (TypeError, ValueError):
+            players = None
+        if players not in ROOM_SIZES:
+            raise ValidationError({'players': 'Rooms hold %d to %d '
+                                              'players' % (ROOM_SIZES[0],
+                                                           ROOM_SIZES[-1])})
+
+        return self.respond(matchmaker.join(request.user.pk, category,
+                                            players,
+                                            rating_of(request.user.pk)))
+
+    def get(self, request):
+        try:
+            return self.respond(matchmaker.poll(request.user.pk))
+        except KeyError:
+            raise Http404
+
+    def delete(self, request):
+        if not matchmaker.leave(request.user.pk):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
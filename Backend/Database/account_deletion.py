@@ -0,0 +1,92 @@
+"""Deletes user accounts in bulk.
+
+Deleting users one at a time through the ORM collector looks up the
+sentinel user for every SET(get_sentinel_user) reference and loads the
+rows it reassigns. Here the sentinel is looked up once, references are
+moved to it with one UPDATE per column per chunk of users, and the rows
+that cascade are deleted in bounded batches, each committed on its own,
+before the users themselves. A run that is interrupted can be repeated."""
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+
+from Database.models import get_sentinel_user
+from Database.signals import rows_changed
+
+
+CHUNK_SIZE = 500
+BATCH_SIZE = 5000
+
+
+def _uses_sentinel(on_delete):
+    deconstruct = getattr(on_delete, 'deconstruct', None)
+    return deconstruct is not None and \
+        deconstruct()[1] == (get_sentinel_user,)
+
+
+def user_references():
+    """Returns the (model, field name) pairs pointing at the user model,
+    split into those moved to the sentinel user and those deleted with
+    the user"""
+    reassigned, cascaded = [], []
+    for relation in get_user_model()._meta.get_fields(include_hidden=True):
+        if not relation.auto_created or relation.concrete or \
+                not (relation.one_to_many or relation.one_to_one):
+            continue
+
+        reference = (relation.related_model, relation.field.name)
+        if _uses_sentinel(relation.on_delete):
+            reassigned.append(reference)
+        elif relation.on_delete is models.CASCADE:
+            cascaded.append(reference)
+
+    return reassigned, cascaded
+
+
+def _delete_in_batches(model, field, user_ids, batch_size):
+    deleted = 0
+    rows = model._base_manager.filter(**{'%s__in' % field: user_ids}) \
+        .order_by().values_list('pk', flat=True)
+    while True:
+        primary_keys = list(rows[:batch_size])
+        if not primary_keys:
+            return deleted
+        with transaction.atomic():
+            model._base_manager.filter(pk__in=primary_keys).delete()
+        deleted += len(primary_keys)
+
+
+def delete_users(user_ids, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    """Deletes the given users, never the sentinel user, and returns how
+    many rows were reassigned, cascaded and deleted"""
+    user_model = get_user_model()
+    sentinel_id = get_sentinel_user().pk
+    user_ids = [user_id for user_id in user_ids if user_id != sentinel_id]
+    reassigned, cascaded = user_references()
+    counts = {'reassigned': 0, 'cascaded': 0, 'users': 0}
+
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+
+        for model, field in reassigned:
+            with transaction.atomic():
+                counts['reassigned'] += model._base_manager.filter(
+                    **{'%s__in' % field: chunk}).update(**{field: sentinel_id})
+
+        for model, field in cascaded:
+            counts['cascaded'] += _delete_in_batches(model, field, chunk,
+                                                     batch_size)
+
+        # Nothing refers to these users any more, so the collector only
+        # has to check that and delete them
+        with transaction.atomic():
+            _, deleted = user_model._base_manager.filter(
+                pk__in=chunk).delete()
+        counts['users'] += deleted.get(user_model._meta.label, 0)
+
+    # Moving rows to the sentinel user is a plain UPDATE, which sends no
+    # signals, so say which tables changed
+    if user_ids:
+        for model, _ in reassigned:
+            rows_changed.send(sender=model)
+
+    return counts
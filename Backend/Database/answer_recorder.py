@@ -0,0 +1,151 @@
+"""Write-behind buffering for UserAnswers.
+
+Answers are collected in memory while a game is played and written as
+one batched upsert per flush, with the correct/incorrect counters added
+to by the database rather than read, modified and saved row by row.
+
+A flush inside a larger transaction goes through flushing(), which
+the caller wraps around that transaction so the answers are buffered
+again if it rolls back."""
+import atexit
+from contextlib import contextmanager
+from functools import partial
+import logging
+import threading
+import time
+import weakref
+
+from django.db import transaction
+from django.utils import timezone
+
+from Database import user_stats
+from Database.answered_questions import answered_questions
+from Database.bulk import upsert
+from Database.models import UserAnswers
+
+
+logger = logging.getLogger(__name__)
+
+MAX_EVENTS = 500
+MAX_AGE_SECONDS = 5.0
+
+_recorders = weakref.WeakSet()
+
+
+class AnswerRecorder:
+    """Buffers one game's answers until `max_events` have been recorded
+    or the oldest is `max_age` seconds old. Every live recorder is
+    flushed when the process shuts down"""
+
+    def __init__(self, max_events=MAX_EVENTS, max_age=MAX_AGE_SECONDS,
+                 clock=time.monotonic):
+        self.max_events = max_events
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._events = 0
+        self._oldest = None
+        _recorders.add(self)
+
+    def __len__(self):
+        with self._lock:
+            return self._events
+
+    def record(self, user_id, question_id, correct):
+        with self._lock:
+            counts = self._pending.get((user_id, question_id))
+            if counts is None:
+                counts = self._pending[(user_id, question_id)] = [0, 0, None]
+            counts[0 if correct else 1] += 1
+            counts[2] = 'correct' if correct else 'incorrect'
+
+            self._events += 1
+            if self._oldest is None:
+                self._oldest = self._clock()
+
+    def should_flush(self):
+        return self._events >= self.max_events or (
+            self._oldest is not None and
+            self._clock() - self._oldest >= self.max_age)
+
+    def flush(self):
+        """Writes everything buffered so far, in a transaction of its
+        own, and returns how many answer events that covered. The
+        answers are buffered again if the write fails"""
+        with self.flushing() as write:
+            return write()
+
+    @contextmanager
+    def flushing(self):
+        """Takes everything buffered so far and yields a function that
+        writes it and returns how many answer events that covered. The
+        answers are buffered again if the block raises, so a block that
+        encloses the transaction the function is called in keeps them
+        when that transaction rolls back"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            events, self._events = self._events, 0
+            oldest, self._oldest = self._oldest, None
+
+        try:
+            yield partial(self._write, pending, events)
+        except BaseException:
+            with self._lock:
+                self._merge(pending)
+                self._events += events
+                if oldest is not None and (self._oldest is None or
+                                           oldest < self._oldest):
+                    self._oldest = oldest
+            raise
+
+    def _write(self, pending, events):
+        if not pending:
+            return 0
+        with transaction.atomic():
+            upsert_answers(pending)
+            user_stats.record_answers(pending)
+            transaction.on_commit(
+                partial(answered_questions.added, list(pending)))
+
+        return events
+
+    def _merge(self, pending):
+        for key, (correct, incorrect, result) in pending.items():
+            counts = self._pending.get(key)
+            if counts is None:
+                self._pending[key] = [correct, incorrect, result]
+            else:
+                counts[0] += correct
+                counts[1] += incorrect
+
+
+def upsert_answers(pending):
+    """Inserts or adds to the UserAnswers rows for a mapping of
+    (user id, question id) to [correct, incorrect, latest result]"""
+    now = timezone.now()
+    upsert(
+        UserAnswers,
+        ['user_id', 'question_id', 'result', 'count_correct',
+         'count_incorrect', 'last_answered'],
+        [(user_id, question_id, result, correct, incorrect, now)
+         for (user_id, question_id), (correct, incorrect, result)
+         in pending.items()],
+        conflict=['user_id', 'question_id'],
+        increment=['count_correct', 'count_incorrect'],
+        replace=['result', 'last_answered'],
+    )
+
+
+def flush_all():
+    """Flushes every recorder that still holds answers"""
+    for recorder in list(_recorders):
+        if len(recorder):
+            try:
+                recorder.flush()
+            except Exception:
+                logger.exception('Could not flush %d buffered answers',
+                                 len(recorder))
+
+
+atexit.register(flush_all)
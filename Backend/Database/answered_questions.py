@@ -0,0 +1,164 @@
+"""Which questions each user has already answered, kept as sorted id
+arrays so a game can pick questions its players haven't seen without an
+anti-join against UserAnswers.
+
+A user's set is built from their UserAnswers rows the first time it
+is needed and kept in a bounded LRU. Every change to a user's answers
+bumps a per-user generation counter in the cache, so other processes
+drop their copy, while the process that wrote the answers adds them to
+its own copy in place."""
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from itertools import chain
+import threading
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Database.generations import bump_generation, current_generations
+from Database.models import UserAnswers
+
+
+MAX_USERS = 1000
+
+
+class QuestionSet:
+    """A set of question ids stored as a sorted array of 8 bytes per id,
+    so its size follows how many questions were answered rather than
+    how large their ids are"""
+    __slots__ = ('_ids',)
+
+    def __init__(self, question_ids=()):
+        self._ids = array('q', sorted(set(question_ids)))
+
+    def __contains__(self, question_id):
+        position = bisect_left(self._ids, question_id)
+        return position < len(self._ids) and \
+            self._ids[position] == question_id
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __or__(self, other):
+        union = QuestionSet()
+        if not other._ids or not self._ids:
+            union._ids = array('q', self._ids or other._ids)
+        else:
+            union._ids = array('q', sorted(
+                set(self._ids).union(other._ids)))
+        return union
+
+    def add(self, question_id):
+        if question_id not in self:
+            insort(self._ids, question_id)
+
+    def update(self, question_ids):
+        added = [question_id for question_id in set(question_ids)
+                 if question_id not in self]
+        if len(added) < 8:
+            for question_id in added:
+                insort(self._ids, question_id)
+        elif added:
+            self._ids = array('q', sorted(self._ids + array('q', added)))
+
+
+def _generation_key(user_id):
+    return 'answered_questions:%d:generation' % user_id
+
+
+def _generations(user_ids):
+    return dict(zip(user_ids, current_generations(
+        [_generation_key(user_id) for user_id in user_ids])))
+
+
+class AnsweredQuestions:
+    """Per-user QuestionSets for the most recently used `max_users`"""
+
+    def __init__(self, max_users=MAX_USERS):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._sets = OrderedDict()
+
+    def _remember(self, user_id, generation, question_set):
+        self._sets[user_id] = (generation, question_set)
+        self._sets.move_to_end(user_id)
+        while len(self._sets) > self.max_users:
+            self._sets.popitem(last=False)
+
+    def get_many(self, user_ids):
+        """Returns a QuestionSet for each user, loading the ones that
+        are missing or stale with a single query"""
+        user_ids = list(user_ids)
+        generations = _generations(user_ids)
+        found, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                current = self._sets.get(user_id)
+                if current is not None and \
+                        current[0] == generations[user_id]:
+                    self._sets.move_to_end(user_id)
+                    found[user_id] = current[1]
+                else:
+                    missing.append(user_id)
+
+        if missing:
+            answered = {user_id: [] for user_id in missing}
+            rows = UserAnswers.objects.filter(user_id__in=missing) \
+                .values_list('user_id', 'question_id').order_by()
+            for user_id, question_id in rows.iterator(chunk_size=10000):
+                answered[user_id].append(question_id)
+            loaded = {user_id: QuestionSet(question_ids)
+                      for user_id, question_ids in answered.items()}
+
+            # The generations were read before the query, so a change
+            # committed while it ran makes the next lookup reload
+            with self._lock:
+                for user_id, question_set in loaded.items():
+                    self._remember(user_id, generations[user_id],
+                                   question_set)
+            found.update(loaded)
+
+        return found
+
+    def get(self, user_id):
+        return self.get_many([user_id])[user_id]
+
+    def union(self, user_ids):
+        """Returns the questions any of the users has answered"""
+        return QuestionSet(chain.from_iterable(
+            self.get_many(user_ids).values()))
+
+    def added(self, pairs):
+        """Records newly committed (user id, question id) answers"""
+        by_user = {}
+        for user_id, question_id in pairs:
+            by_user.setdefault(user_id, []).append(question_id)
+
+        for user_id, question_ids in by_user.items():
+            generation = bump_generation(_generation_key(user_id))
+            with self._lock:
+                current = self._sets.pop(user_id, None)
+                # Only safe to update in place if nobody else changed
+                # this user's answers since the copy was loaded
+                if current is not None and current[0] == generation - 1:
+                    current[1].update(question_ids)
+                    self._remember(user_id, generation, current[1])
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            bump_generation(_generation_key(user_id))
+            with self._lock:
+                self._sets.pop(user_id, None)
+
+
+answered_questions = AnsweredQuestions()
+
+
+@receiver(post_save, sender=UserAnswers)
+@receiver(post_delete, sender=UserAnswers)
+def invalidate_answered_questions(sender, instance, **kwargs):
+    answered_questions.invalidate(instance.user_id)
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class DatabaseConfig(AppConfig):
+    name = 'Database'
+
+    def ready(self):
+        """Connects the signal receivers that keep in-memory services
+        and derived tables in step with the models"""
+        from Database import answered_questions, friend_graph, leaderboard, \
+            question_pool, ratings, receivers, user_stats  # noqa
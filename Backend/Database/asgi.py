@@ -2,6 +2,10 @@
 ASGI config for Database project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests are handled by Django, except logins, which are handled
+asynchronously by Database.authentication, and WebSocket connections by
+the real-time game engine, so this needs an ASGI server such as uvicorn.
+Game workers can run the leaner Database.asgi_game instead.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -9,8 +13,28 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Database.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from Database.authentication import (  # noqa: E402
+    LOGIN_PATH, login_application)
+from Database.lifespan import lifespan  # noqa: E402
+from Database.streaming import StreamingASGIHandler  # noqa: E402
+from Database.websocket import websocket_application  # noqa: E402
+
+# Streams responses, such as history exports, off the event loop
+django_application = StreamingASGIHandler()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['path'] == LOGIN_PATH:
+        await login_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,41 @@
+"""
+ASGI config for game workers, run with Database.settings_game.
+
+It serves WebSocket game connections, logins and the lifespan events
+only. Any other HTTP request is answered 404 without loading Django's
+request handler, middleware or URLconf, so the API and admin must be
+routed to workers running Database.asgi.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Database.settings_game')
+
+django.setup(set_prefix=False)
+
+from Database.authentication import (  # noqa: E402
+    LOGIN_PATH, login_application)
+from Database.lifespan import lifespan  # noqa: E402
+from Database.websocket import websocket_application  # noqa: E402
+
+
+async def not_found(send):
+    await send({
+        'type': 'http.response.start',
+        'status': 404,
+        'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+    })
+    await send({'type': 'http.response.body', 'body': b'Not Found'})
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['path'] == LOGIN_PATH:
+        await login_application(scope, receive, send)
+    else:
+        await not_found(send)
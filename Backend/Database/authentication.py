@@ -0,0 +1,206 @@
+"""Asynchronous logins and sign ups.
+
+Hashing or checking a password costs tens of milliseconds of CPU, which
+would stall every game on the event loop if it ran there. Here it runs
+in a bounded pool of PASSWORD_HASHING_WORKERS threads (hashlib releases
+the GIL while it hashes, so they run in parallel), while the database
+work goes through sync_to_async. Lockouts and the audit trail come from
+the login throttle, and a password hashed with out of date parameters
+is rehashed when its owner next logs in.
+
+`login_application` serves POST /auth/login/ with a JSON body of
+{"email": ..., "password": ...} and starts a session on success."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from importlib import import_module
+import json
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, login
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.exceptions import PermissionDenied
+
+from Database.login_throttle import ThrottledModelBackend, login_throttle
+
+
+LOGIN_PATH = '/auth/login/'
+BACKEND = 'Database.login_throttle.ThrottledModelBackend'
+MAX_BODY_SIZE = 16 * 1024
+
+hashing_pool = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_WORKERS,
+    thread_name_prefix='password-hashing',
+)
+
+
+async def in_hashing_pool(function, *args):
+    return await asyncio.get_event_loop().run_in_executor(
+        hashing_pool, function, *args)
+
+
+def verify_password(password, encoded):
+    """Returns whether `password` matches `encoded` and, if the hash was
+    made with out of date parameters, a new hash to store in its place"""
+    rehashed = []
+    valid = check_password(
+        password, encoded,
+        setter=lambda raw_password: rehashed.append(
+            make_password(raw_password)))
+
+    return valid, rehashed[0] if rehashed else None
+
+
+async def hash_password(password):
+    return await in_hashing_pool(make_password, password)
+
+
+def _save_user(email, encoded, extra_fields):
+    manager = get_user_model()._default_manager
+    user = manager.model(email=manager.normalize_email(email),
+                         password=encoded, **extra_fields)
+    user.save(using=manager.db)
+
+    return user
+
+
+async def create_user(email, password=None, **extra_fields):
+    """Async CustomUserManager.create_user"""
+    if not email:
+        raise ValueError('Email address is required')
+    encoded = await hash_password(password)
+
+    return await sync_to_async(_save_user)(email, encoded, extra_fields)
+
+
+def _find_user(username, ip):
+    if login_throttle.is_locked(username, ip):
+        raise PermissionDenied('Too many failed login attempts')
+
+    user_model = get_user_model()
+    try:
+        return user_model._default_manager.get_by_natural_key(username)
+    except user_model.DoesNotExist:
+        return None
+
+
+def _record_login(user, username, ip, valid, rehashed):
+    if user is None:
+        login_throttle.record_failure(username, ip)
+        return None
+
+    if valid and ThrottledModelBackend().user_can_authenticate(user):
+        if rehashed is not None:
+            user.password = rehashed
+            user.save(update_fields=['password'])
+        login_throttle.record_success(username, ip, user.pk)
+        return user
+
+    login_throttle.record_failure(username, ip, user.pk)
+    return None
+
+
+async def authenticate(username, password, ip=None):
+    """Returns the user if the credentials are right, None if not, and
+    raises PermissionDenied while the account or IP address is locked"""
+    user = await sync_to_async(_find_user)(username, ip)
+    if user is None:
+        # Hash anyway so a missing account takes as long to reject
+        await hash_password(password)
+        valid, rehashed = False, None
+    else:
+        valid, rehashed = await in_hashing_pool(
+            verify_password, password, user.password)
+
+    return await sync_to_async(_record_login)(user, username, ip, valid,
+                                              rehashed)
+
+
+def start_session(user):
+    """Logs `user` in to a new session and returns its key"""
+    engine = import_module(settings.SESSION_ENGINE)
+    request = SimpleNamespace(session=engine.SessionStore(), META={})
+    login(request, user, backend=BACKEND)
+    request.session.save()
+
+    return request.session.session_key
+
+
+def session_cookie(session_key):
+    cookie = SimpleCookie()
+    cookie[settings.SESSION_COOKIE_NAME] = session_key
+    morsel = cookie[settings.SESSION_COOKIE_NAME]
+    morsel['max-age'] = settings.SESSION_COOKIE_AGE
+    morsel['path'] = settings.SESSION_COOKIE_PATH
+    morsel['httponly'] = settings.SESSION_COOKIE_HTTPONLY
+    morsel['secure'] = settings.SESSION_COOKIE_SECURE
+    if settings.SESSION_COOKIE_SAMESITE:
+        morsel['samesite'] = settings.SESSION_COOKIE_SAMESITE
+
+    return morsel.OutputString()
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        event = await receive()
+        if event['type'] == 'http.disconnect':
+            return None
+        body += event.get('body', b'')
+        if len(body) > MAX_BODY_SIZE:
+            return None
+        if not event.get('more_body'):
+            return body
+
+
+async def _respond(send, status, message, headers=()):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')] + list(headers),
+    })
+    await send({'type': 'http.response.body',
+                'body': json.dumps(message).encode()})
+
+
+async def login_application(scope, receive, send):
+    if scope['method'] != 'POST':
+        await _respond(send, 405, {'error': 'Method not allowed'},
+                       [(b'allow', b'POST')])
+        return
+
+    # Only JSON is accepted, which browsers can't send cross-site without
+    # a CORS preflight
+    headers = dict(scope.get('headers', []))
+    if headers.get(b'content-type', b'').split(b';')[0].strip() != \
+            b'application/json':
+        await _respond(send, 415, {'error': 'Expected a JSON body'})
+        return
+
+    body = await _read_body(receive)
+    try:
+        credentials = json.loads(body)
+        username = credentials['email']
+        password = credentials['password']
+    except (TypeError, ValueError, KeyError):
+        await _respond(send, 400, {'error': 'Expected an email and password'})
+        return
+    if not isinstance(username, str) or not isinstance(password, str):
+        await _respond(send, 400, {'error': 'Expected an email and password'})
+        return
+
+    ip = (scope.get('client') or [None])[0]
+    try:
+        user = await authenticate(username, password, ip)
+    except PermissionDenied:
+        await _respond(send, 429, {'error': 'Too many failed login attempts'})
+        return
+    if user is None:
+        await _respond(send, 401, {'error': 'Invalid email or password'})
+        return
+
+    session_key = await sync_to_async(start_session)(user)
+    await _respond(send, 200, {'id': user.pk, 'username': user.username},
+                   [(b'set-cookie', session_cookie(session_key).encode())])
@@ -0,0 +1,197 @@
+"""Avatar processing.
+
+An upload is identified by the SHA-256 of its bytes. The first time an
+upload is seen it is decoded, turned upright, flattened onto white,
+cropped square and resized to each of AVATAR_SIZES by a pool of
+AVATAR_WORKERS processes, and the variants, saved without the upload's
+metadata, are stored under names derived from the hash. Users uploading
+the same image share the stored variants, and a variant's content never
+changes, so it can be cached for good.
+
+Pillow is only imported by the worker processes, so handling a request,
+uploads included, never decodes an image."""
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+import hashlib
+import io
+import logging
+import multiprocessing
+import re
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+MAX_PIXELS = 4096 * 4096
+QUALITY = 85
+CONTENT_TYPE = 'image/jpeg'
+
+_hash = re.compile(r'^[0-9a-f]{64}$')
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_hash(value):
+    return bool(_hash.match(value))
+
+
+def variant_name(avatar_hash, size):
+    return 'avatars/%s/%s/%d.jpg' % (avatar_hash[:2], avatar_hash, size)
+
+
+def render(data, sizes, max_pixels=MAX_PIXELS):
+    """Returns {size: JPEG bytes} of the image `data` cropped square at
+    each of `sizes`. Runs in the worker processes"""
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(data))
+    if image.width * image.height > max_pixels:
+        raise ValueError('The image is %dx%d, larger than allowed' %
+                         image.size)
+    largest = max(sizes)
+    # Lets the JPEG decoder scale down by up to 8 times while decoding,
+    # which is much faster than decoding every pixel and resizing
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        flattened = Image.new('RGB', image.size, 'white')
+        flattened.paste(image, mask=image.getchannel('A'))
+        image = flattened
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    variants = {}
+    # Each size is resized from the next larger one rather than the
+    # upload
+    image = ImageOps.fit(image, (largest, largest), Image.LANCZOS)
+    for size in sorted(sizes, reverse=True):
+        image = image.resize((size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=QUALITY)
+        variants[size] = output.getvalue()
+
+    return variants
+
+
+class AvatarProcessor:
+    """Renders uploads on a process pool, started on first use, and
+    sets each uploader's avatar once the upload's variants are stored"""
+
+    def __init__(self, workers=None, sizes=None, storage=None):
+        self.workers = workers or settings.AVATAR_WORKERS
+        self.sizes = tuple(sorted(sizes or settings.AVATAR_SIZES))
+        self.storage = storage or default_storage
+        self._lock = threading.Lock()
+        self._pool = None
+        self._waiting = {}
+
+    def stored(self, avatar_hash):
+        # The largest variant is stored last
+        return self.storage.exists(variant_name(avatar_hash,
+                                                self.sizes[-1]))
+
+    def process(self, user_id, data):
+        """Returns the hash of the image `data` and a future resolved
+        with it once it is the avatar of `user_id`. The image is only
+        rendered if it isn't stored or being rendered already"""
+        avatar_hash = digest(data)
+        done = Future()
+        rendering = None
+        with self._lock:
+            waiting = self._waiting.get(avatar_hash)
+            if waiting is not None:
+                waiting.append((user_id, done))
+                return avatar_hash, done
+            if not self.stored(avatar_hash):
+                self._waiting[avatar_hash] = [(user_id, done)]
+                try:
+                    rendering = self._submit(data)
+                except Exception:
+                    del self._waiting[avatar_hash]
+                    raise
+
+        if rendering is None:
+            self._assign(avatar_hash, [(user_id, done)])
+        else:
+            # Outside the lock, as a render that has already finished
+            # runs the callback straight away
+            rendering.add_done_callback(partial(self._rendered, avatar_hash))
+        return avatar_hash, done
+
+    def _submit(self, data):
+        """Submits a render, replacing the pool once if a worker died and
+        broke it"""
+        try:
+            return self._executor().submit(render, data, self.sizes)
+        except BrokenProcessPool:
+            logger.warning('The avatar pool is broken, starting a new one')
+            broken, self._pool = self._pool, None
+            broken.shutdown(wait=False)
+            return self._executor().submit(render, data, self.sizes)
+
+    def _executor(self):
+        if self._pool is None:
+            # Spawned rather than forked, so no worker inherits the
+            # parent's threads or database connections
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def _rendered(self, avatar_hash, future):
+        try:
+            for size, content in sorted(future.result().items()):
+                name = variant_name(avatar_hash, size)
+                if not self.storage.exists(name):
+                    self.storage.save(name, ContentFile(content))
+        except Exception as error:
+            logger.exception('Could not render avatar %s', avatar_hash)
+            with self._lock:
+                waiting = self._waiting.pop(avatar_hash)
+            for _, done in waiting:
+                done.set_exception(error)
+            return
+
+        with self._lock:
+            waiting = self._waiting.pop(avatar_hash)
+        self._assign(avatar_hash, waiting)
+        # Runs on the pool's own thread, outside any request
+        close_old_connections()
+
+    def _assign(self, avatar_hash, waiting):
+        try:
+            get_user_model().objects.filter(
+                pk__in=[user_id for user_id, _ in waiting],
+            ).update(avatar_hash=avatar_hash)
+        except Exception as error:
+            logger.exception('Could not set avatar %s', avatar_hash)
+            for _, done in waiting:
+                done.set_exception(error)
+            return
+
+        for _, done in waiting:
+            done.set_result(avatar_hash)
+
+    def shutdown(self):
+        """Waits for the uploads being rendered and stops the pool"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+avatar_processor = AvatarProcessor()
+
+
+def shutdown():
+    avatar_processor.shutdown()
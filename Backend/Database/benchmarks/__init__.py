@@ -0,0 +1,108 @@
+"""Benchmarks for the services in the Database app.
+
+Each module in this package exposes `DEFAULT_SIZES` and a
+`run(stdout, sizes, repeat)` function and is run through
+`python manage.py benchmark <name>`, which points it at a throwaway test
+database so the rows it seeds never reach the real one. Every timing
+reported is also kept in `results`, which the command can save as JSON
+to compare runs."""
+from contextlib import contextmanager
+import time
+
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext, setup_databases, \
+    teardown_databases
+
+from Database.answer_recorder import flush_all
+from Database.leaderboard import leaderboards
+from Database.login_throttle import login_attempt_writer
+
+
+results = []
+_heading = [None]
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """Creates the test databases for the duration of a benchmark"""
+    old_config = setup_databases(verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        try:
+            flush_buffers()
+        finally:
+            teardown_databases(old_config, verbosity)
+
+
+def flush_buffers():
+    """Writes what the services buffer in memory to the test database and
+    forgets the rest, so their exit hooks have nothing to write to the
+    real one once it is torn down"""
+    flush_all()
+    login_attempt_writer.flush()
+    try:
+        leaderboards.persist()
+    finally:
+        leaderboards.clear()
+
+
+def timed(function, repeat):
+    """Calls `function` `repeat` times and returns each duration in
+    seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    return timings
+
+
+def percentile(values, fraction):
+    """Returns the value below which `fraction` of `values` fall"""
+    ordered = sorted(values)
+    position = min(len(ordered) - 1, int(round(fraction * len(ordered))))
+    return ordered[position]
+
+
+def count_queries(function):
+    """Calls `function` once and returns how many queries it ran"""
+    # The log keeps the last 9000 queries, after which counting by its
+    # length no longer works
+    reset_queries()
+    with CaptureQueriesContext(connection) as queries:
+        function()
+
+    return len(queries)
+
+
+def clear_results():
+    del results[:]
+    _heading[0] = None
+
+
+def heading(stdout, text):
+    """Writes `text` and files the timings reported after it under it"""
+    _heading[0] = text
+    stdout.write(text)
+
+
+def report(stdout, label, timings, queries=None):
+    """Writes the median and p99 of a list of timings in milliseconds,
+    with the queries per call when they were counted"""
+    p50 = percentile(timings, 0.5) * 1000
+    p99 = percentile(timings, 0.99) * 1000
+    line = '%-40s p50 %9.3f ms  p99 %9.3f ms' % (label, p50, p99)
+    if queries is not None:
+        line += '  %3d queries' % queries
+    stdout.write(line)
+
+    results.append({
+        'heading': _heading[0],
+        'label': label.strip(),
+        'runs': len(timings),
+        'p50_ms': p50,
+        'p99_ms': p99,
+        'queries': queries,
+    })
@@ -0,0 +1,64 @@
+"""Compares deleting users through the ORM collector one at a time
+against the bulk deletion service"""
+import random
+import time
+
+from django.contrib.auth import get_user_model
+
+from Database.account_deletion import delete_users
+from Database.benchmarks.seed import seed_questions, seed_users
+from Database.models import Games, LoginAttempts, Questions, Results, \
+    UserAnswers, get_sentinel_user
+
+
+DEFAULT_SIZES = [100, 1000, 5000]
+ROWS_PER_USER = 10
+
+
+def seed_history(user_ids, question_ids, rng):
+    """Gives every user games, results, answers and login attempts"""
+    results = Results.objects.bulk_create([
+        Results(winner_id=user_id, second_place_id=rng.choice(user_ids))
+        for user_id in user_ids for _ in range(ROWS_PER_USER)
+    ])
+    Games.objects.bulk_create([
+        Games(number_of_questions=10, number_of_players=2,
+              category='history', created_by_id=user_id)
+        for user_id in user_ids for _ in range(ROWS_PER_USER)
+    ])
+    UserAnswers.objects.bulk_create([
+        UserAnswers(user_id=user_id, question_id=question_id,
+                    result='correct', count_correct=1)
+        for user_id in user_ids
+        for question_id in rng.sample(question_ids, ROWS_PER_USER)
+    ])
+    LoginAttempts.objects.bulk_create([
+        LoginAttempts(user_id=user_id, login_status='success')
+        for user_id in user_ids for _ in range(ROWS_PER_USER)
+    ])
+
+    return results
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+    get_sentinel_user()
+    seed_questions(ROWS_PER_USER * 10)
+    question_ids = list(Questions.objects.values_list('id', flat=True))
+
+    for size in sizes:
+        user_ids = seed_users(size)
+        seed_history(user_ids, question_ids, rng)
+        start = time.perf_counter()
+        for user in get_user_model().objects.filter(pk__in=user_ids):
+            user.delete()
+        collector = time.perf_counter() - start
+
+        user_ids = seed_users(size)
+        seed_history(user_ids, question_ids, rng)
+        start = time.perf_counter()
+        delete_users(user_ids)
+        bulk = time.perf_counter() - start
+
+        stdout.write('%6d users  collector %8.2fs  bulk %8.2fs' % (
+            size, collector, bulk))
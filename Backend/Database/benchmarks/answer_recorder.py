@@ -0,0 +1,57 @@
+"""Compares recording answers one read-modify-write at a time against
+the write-behind recorder's batched upserts"""
+import random
+import time
+
+from django.db import transaction
+
+from Database.answer_recorder import AnswerRecorder
+from Database.benchmarks.seed import seed_questions, seed_users
+from Database.models import Questions, UserAnswers
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+USERS = 100
+QUESTIONS = 5000
+
+
+def record_per_row(user_id, question_id, correct):
+    answer, _ = UserAnswers.objects.get_or_create(
+        user_id=user_id, question_id=question_id,
+        defaults={'result': 'correct' if correct else 'incorrect'})
+    answer.result = 'correct' if correct else 'incorrect'
+    if correct:
+        answer.count_correct += 1
+    else:
+        answer.count_incorrect += 1
+    answer.save()
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+    user_ids = seed_users(USERS)
+    seed_questions(QUESTIONS)
+    question_ids = list(Questions.objects.values_list('id', flat=True))
+
+    for size in sizes:
+        events = [(rng.choice(user_ids), rng.choice(question_ids),
+                   rng.random() < 0.6) for _ in range(size)]
+
+        UserAnswers.objects.all().delete()
+        start = time.perf_counter()
+        with transaction.atomic():
+            for event in events:
+                record_per_row(*event)
+        per_row = time.perf_counter() - start
+
+        UserAnswers.objects.all().delete()
+        recorder = AnswerRecorder(max_events=size + 1)
+        start = time.perf_counter()
+        for event in events:
+            recorder.record(*event)
+        recorder.flush()
+        buffered = time.perf_counter() - start
+
+        stdout.write('%7d answers  per-row %10.0f writes/sec  '
+                     'write-behind %10.0f writes/sec' % (
+                         size, size / per_row, size / buffered))
@@ -0,0 +1,59 @@
+"""Compares picking questions a player hasn't answered through the
+answered question sets against a NOT IN anti-join on UserAnswers.
+Sizes are how many questions the player has answered, out of a bank
+twice that size"""
+import random
+import time
+
+from Database.answered_questions import AnsweredQuestions
+from Database.benchmarks import report, timed
+from Database.benchmarks.seed import seed_questions, seed_users
+from Database.models import Questions, UserAnswers
+from Database.question_pool import QuestionPool
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+QUESTIONS_PER_GAME = 20
+BATCH_SIZE = 10000
+
+
+def seed_answers(user_id, question_ids):
+    for start in range(0, len(question_ids), BATCH_SIZE):
+        UserAnswers.objects.bulk_create([
+            UserAnswers(user_id=user_id, question_id=question_id,
+                        result='correct', count_correct=1)
+            for question_id in question_ids[start:start + BATCH_SIZE]
+        ])
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+    seeded = 0
+
+    for size in sizes:
+        seed_questions(size * 2 - seeded)
+        seeded = size * 2
+        question_ids = list(Questions.objects.values_list('id', flat=True))
+        user_id = seed_users(1)[0]
+        seed_answers(user_id, rng.sample(question_ids, size))
+        stdout.write('%d answered out of %d questions' % (size, seeded))
+
+        def anti_join():
+            list(Questions.objects.filter(answers__isnull=False)
+                 .exclude(id__in=UserAnswers.objects.filter(user_id=user_id)
+                          .values('question_id'))
+                 .order_by('?')
+                 .values_list('id', flat=True)[:QUESTIONS_PER_GAME])
+
+        pool = QuestionPool()
+        pool.index()
+        answered = AnsweredQuestions()
+        start = time.perf_counter()
+        answered.get(user_id)
+        stdout.write('%-40s %13.3f ms' % (
+            '  set build', (time.perf_counter() - start) * 1000))
+
+        report(stdout, '  NOT IN anti-join', timed(anti_join, repeat))
+        report(stdout, '  pool sample excluding answered', timed(
+            lambda: pool.sample(QUESTIONS_PER_GAME,
+                                exclude=answered.get(user_id)), repeat))
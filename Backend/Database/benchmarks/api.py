@@ -0,0 +1,62 @@
+"""Compares fetching a deep page of the question catalog with keyset
+pagination against LIMIT/OFFSET, and a conditional GET answered 304"""
+from base64 import b64encode
+from urllib.parse import urlencode
+
+from django.test import override_settings
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.test import APIRequestFactory
+
+from API.views import QuestionList
+from Database.benchmarks import report, timed
+from Database.benchmarks.seed import seed_questions
+from Database.models import Questions
+
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+PAGE_SIZE = 100
+
+
+class OffsetQuestionList(QuestionList):
+    pagination_class = LimitOffsetPagination
+
+
+def cursor_after(question_id):
+    return b64encode(urlencode({'p': question_id}).encode()).decode()
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+def run(stdout, sizes, repeat):
+    factory = APIRequestFactory()
+    keyset_view = QuestionList.as_view()
+    offset_view = OffsetQuestionList.as_view()
+    seeded = 0
+
+    for size in sizes:
+        seed_questions(size - seeded)
+        seeded = size
+        depth = size - PAGE_SIZE
+        position = Questions.objects.order_by('id') \
+            .values_list('id', flat=True)[depth - 1]
+        stdout.write('%d questions, page at row %d' % (size, depth))
+
+        def get(view, query, **headers):
+            response = view(factory.get('/api/questions/', query, **headers))
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+
+        report(stdout, '  LIMIT/OFFSET', timed(
+            lambda: get(offset_view, {'limit': PAGE_SIZE,
+                                      'offset': depth}), repeat))
+        report(stdout, '  keyset cursor', timed(
+            lambda: get(keyset_view, {'page_size': PAGE_SIZE,
+                                      'cursor': cursor_after(position)}),
+            repeat))
+
+        etag = get(keyset_view, {'page_size': PAGE_SIZE,
+                                 'cursor': cursor_after(position)})['ETag']
+        report(stdout, '  keyset cursor, If-None-Match (304)', timed(
+            lambda: get(keyset_view, {'page_size': PAGE_SIZE,
+                                      'cursor': cursor_after(position)},
+                        HTTP_IF_NONE_MATCH=etag), repeat))
@@ -0,0 +1,85 @@
+"""Measures logins/sec and how late the event loop runs while many
+logins are in flight, with password checks on the event loop and
+offloaded to the hashing pool"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+
+from Database import authentication
+from Database.benchmarks import report
+from Database.login_throttle import login_attempt_writer
+
+
+DEFAULT_SIZES = [100, 400]
+CONCURRENCY = 50
+TICK_SECONDS = 0.005
+
+
+def seed_accounts(total):
+    encoded = make_password('password123')
+    user_model = get_user_model()
+    user_model.objects.bulk_create([
+        user_model(username='login%d' % number,
+                   email='login%d@example.com' % number, password=encoded)
+        for number in range(total)
+    ])
+
+    return ['login%d@example.com' % number for number in range(total)]
+
+
+def find_user(email):
+    return get_user_model()._default_manager.get_by_natural_key(email)
+
+
+async def login_on_loop(email):
+    user = await sync_to_async(find_user)(email)
+    return check_password('password123', user.password)
+
+
+async def login_offloaded(email):
+    return await authentication.authenticate(email, 'password123')
+
+
+async def measure(login, emails):
+    """Runs every login, CONCURRENCY at a time, while a ticker records
+    how late each of its wake ups is"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK_SECONDS
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    limit = asyncio.Semaphore(CONCURRENCY)
+
+    async def bounded(email):
+        async with limit:
+            await login(email)
+
+    ticking = asyncio.ensure_future(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(email) for email in emails))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticking
+
+    return elapsed, lags or [0.0]
+
+
+def run(stdout, sizes, repeat):
+    emails = seed_accounts(max(sizes))
+
+    for size in sizes:
+        stdout.write('%d logins, %d at a time, %d hashing threads' % (
+            size, CONCURRENCY, authentication.hashing_pool._max_workers))
+        for label, login in (('on event loop', login_on_loop),
+                             ('offloaded', login_offloaded)):
+            elapsed, lags = asyncio.run(measure(login, emails[:size]))
+            report(stdout, '  %s (%.0f logins/sec) loop lag' % (
+                label, size / elapsed), lags)
+        login_attempt_writer.flush()
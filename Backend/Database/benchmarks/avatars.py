@@ -0,0 +1,67 @@
+"""Times rendering an avatar upload of `size` by `size` pixels into every
+variant, in this process, and the throughput of the process pool with
+one worker and with one per core, reported as the time per upload and
+per upload per worker"""
+from concurrent.futures import ProcessPoolExecutor
+import io
+import multiprocessing
+import os
+import random
+import time
+
+from django.conf import settings
+
+from Database.avatars import render
+from Database.benchmarks import heading, report, timed
+
+
+DEFAULT_SIZES = [640, 2048, 4096]
+UPLOADS_PER_WORKER = 8
+
+
+def photo(size, seed):
+    """A JPEG with smooth colour changes, which compresses like a photo
+    rather than like noise"""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    noise = Image.frombytes('RGB', (32, 32), bytes(
+        rng.randrange(256) for _ in range(32 * 32 * 3)))
+    output = io.BytesIO()
+    noise.resize((size, size), Image.BICUBIC).save(output, 'JPEG',
+                                                   quality=90)
+
+    return output.getvalue()
+
+
+def run(stdout, sizes, repeat):
+    cores = os.cpu_count() or 1
+    context = multiprocessing.get_context('spawn')
+    avatar_sizes = settings.AVATAR_SIZES
+
+    for size in sizes:
+        uploads = [photo(size, seed)
+                   for seed in range(cores * UPLOADS_PER_WORKER)]
+        heading(stdout, '%dx%d upload of %d KB into %s' % (
+            size, size, len(uploads[0]) // 1024,
+            ', '.join(str(avatar_size) for avatar_size in avatar_sizes)))
+        report(stdout, '  in process',
+               timed(lambda: render(uploads[0], avatar_sizes), repeat))
+
+        for workers in sorted({1, cores}):
+            batch = uploads[:workers * UPLOADS_PER_WORKER]
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                # Starts the workers before the clock does
+                list(pool.map(render, uploads[:workers],
+                              [avatar_sizes] * workers))
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    list(pool.map(render, batch,
+                                  [avatar_sizes] * len(batch)))
+                    timings.append((time.perf_counter() - start) /
+                                   len(batch))
+            report(stdout, '  pool of %d, per upload' % workers, timings)
+            if workers > 1:
+                report(stdout, '  pool of %d, per upload per worker' %
+                       workers, [timing * workers for timing in timings])
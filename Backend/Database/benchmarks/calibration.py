@@ -0,0 +1,88 @@
+"""Times a full and an incremental difficulty calibration against
+summing and saving one question at a time through the ORM, which is
+timed on a sample of questions and extrapolated"""
+from datetime import timedelta
+import random
+import time
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from Database.benchmarks.seed import seed_questions, seed_users
+from Database.calibration import calibrate
+from Database.models import Questions, UserAnswers
+
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+ANSWERS_PER_QUESTION = 3
+USERS = 1000
+ORM_SAMPLE = 500
+BATCH_SIZE = 10000
+
+
+def seed_answers(question_ids, user_ids, rng):
+    batch = []
+    for question_id in question_ids:
+        for user_id in rng.sample(user_ids, ANSWERS_PER_QUESTION):
+            batch.append(UserAnswers(
+                user_id=user_id, question_id=question_id, result='correct',
+                count_correct=rng.randrange(20),
+                count_incorrect=rng.randrange(20)))
+        if len(batch) >= BATCH_SIZE:
+            UserAnswers.objects.bulk_create(batch)
+            batch = []
+    UserAnswers.objects.bulk_create(batch)
+
+
+def calibrate_one_by_one(question_ids):
+    for question in Questions.objects.filter(id__in=question_ids):
+        totals = UserAnswers.objects.filter(question=question).aggregate(
+            correct=Sum('count_correct'), incorrect=Sum('count_incorrect'))
+        answered = totals['correct'] + totals['incorrect']
+        question.answer_count = answered
+        question.accuracy = totals['correct'] / answered
+        question.save()
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+    user_ids = seed_users(USERS)
+    seeded = 0
+
+    for size in sizes:
+        seed_questions(size - seeded)
+        question_ids = list(Questions.objects.order_by('id')
+                            .values_list('id', flat=True)[seeded:])
+        seed_answers(question_ids, user_ids, rng)
+        seeded = size
+        stdout.write('%d questions, %d answer rows' % (
+            size, size * ANSWERS_PER_QUESTION))
+
+        start = time.perf_counter()
+        counts = calibrate(full=True)
+        stdout.write('%-40s %10.2f s  (%d relabelled)' % (
+            '  full calibration', time.perf_counter() - start,
+            counts['relabelled']))
+
+        # As if the full run had been a while ago, then 1% of questions
+        # (at most 900, SQLite's parameter limit) were answered again
+        UserAnswers.objects.update(
+            last_answered=timezone.now() - timedelta(hours=1))
+        changed = rng.sample(question_ids,
+                             min(900, max(1, len(question_ids) // 100)))
+        for answer in UserAnswers.objects.filter(question_id__in=changed):
+            answer.count_incorrect += 1
+            answer.save()
+        start = time.perf_counter()
+        counts = calibrate()
+        stdout.write('%-40s %10.2f s  (%d questions)' % (
+            '  incremental calibration', time.perf_counter() - start,
+            counts['calibrated']))
+
+        sample = rng.sample(question_ids, min(ORM_SAMPLE, len(question_ids)))
+        start = time.perf_counter()
+        calibrate_one_by_one(sample)
+        elapsed = time.perf_counter() - start
+        stdout.write('%-40s %10.2f s  (extrapolated from %d)' % (
+            '  one question at a time',
+            elapsed * size / len(sample), len(sample)))
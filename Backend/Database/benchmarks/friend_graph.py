@@ -0,0 +1,82 @@
+"""Compares friendship checks, mutual friends and suggestions served
+from the cached adjacency sets against querying UserRelationships"""
+from itertools import cycle
+import random
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+
+from Database.benchmarks import report, timed
+from Database.benchmarks.seed import seed_relationships, seed_users
+from Database.friend_graph import FriendGraph
+from Database.models import UserRelationships
+
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+EDGES_PER_USER = 10
+SUGGESTED = 10
+
+
+def query_status(user_id, other_id):
+    return UserRelationships.objects.filter(
+        Q(user_first=user_id, user_second=other_id) |
+        Q(user_first=other_id, user_second=user_id),
+    ).values_list('relationship_status', flat=True).first()
+
+
+def query_mutual_friends(user_id, other_id):
+    """Both users' friends, in either column, joined on each other"""
+    table = connection.ops.quote_name(UserRelationships._meta.db_table)
+    friends = (
+        "SELECT CASE WHEN user_first_id = %%s THEN user_second_id "
+        "ELSE user_first_id END AS friend_id FROM %s "
+        "WHERE (user_first_id = %%s OR user_second_id = %%s) "
+        "AND relationship_status = 'friends'" % table
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT mine.friend_id FROM (%s) mine JOIN (%s) theirs '
+            'ON mine.friend_id = theirs.friend_id' % (friends, friends),
+            [user_id] * 3 + [other_id] * 3)
+        return {row[0] for row in cursor.fetchall()}
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+
+    for size in sizes:
+        UserRelationships.objects.all().delete()
+        user_ids = seed_users(max(size // EDGES_PER_USER, 2))
+        seed_relationships(user_ids, size, rng)
+        pairs = [tuple(rng.sample(user_ids, 2)) for _ in range(repeat)]
+        stdout.write('%d edges, %d users' % (size, len(user_ids)))
+
+        graph = FriendGraph()
+        cache.clear()
+        for user_id, other_id in pairs:
+            graph.adjacency(user_id)
+            graph.adjacency(other_id)
+
+        iterator = iter(pairs * 2)
+        report(stdout, '  is_blocked (cached)', timed(
+            lambda: graph.is_blocked(*next(iterator)), repeat))
+        iterator = iter(pairs * 2)
+        report(stdout, '  status (OR query)', timed(
+            lambda: query_status(*next(iterator)), repeat))
+
+        iterator = iter(pairs * 2)
+        report(stdout, '  mutual friends (cached)', timed(
+            lambda: graph.mutual_friends(*next(iterator)), repeat))
+        iterator = iter(pairs * 2)
+        report(stdout, '  mutual friends (self-join)', timed(
+            lambda: query_mutual_friends(*next(iterator)), repeat))
+
+        # A handful of users so their friends' adjacency fits in the
+        # default local memory cache once warm
+        cache.clear()
+        suggested = cycle([user_id for user_id, _ in pairs[:SUGGESTED]])
+        report(stdout, '  suggestions (cold cache)', timed(
+            lambda: graph.suggestions(next(suggested)), SUGGESTED))
+        report(stdout, '  suggestions (warm cache)', timed(
+            lambda: graph.suggestions(next(suggested)), repeat))
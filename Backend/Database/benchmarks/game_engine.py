@@ -0,0 +1,76 @@
+"""Load test for the real-time game engine: runs many rooms of simulated
+players on one event loop and measures how late their answers are
+handled. The database is left out so only the engine is measured"""
+import asyncio
+import json
+import random
+import time
+
+from Database.benchmarks import percentile
+from Database.game_engine import Room
+
+
+DEFAULT_SIZES = [1000, 5000, 10000]
+PLAYERS_PER_ROOM = 6
+ROUNDS = 5
+ROUND_SECONDS = 2.0
+LATEST_ANSWER_SECONDS = 1.5
+
+
+async def simulate(number_of_rooms, rng):
+    latencies = []
+    questions = [{
+        'id': number,
+        'category': 'history',
+        'text': 'Question %d' % number,
+        'answers': ['a', 'b', 'c', 'd'],
+        'correct': 'a',
+    } for number in range(ROUNDS)]
+
+    async def on_finish(standings):
+        pass
+
+    def client(room, user_id):
+        loop = asyncio.get_event_loop()
+
+        def answer(round_number, due):
+            latencies.append(loop.time() - due)
+            room.answer(user_id, round_number, rng.choice('abcd'))
+
+        async def send(message):
+            # Encoding stands in for the cost of writing to the socket
+            json.dumps(message)
+            if message['type'] == 'question':
+                delay = rng.uniform(0, LATEST_ANSWER_SECONDS)
+                loop.call_later(delay, answer, message['round'],
+                                loop.time() + delay)
+
+        return send
+
+    rooms = []
+    for game_id in range(number_of_rooms):
+        room = Room(game_id, questions, PLAYERS_PER_ROOM, on_finish,
+                    round_seconds=ROUND_SECONDS)
+        rooms.append(room)
+        for user_id in range(PLAYERS_PER_ROOM):
+            await room.join(user_id, client(room, user_id))
+
+    await asyncio.gather(*(room.finished.wait() for room in rooms))
+
+    return latencies
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+    for size in sizes:
+        start = time.perf_counter()
+        latencies = asyncio.run(simulate(size, rng))
+        elapsed = time.perf_counter() - start
+
+        stdout.write(
+            '%6d rooms, %7d answers in %6.2fs (ideal %.1fs)  '
+            'answer latency p50 %7.3f ms  p99 %7.3f ms' % (
+                size, len(latencies), elapsed, ROUNDS * ROUND_SECONDS,
+                percentile(latencies, 0.5) * 1000,
+                percentile(latencies, 0.99) * 1000,
+            ))
@@ -0,0 +1,79 @@
+"""Times exporting the history of one user with `size` UserAnswers rows,
+plus a game, score and practice match per hundred answers, in each
+format, and compares the peak memory allocated by the streamed export
+with building the whole NDJSON document from lists in memory"""
+import json
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+
+from Database.benchmarks import heading, report, timed
+from Database.benchmarks.seed import _bulk_create, seed_games, \
+    seed_questions, seed_user_answers, seed_users
+from Database.history_export import RECORDS, export
+from Database.models import Practice, Questions, UserAnswers
+
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+def in_memory(user_id):
+    """The export as it would be built without streaming"""
+    lines = []
+    for record, fields, rows in RECORDS:
+        for row in list(rows(user_id)):
+            values = dict(zip(fields, row))
+            values['record'] = record
+            lines.append(json.dumps(values, cls=DjangoJSONEncoder))
+    return '\n'.join(lines)
+
+
+def streamed(user_id, export_format):
+    size = 0
+    for part in export(user_id, export_format):
+        size += len(part)
+    return size
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(stdout, sizes, repeat):
+    user_id = get_user_model().objects.create_user(
+        username='exported', email='exported@example.com').id
+    opponents = seed_users(3)
+    answered = 0
+
+    for size in sizes:
+        seed_questions(size - Questions.objects.count())
+        question_ids = list(Questions.objects.order_by('id')
+                            .values_list('id', flat=True))
+        seed_user_answers([user_id], question_ids[answered:size],
+                          size - answered)
+        games = (size - answered) // 100
+        seed_games([user_id] + opponents, games)
+        _bulk_create(Practice, (
+            Practice(user_id=user_id, score=number % 10,
+                     time_taken_seconds='60.000')
+            for number in range(games)), 10000)
+        answered = size
+
+        heading(stdout, 'User with %d answers' % UserAnswers.objects.filter(
+            user_id=user_id).count())
+        for export_format in ('ndjson', 'csv'):
+            report(stdout, '  streamed %s' % export_format,
+                   timed(lambda: streamed(user_id, export_format), repeat))
+        report(stdout, '  NDJSON built in memory',
+               timed(lambda: in_memory(user_id), repeat))
+        stdout.write('  peak memory streamed %.1f MB, built in memory '
+                     '%.1f MB' % (
+                         peak_memory(lambda: streamed(user_id, 'ndjson')) /
+                         2 ** 20,
+                         peak_memory(lambda: in_memory(user_id)) / 2 ** 20))
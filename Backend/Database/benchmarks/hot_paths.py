@@ -0,0 +1,152 @@
+"""Times the paths every game goes through, with the queries each runs,
+against seeded volumes of every table the paths read: picking a game's
+questions, recording its answers, finishing it, reading the
+leaderboards, looking up friends and logging in.
+
+Each size is a scale factor for the volumes in PER_SCALE, seeded on top
+of the previous size's rows. Pass --json to keep the results for
+comparing runs."""
+from itertools import cycle
+import random
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db.models import Max
+
+from Database.answer_recorder import AnswerRecorder
+from Database.benchmarks import count_queries, heading, report, timed
+from Database.benchmarks.seed import CATEGORIES, seed_games, \
+    seed_login_attempts, seed_questions, seed_relationships, \
+    seed_user_answers, seed_users
+from Database.friend_graph import friend_graph
+from Database.games import Standing, finish_game, start_game
+from Database.leaderboard import ALL_CATEGORIES, leaderboards, \
+    rebuild_all_time
+from Database.login_throttle import login_attempt_writer
+from Database.models import Games, Questions
+
+
+DEFAULT_SIZES = [1, 10]
+PER_SCALE = {
+    'users': 1000,
+    'questions': 10000,
+    'games': 2000,
+    'answers_per_user': 20,
+    'relationships': 10000,
+    'login_attempts': 20000,
+}
+PLAYERS = 4
+QUESTIONS_PER_GAME = 10
+LOGIN_ACCOUNTS = 10
+PASSWORD = 'password123'
+
+
+def seed(scale, previous, user_ids, rng):
+    """Seeds the rows for `scale` on top of those for `previous` and
+    returns every user id"""
+    added = scale - previous
+    new_users = seed_users(added * PER_SCALE['users'])
+    user_ids = user_ids + new_users
+    seed_questions(added * PER_SCALE['questions'], seed=scale)
+    question_ids = list(Questions.objects.values_list('id', flat=True))
+    seed_user_answers(new_users, question_ids,
+                      PER_SCALE['answers_per_user'], seed=scale)
+    seed_games(user_ids, added * PER_SCALE['games'], PLAYERS,
+               QUESTIONS_PER_GAME, seed=scale)
+    seed_relationships(user_ids, added * PER_SCALE['relationships'], rng)
+    seed_login_attempts(user_ids, added * PER_SCALE['login_attempts'],
+                        seed=scale)
+    rebuild_all_time()
+
+    return user_ids
+
+
+def seed_accounts():
+    """Adds the users that log in, sharing one password hash"""
+    encoded = make_password(PASSWORD)
+    user_model = get_user_model()
+    user_model.objects.bulk_create([
+        user_model(username='hot%d' % number,
+                   email='hot%d@example.com' % number, password=encoded)
+        for number in range(LOGIN_ACCOUNTS)
+    ])
+
+    return ['hot%d@example.com' % number for number in range(LOGIN_ACCOUNTS)]
+
+
+def new_games(total, user_ids, rng):
+    """Adds `total` unfinished games and returns their ids"""
+    last = Games.objects.aggregate(last=Max('id'))['last'] or 0
+    Games.objects.bulk_create([
+        Games(number_of_questions=QUESTIONS_PER_GAME,
+              number_of_players=PLAYERS, category=rng.choice(CATEGORIES),
+              created_by_id=rng.choice(user_ids))
+        for _ in range(total)
+    ])
+
+    return list(Games.objects.filter(id__gt=last).order_by('id')
+                .values_list('id', flat=True))
+
+
+def measure(stdout, label, function, repeat):
+    """Reports `function`'s timings and the queries it runs once the
+    caches are as warm as the timed runs left them"""
+    timings = timed(function, repeat)
+    report(stdout, label, timings, count_queries(function))
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+    user_ids = []
+    previous = 0
+    emails = cycle(seed_accounts())
+
+    for scale in sizes:
+        user_ids = seed(scale, previous, user_ids, rng)
+        previous = scale
+        heading(stdout, 'scale %d: %d users, %d questions, %d games' % (
+            scale, len(user_ids), Questions.objects.count(),
+            Games.objects.count()))
+        question_ids = list(Questions.objects.values_list('id', flat=True))
+
+        def players():
+            return rng.sample(user_ids, PLAYERS)
+
+        games = cycle(new_games(10, user_ids, rng))
+        measure(stdout, '  pick questions', lambda: start_game(
+            next(games), rng, players()), repeat)
+
+        def record_answers():
+            recorder = AnswerRecorder()
+            for user_id in players():
+                for question_id in rng.sample(question_ids,
+                                              QUESTIONS_PER_GAME):
+                    recorder.record(user_id, question_id, rng.random() < 0.6)
+            recorder.flush()
+
+        measure(stdout, '  record a game\'s answers', record_answers, repeat)
+
+        unfinished = iter(Games.objects.filter(id__in=new_games(
+            repeat + 1, user_ids, rng)).order_by('id'))
+
+        def finish():
+            finish_game(next(unfinished), [
+                Standing(user_id, QUESTIONS_PER_GAME - place)
+                for place, user_id in enumerate(players())])
+
+        measure(stdout, '  finish a game', finish, repeat)
+
+        measure(stdout, '  leaderboard page', lambda: leaderboards.top(
+            rng.choice(CATEGORIES + [ALL_CATEGORIES]), 'all-time'), repeat)
+        measure(stdout, '  leaderboard rank', lambda: leaderboards.rank(
+            rng.choice(user_ids)), repeat)
+
+        measure(stdout, '  friends', lambda: friend_graph.friends(
+            rng.choice(user_ids)), repeat)
+        measure(stdout, '  are friends', lambda: friend_graph.are_friends(
+            *players()[:2]), repeat)
+
+        # Through the backend on this thread, so its queries are counted
+        measure(stdout, '  log in', lambda: authenticate(
+            None, username=next(emails), password=PASSWORD), repeat)
+        login_attempt_writer.flush()
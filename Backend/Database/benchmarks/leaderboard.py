@@ -0,0 +1,35 @@
+"""Times the in-memory leaderboard's updates, top 100 and rank lookups
+against re-sorting every user's score on each request"""
+import random
+import time
+
+from Database.benchmarks import report, timed
+from Database.leaderboard import Leaderboard
+
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+    for size in sizes:
+        stdout.write('%d users' % size)
+        rows = [(user_id, rng.uniform(0, 10000), rng.randrange(50))
+                for user_id in range(size)]
+        scores = {user_id: score for user_id, score, _ in rows}
+        board = Leaderboard()
+        start = time.perf_counter()
+        board.load(rows)
+        stdout.write('%-40s %13.3f ms' % (
+            '  load snapshot', (time.perf_counter() - start) * 1000))
+
+        def update():
+            board.add(rng.randrange(size), rng.uniform(0, 60), 1)
+
+        report(stdout, '  game finished (update)', timed(update, repeat))
+        report(stdout, '  top 100', timed(lambda: board.top(100), repeat))
+        report(stdout, '  rank of user', timed(
+            lambda: board.rank(rng.randrange(size)), repeat))
+        report(stdout, '  top 100 by sorting every score', timed(
+            lambda: sorted(scores.items(), key=lambda item: -item[1])[:100],
+            min(repeat, 10)))
@@ -0,0 +1,69 @@
+"""Simulates a credential-stuffing burst and compares the throttle's
+lockout decisions against counting recent LoginAttempts rows"""
+from datetime import timedelta
+import random
+import time
+
+from django.utils import timezone
+
+from Database.benchmarks import report
+from Database.benchmarks.seed import seed_users
+from Database.login_throttle import LocalCounterStore, LoginAttemptWriter, \
+    LoginThrottle
+from Database.models import LoginAttempts
+
+
+DEFAULT_SIZES = [10000, 100000]
+ACCOUNTS = 1000
+ADDRESSES = 200
+WINDOW_SECONDS = 15 * 60
+
+
+def burst(size, user_ids, rng):
+    """Failed attempts against random accounts from a pool of IPs"""
+    return [(rng.choice(user_ids), '10.0.%d.%d' % divmod(
+        rng.randrange(ADDRESSES), 256)) for _ in range(size)]
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+    user_ids = seed_users(ACCOUNTS)
+
+    for size in sizes:
+        attempts = burst(size, user_ids, rng)
+        stdout.write('%d failed attempts' % size)
+
+        writer = LoginAttemptWriter(background=False)
+        throttle = LoginThrottle(LocalCounterStore(), writer=writer,
+                                 window=WINDOW_SECONDS, user_failures=5,
+                                 ip_failures=100)
+        timings = []
+        start = time.perf_counter()
+        for user_id, ip in attempts:
+            began = time.perf_counter()
+            if not throttle.is_locked(str(user_id), ip):
+                throttle.record_failure(str(user_id), ip, user_id)
+            timings.append(time.perf_counter() - began)
+        writer.flush()
+        elapsed = time.perf_counter() - start
+        report(stdout, '  throttle (%.0f attempts/sec)' % (size / elapsed),
+               timings)
+
+        LoginAttempts.objects.all().delete()
+        timings = []
+        start = time.perf_counter()
+        for user_id, _ in attempts:
+            began = time.perf_counter()
+            failures = LoginAttempts.objects.filter(
+                user_id=user_id, login_status='failed',
+                last_login__gte=timezone.now() - timedelta(
+                    seconds=WINDOW_SECONDS),
+            ).count()
+            if failures < 5:
+                LoginAttempts.objects.create(user_id=user_id,
+                                             login_status='failed')
+            timings.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - start
+        report(stdout, '  COUNT(*) (%.0f attempts/sec)' % (size / elapsed),
+               timings)
+        LoginAttempts.objects.all().delete()
@@ -0,0 +1,109 @@
+"""Times the matchmaker with `size` players, without touching the
+database: a join and a sweep with `size` players already queued,
+then a simulation of `size` players arriving over SIMULATED_SECONDS on a
+simulated clock, reporting how many rooms are opened per second of
+matchmaking work and how long players wait, in simulated seconds"""
+from itertools import count
+import random
+import time
+
+from Database.benchmarks import heading, percentile, report, timed
+from Database.matchmaking import ROOM_SIZES, Matchmaker
+from Database.models import Games
+
+
+DEFAULT_SIZES = [5000, 50000]
+SIMULATED_SECONDS = 60
+DRAIN_SECONDS = 60
+STEP_SECONDS = 0.1
+JOINS_TIMED = 1000
+
+
+class Simulation:
+    def __init__(self, seed, **options):
+        self.now = 0
+        self.rng = random.Random(seed)
+        self.opened = []
+        self.matchmaker = Matchmaker(
+            clock=lambda: self.now, rng=random.Random(seed),
+            create_game=self.create_game, **options)
+        self.users = count(1)
+
+    def create_game(self, category, players, user_ids):
+        self.opened.append(user_ids)
+        return len(self.opened)
+
+    def player(self):
+        return (next(self.users),
+                self.rng.choice(Games.CATEGORY)[0],
+                self.rng.choice(ROOM_SIZES),
+                self.rng.gauss(1500, 300))
+
+
+def queued(size):
+    """A simulation with `size` players queued who will never match"""
+    simulation = Simulation(size, window=0, widen_per_second=0,
+                            max_window=0, sweep_seconds=float('inf'))
+    for _ in range(size):
+        simulation.matchmaker.join(*simulation.player())
+    return simulation
+
+
+def simulate(size):
+    """Returns the seconds spent matchmaking, the rooms opened and each
+    matched player's wait"""
+    simulation = Simulation(size)
+    matchmaker = simulation.matchmaker
+    arrivals = size * STEP_SECONDS / SIMULATED_SECONDS
+    joined, rooms, waits = {}, 0, []
+    busy = 0
+    steps = int((SIMULATED_SECONDS + DRAIN_SECONDS) / STEP_SECONDS)
+    for step in range(steps):
+        simulation.now = step * STEP_SECONDS
+        arriving = int(arrivals * (step + 1)) - int(arrivals * step) \
+            if simulation.now < SIMULATED_SECONDS else 0
+        players = [simulation.player() for _ in range(arriving)]
+        for player in players:
+            joined[player[0]] = simulation.now
+
+        start = time.perf_counter()
+        for player in players:
+            matchmaker.join(*player)
+        # Nobody joins while the queues drain, so nothing else sweeps
+        if step % round(1 / STEP_SECONDS) == 0:
+            matchmaker.sweep()
+        busy += time.perf_counter() - start
+
+        for user_ids in simulation.opened:
+            waits.extend(simulation.now - joined.pop(user_id)
+                         for user_id in user_ids)
+        rooms += len(simulation.opened)
+        simulation.opened = []
+
+    return busy, rooms, waits, len(joined)
+
+
+def run(stdout, sizes, repeat):
+    for size in sizes:
+        heading(stdout, '%d players queued' % size)
+        simulation = queued(size)
+        matchmaker = simulation.matchmaker
+        report(stdout, '  %d joins' % JOINS_TIMED, timed(
+            lambda: [matchmaker.join(*simulation.player())
+                     for _ in range(JOINS_TIMED)], repeat))
+        report(stdout, '  sweep with nobody due', timed(
+            lambda: matchmaker._sweep(0, force=True), repeat))
+
+        heading(stdout, '%d players arriving over %d simulated seconds' % (
+            size, SIMULATED_SECONDS))
+        timings = []
+        for _ in range(repeat):
+            busy, rooms, waits, unmatched = simulate(size)
+            timings.append(busy)
+        report(stdout, '  matchmaking work', timings)
+        stdout.write('  %d rooms, %.0f rooms/s, %.0f players/s, %d left '
+                     'unmatched' % (rooms, rooms / busy, len(waits) / busy,
+                                    unmatched))
+        stdout.write('  wait p50 %.1fs, p90 %.1fs, p99 %.1fs, max %.1fs' % (
+            percentile(waits, 0.5), percentile(waits, 0.9),
+            percentile(waits, 0.99), max(waits)))
@@ -0,0 +1,49 @@
+"""Compares picking a game's questions through the in-memory question
+pool against the ORDER BY RANDOM() query it replaces"""
+import time
+
+from Database.benchmarks import report, timed
+from Database.benchmarks.seed import seed_questions
+from Database.models import Questions
+from Database.question_pool import QuestionPool
+
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+QUESTIONS_PER_GAME = 20
+
+
+def run(stdout, sizes, repeat):
+    seeded = 0
+    for size in sizes:
+        seed_questions(size - seeded)
+        seeded = size
+        stdout.write('%d questions' % size)
+
+        def orm_query():
+            list(Questions.objects
+                 .filter(answers__isnull=False, category='history',
+                         difficulty='medium', question_type='multiple')
+                 .order_by('?')
+                 .values_list('id', flat=True)[:QUESTIONS_PER_GAME])
+
+        def orm_random_category():
+            list(Questions.objects.filter(answers__isnull=False)
+                 .order_by('?')
+                 .values_list('id', flat=True)[:QUESTIONS_PER_GAME])
+
+        pool = QuestionPool()
+        pool.invalidate()
+        start = time.perf_counter()
+        pool.index()
+        stdout.write('%-40s %13.3f ms' % (
+            '  pool build', (time.perf_counter() - start) * 1000))
+
+        report(stdout, '  orm history/medium/multiple',
+               timed(orm_query, repeat))
+        report(stdout, '  pool history/medium/multiple', timed(
+            lambda: pool.sample(QUESTIONS_PER_GAME, 'history', 'medium',
+                                'multiple'), repeat))
+        report(stdout, '  orm random category',
+               timed(orm_random_category, repeat))
+        report(stdout, '  pool random category', timed(
+            lambda: pool.sample(QUESTIONS_PER_GAME), repeat))
@@ -0,0 +1,68 @@
+"""Times replaying `size` games of two to six players, drawn from
+`size` / 10 users, from arrays, then with the Results in the database,
+up to DATABASE_LIMIT of them: the full rebuild, reading included, and
+applying one finished game to its players' rows"""
+import numpy
+
+from Database.benchmarks import count_queries, heading, report, timed
+from Database.benchmarks.seed import seed_games, seed_users
+from Database.models import Results
+from Database.ratings import SEATS, rebuild, record_result, replay, rounds
+
+
+DEFAULT_SIZES = [100000, 1000000, 10000000]
+DATABASE_LIMIT = 100000
+USERS_PER_GAME = 0.1
+
+
+def random_seats(size, users, seed=0):
+    """Rows of distinct player indexes, first place first, with -1 for
+    empty seats"""
+    rng = numpy.random.RandomState(seed)
+    seats = rng.randint(0, users, (size, SEATS))
+    seats[numpy.arange(SEATS) >= rng.randint(2, SEATS + 1, (size, 1))] = -1
+    # Redraws the few games that drew a player twice
+    ordered = numpy.sort(seats, axis=1)
+    clashes = ((ordered[:, 1:] == ordered[:, :-1]) &
+               (ordered[:, 1:] >= 0)).any(axis=1)
+    for row in numpy.flatnonzero(clashes).tolist():
+        players = (seats[row] >= 0).sum()
+        seats[row, :players] = rng.choice(users, players, replace=False)
+
+    return seats
+
+
+def new_results(user_ids, count, seed=0):
+    """Adds `count` Results without finishing their games, so no
+    receiver has rated them"""
+    rng = numpy.random.RandomState(seed)
+    return [Results.objects.create(**{
+        '%s_id' % place: user_id for place, user_id in zip(
+            Results.PLACES, rng.choice(user_ids, 4, replace=False).tolist())
+    }) for _ in range(count)]
+
+
+def run(stdout, sizes, repeat):
+    user_ids = []
+    for size in sizes:
+        users = max(100, int(size * USERS_PER_GAME))
+        seats = random_seats(size, users)
+        heading(stdout, '%d games of %d users, %d rounds' % (
+            size, users, rounds(seats, users).max() + 1))
+        report(stdout, '  rounds', timed(lambda: rounds(seats, users),
+                                         repeat))
+        report(stdout, '  replay', timed(lambda: replay(seats, users),
+                                         repeat))
+
+        if size > DATABASE_LIMIT:
+            continue
+        user_ids += seed_users(users - len(user_ids))
+        seed_games(user_ids, size - Results.objects.count(), seed=size)
+        heading(stdout, '%d Results in the database' %
+                Results.objects.count())
+        report(stdout, '  rebuild', timed(rebuild, repeat))
+        results = new_results(user_ids, repeat + 1, seed=size)
+        stdout.write('  one finished game: %d queries' % count_queries(
+            lambda: record_result(results.pop())))
+        report(stdout, '  one finished game', timed(
+            lambda: record_result(results.pop()), repeat))
@@ -0,0 +1,64 @@
+"""Compares computing the category counts on every request against
+serving them from the response cache's local LRU and from the shared
+cache, and counts how often they are computed when a burst of threads
+misses at once"""
+import threading
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from API import versions
+from API.response_cache import response_cache
+from API.views import CategoryList
+from Database.benchmarks import report, timed
+from Database.benchmarks.seed import seed_questions
+
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+BURST = 16
+
+
+def burst(view, request):
+    computes = response_cache.metrics().get('computes', 0)
+    versions.bump('questions')
+    threads = [threading.Thread(target=view, args=(request,))
+               for _ in range(BURST)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return response_cache.metrics().get('computes', 0) - computes
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+def run(stdout, sizes, repeat):
+    factory = APIRequestFactory()
+    view = CategoryList.as_view()
+    request = factory.get('/api/categories/')
+    seeded = 0
+
+    def get():
+        view(request).render()
+
+    def uncached():
+        cache.clear()
+        response_cache.clear_local()
+        get()
+
+    def shared_hit():
+        response_cache.clear_local()
+        get()
+
+    for size in sizes:
+        seed_questions(size - seeded)
+        seeded = size
+        stdout.write('%d questions' % size)
+
+        report(stdout, '  computed every request', timed(uncached, repeat))
+        get()
+        report(stdout, '  shared cache hit', timed(shared_hit, repeat))
+        report(stdout, '  local LRU hit', timed(get, repeat))
+        stdout.write('  %d concurrent misses computed %d time(s)' % (
+            BURST, burst(view, request)))
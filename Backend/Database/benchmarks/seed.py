@@ -0,0 +1,175 @@
+"""Helpers that fill the benchmark database with synthetic rows"""
+from datetime import timedelta
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.db.models import Max
+from django.utils import timezone
+
+from Database.models import Answers, Games, LoginAttempts, Placements, \
+    Questions, Results, UserAnswers, UserRelationships, UserScores
+
+
+CATEGORIES = [name for name, _ in Games.CATEGORY if name != 'random']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+QUESTION_TYPES = ['multiple', 'boolean']
+
+
+def seed_questions(total, batch_size=10000, seed=0):
+    """Adds `total` questions, each with an answer, spread evenly over
+    every category, difficulty and question type"""
+    rng = random.Random(seed)
+    start = Questions.objects.count()
+
+    for offset in range(0, total, batch_size):
+        size = min(batch_size, total - offset)
+        Questions.objects.bulk_create([
+            Questions(
+                category=rng.choice(CATEGORIES),
+                difficulty=rng.choice(DIFFICULTIES),
+                question_type=rng.choice(QUESTION_TYPES),
+                text='Question %d' % (start + offset + number),
+            )
+            for number in range(size)
+        ])
+
+    question_ids = Questions.objects.filter(answers__isnull=True) \
+        .values_list('id', flat=True).order_by('id')
+    batch = []
+    for question_id in question_ids.iterator(chunk_size=batch_size):
+        batch.append(Answers(
+            question_id=question_id,
+            correct_answer='right',
+            incorrect_answer='wrong',
+            incorrect_answer2='wrong',
+            incorrect_answer3='wrong',
+        ))
+        if len(batch) == batch_size:
+            Answers.objects.bulk_create(batch)
+            batch = []
+    Answers.objects.bulk_create(batch)
+
+
+def seed_users(total, batch_size=10000):
+    """Adds `total` users that can't log in and returns their ids"""
+    user_model = get_user_model()
+    start = user_model.objects.aggregate(last=Max('id'))['last'] or 0
+
+    for offset in range(0, total, batch_size):
+        user_model.objects.bulk_create([
+            user_model(
+                username='user%d' % number,
+                email='user%d@example.com' % number,
+                password=UNUSABLE_PASSWORD_PREFIX,
+            )
+            for number in range(start + offset,
+                                start + min(offset + batch_size, total))
+        ])
+
+    return list(user_model.objects.order_by('-id')
+                .values_list('id', flat=True)[:total])
+
+
+def _bulk_create(model, rows, batch_size):
+    """Saves the instances from the iterable `rows`, `batch_size` at a
+    time"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            model.objects.bulk_create(batch)
+            batch = []
+    model.objects.bulk_create(batch)
+
+
+def _new_ids(model, after):
+    return list(model.objects.filter(id__gt=after).order_by('id')
+                .values_list('id', flat=True))
+
+
+def seed_relationships(user_ids, total, rng, batch_size=10000):
+    """Adds `total` new distinct relationships, mostly friendships,
+    stored in canonical order"""
+    statuses = ['friends'] * 8 + ['pending', 'blocked']
+    seen = set(UserRelationships.objects.values_list(
+        'user_first_id', 'user_second_id'))
+    target = len(seen) + total
+
+    def relationships():
+        while len(seen) < target:
+            first, second = sorted(rng.sample(user_ids, 2))
+            if (first, second) in seen:
+                continue
+            seen.add((first, second))
+            yield UserRelationships(
+                user_first_id=first, user_second_id=second,
+                relationship_status=rng.choice(statuses),
+                action_by_id=first)
+
+    _bulk_create(UserRelationships, relationships(), batch_size)
+
+
+def seed_games(user_ids, total, players=4, questions=10, batch_size=10000,
+               seed=0):
+    """Adds `total` finished games of `players` players each, with their
+    Results, Placements and UserScores"""
+    rng = random.Random(seed)
+    line_ups = [rng.sample(user_ids, players) for _ in range(total)]
+
+    last = Results.objects.aggregate(last=Max('id'))['last'] or 0
+    _bulk_create(Results, (
+        Results(**{'%s_id' % place: user_id
+                   for place, user_id in zip(Results.PLACES, line_up)})
+        for line_up in line_ups), batch_size)
+    result_ids = _new_ids(Results, last)
+
+    _bulk_create(Placements, (
+        Placements(result_id=result_id, user_id=user_id, position=position)
+        for result_id, line_up in zip(result_ids, line_ups)
+        for position, user_id in enumerate(line_up, 1)), batch_size)
+    now = timezone.now()
+    _bulk_create(Games, (
+        Games(number_of_questions=questions, number_of_players=players,
+              start_time=now, category=rng.choice(CATEGORIES),
+              created_by_id=line_up[0], winner_id=result_id,
+              finished_at=now)
+        for result_id, line_up in zip(result_ids, line_ups)), batch_size)
+    _bulk_create(UserScores, (
+        UserScores(user_id=user_id, base_score=base,
+                   bonus_score=0, total_score=base,
+                   time_taken_seconds='%.3f' % rng.uniform(5, 60))
+        for line_up in line_ups
+        for user_id, base in zip(line_up, sorted(
+            (rng.randrange(questions + 1) for _ in line_up),
+            reverse=True))), batch_size)
+
+
+def seed_user_answers(user_ids, question_ids, per_user, batch_size=10000,
+                      seed=0):
+    """Adds a UserAnswers row for `per_user` random questions of every
+    user"""
+    rng = random.Random(seed)
+    per_user = min(per_user, len(question_ids))
+    _bulk_create(UserAnswers, (
+        UserAnswers(user_id=user_id, question_id=question_id,
+                    result=rng.choice(['correct', 'incorrect']),
+                    count_correct=rng.randrange(3),
+                    count_incorrect=rng.randrange(3))
+        for user_id in user_ids
+        for question_id in rng.sample(question_ids, per_user)), batch_size)
+
+
+def seed_login_attempts(user_ids, total, days=30, batch_size=10000,
+                        seed=0):
+    """Adds `total` login attempts by random users over the last `days`
+    days, one in ten of them failed"""
+    rng = random.Random(seed)
+    now = timezone.now()
+    _bulk_create(LoginAttempts, (
+        LoginAttempts(user_id=rng.choice(user_ids),
+                      last_login=now - timedelta(
+                          seconds=rng.uniform(0, days * 24 * 60 * 60)),
+                      login_status='failed' if rng.random() < 0.1
+                      else 'success')
+        for _ in range(total)), batch_size)
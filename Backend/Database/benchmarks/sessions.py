@@ -0,0 +1,66 @@
+"""Counts the queries, and times, an authenticated API request under each
+session engine, with the sessions table holding `size` rows, and times
+purging the expired half of them in batches"""
+from datetime import timedelta
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from Database.benchmarks import report, timed
+from Database.sessions import purge_expired
+
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+BATCH_SIZE = 10000
+ENGINES = ('db', 'cached_db', 'cache', 'signed_cookies')
+
+
+def seed_sessions(count):
+    now = timezone.now()
+    batch = []
+    for number in range(count):
+        batch.append(Session(
+            session_key='seeded%d' % number, session_data='',
+            expire_date=now + timedelta(days=-1 if number % 2 else 1)))
+        if len(batch) == BATCH_SIZE:
+            Session.objects.bulk_create(batch)
+            batch = []
+    Session.objects.bulk_create(batch)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+def run(stdout, sizes, repeat):
+    user = get_user_model().objects.create_user(
+        username='benchmark', email='benchmark@example.com')
+
+    for size in sizes:
+        Session.objects.all().delete()
+        seed_sessions(size)
+        stdout.write('%d rows in django_session' % size)
+
+        for engine in ENGINES:
+            with override_settings(SESSION_ENGINE='django.contrib.sessions.'
+                                   'backends.%s' % engine):
+                client = Client()
+                client.force_login(user)
+                client.get('/api/games/')
+                with CaptureQueriesContext(connection) as queries:
+                    client.get('/api/games/')
+                session_queries = sum(
+                    'django_session' in query['sql']
+                    for query in queries.captured_queries)
+                report(stdout, '  %s (%d queries, %d session)' % (
+                    engine, len(queries), session_queries),
+                    timed(lambda: client.get('/api/games/'), repeat))
+
+        with override_settings(
+                SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            start = time.perf_counter()
+            deleted = purge_expired()
+            stdout.write('%-40s %10.2f s  (%d deleted)' % (
+                '  purge expired', time.perf_counter() - start, deleted))
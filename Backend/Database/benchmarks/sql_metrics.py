@@ -0,0 +1,57 @@
+"""Measures what the SQL metrics middleware adds to a page of the
+question catalog: without the middleware, and with every request, the
+default sample or no request recorded. Requests take turns between the
+four set ups so drift in the machine's speed affects them alike"""
+import time
+
+from django.conf import settings
+from django.test import Client, override_settings
+
+from Database.benchmarks import percentile, report
+from Database.benchmarks.seed import seed_questions
+from Database.sql_metrics import sql_metrics
+
+
+DEFAULT_SIZES = [1000, 10000]
+MIDDLEWARE = 'Database.sql_metrics.SQLMetricsMiddleware'
+URL = '/api/questions/?page_size=20'
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+def run(stdout, sizes, repeat):
+    without = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+    profiles = [
+        ('without the middleware', without, 0),
+        ('sampling none', settings.MIDDLEWARE, 0),
+        ('sampling %g' % settings.SQL_METRICS_SAMPLE_RATE,
+         settings.MIDDLEWARE, settings.SQL_METRICS_SAMPLE_RATE),
+        ('sampling every request', settings.MIDDLEWARE, 1),
+    ]
+    seeded = 0
+
+    for size in sizes:
+        seed_questions(size - seeded)
+        seeded = size
+        stdout.write('%d questions, GET %s' % (size, URL))
+
+        clients = []
+        for _, middleware, rate in profiles:
+            # The middleware reads its settings when a client loads it
+            with override_settings(MIDDLEWARE=middleware,
+                                   SQL_METRICS_SAMPLE_RATE=rate):
+                client = Client()
+                client.get(URL)
+            clients.append(client)
+
+        timings = [[] for _ in profiles]
+        for _ in range(repeat):
+            for client, runs in zip(clients, timings):
+                start = time.perf_counter()
+                client.get(URL)
+                runs.append(time.perf_counter() - start)
+
+        baseline = percentile(timings[0], 0.5)
+        for (label, _, _), runs in zip(profiles, timings):
+            report(stdout, '  %s (%+.1f%%)' % (
+                label, (percentile(runs, 0.5) / baseline - 1) * 100), runs)
+        sql_metrics.reset()
@@ -0,0 +1,69 @@
+"""Compares cold starts of a full worker, Database.asgi with
+Database.settings, against a game worker, Database.asgi_game with
+Database.settings_game: each is started `size` times in a new
+interpreter, timing the import of its ASGI application and the whole
+process, and reading the worker's resident memory once it is ready
+(from /proc, so on Linux only). `--repeat` is not used.
+
+The settings modules can be replaced through the BENCHMARK_SETTINGS and
+BENCHMARK_GAME_SETTINGS environment variables, for instance with ones
+pointing at a local database."""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+from Database.benchmarks import report
+
+
+DEFAULT_SIZES = [10]
+PROFILES = [
+    ('full worker', 'BENCHMARK_SETTINGS', 'Database.settings',
+     'Database.asgi'),
+    ('game worker', 'BENCHMARK_GAME_SETTINGS', 'Database.settings_game',
+     'Database.asgi_game'),
+]
+# ru_maxrss carries over the parent's peak through fork and exec on
+# Linux, so the worker reads its resident memory from /proc instead
+WORKER = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+with open('/proc/self/status') as status:
+    rss = next(int(line.split()[1]) for line in status
+               if line.startswith('VmRSS:'))
+print(json.dumps({'import': elapsed, 'modules': len(sys.modules),
+                  'rss': rss}))
+'''
+
+
+def cold_start(settings_module, application):
+    environment = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-c', WORKER, application], env=environment,
+        cwd=settings.BASE_DIR, check=True, stdout=subprocess.PIPE,
+    ).stdout
+    elapsed = time.perf_counter() - start
+
+    return elapsed, json.loads(output.decode())
+
+
+def run(stdout, sizes, repeat):
+    for size in sizes:
+        stdout.write('%d cold starts each' % size)
+        for label, variable, settings_module, application in PROFILES:
+            settings_module = os.environ.get(variable, settings_module)
+            starts = [cold_start(settings_module, application)
+                      for _ in range(size)]
+            stdout.write('  %s, %d modules, RSS %.1f MB' % (
+                label, starts[-1][1]['modules'],
+                max(worker['rss'] for _, worker in starts) / 1024))
+            report(stdout, '    import application',
+                   [worker['import'] for _, worker in starts])
+            report(stdout, '    process start to ready',
+                   [elapsed for elapsed, _ in starts])
@@ -0,0 +1,48 @@
+"""Times reading a user's profile statistics from the running totals
+against aggregating them from the tables they count, with `size` users
+who have played games and answered questions, and times rebuilding
+every user's totals and checking a sample of them"""
+import random
+
+from Database.benchmarks import count_queries, heading, report, timed
+from Database.benchmarks.seed import seed_games, seed_questions, \
+    seed_user_answers, seed_users
+from Database.models import Questions, UserCategoryStats, UserStats
+from Database.user_stats import check, live_stats, rebuild
+
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+GAMES_PER_USER = 5
+ANSWERS_PER_USER = 20
+
+
+def stored(user_id):
+    UserStats.objects.filter(user_id=user_id).first()
+    list(UserCategoryStats.objects.filter(user_id=user_id))
+
+
+def live(user_id):
+    live_stats(user_id=user_id)
+
+
+def run(stdout, sizes, repeat):
+    rng = random.Random(0)
+    seed_questions(1000)
+    question_ids = list(Questions.objects.values_list('id', flat=True))
+    users = []
+
+    for size in sizes:
+        new_users = seed_users(size - len(users))
+        seed_games(new_users, len(new_users) * GAMES_PER_USER // 4)
+        seed_user_answers(new_users, question_ids, ANSWERS_PER_USER)
+        users += new_users
+
+        heading(stdout, '%d users' % size)
+        report(stdout, '  rebuild', timed(rebuild, 1))
+        sample = [rng.choice(users) for _ in range(repeat)]
+        for label, read in (('profile from totals', stored),
+                            ('profile aggregated live', live)):
+            report(stdout, '  %s' % label,
+                   timed(lambda: read(rng.choice(sample)), repeat),
+                   count_queries(lambda: read(sample[0])))
+        report(stdout, '  check 1000 users', timed(check, 1))
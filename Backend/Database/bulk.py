@@ -0,0 +1,137 @@
+"""Batched SQL helpers the ORM in this Django version doesn't provide"""
+import csv
+import io
+
+from django.db import connection
+
+
+# How insert() writes None for COPY, as an empty field is an empty string
+NULL = '\\N'
+
+
+def upsert(model, columns, rows, conflict, increment=(), replace=(),
+           greatest=()):
+    """Inserts `rows`, tuples of values for `columns`, and for rows that
+    clash on the `conflict` columns adds the new values of `increment`
+    columns to the stored ones, overwrites the `replace` columns and
+    keeps the larger of the new and stored `greatest` columns, or the
+    one that isn't null. Works on PostgreSQL and SQLite 3.24+, which
+    share the syntax"""
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    updates = [
+        '{column} = {table}.{column} + EXCLUDED.{column}'.format(
+            table=table, column=quote(column))
+        for column in increment
+    ] + [
+        '{column} = EXCLUDED.{column}'.format(column=quote(column))
+        for column in replace
+    ] + [
+        '{column} = CASE WHEN {table}.{column} IS NULL OR '
+        'EXCLUDED.{column} > {table}.{column} THEN EXCLUDED.{column} '
+        'ELSE {table}.{column} END'.format(table=table, column=quote(column))
+        for column in greatest
+    ]
+    row_placeholder = '(%s)' % ', '.join(['%s'] * len(columns))
+
+    max_params = connection.features.max_query_params or 5000
+    batch_size = max(1, max_params // len(columns))
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                'INSERT INTO {table} ({columns}) VALUES {values} '
+                'ON CONFLICT ({conflict}) DO UPDATE SET {updates}'.format(
+                    table=table,
+                    columns=', '.join(quote(column) for column in columns),
+                    values=', '.join([row_placeholder] * len(batch)),
+                    conflict=', '.join(quote(column) for column in conflict),
+                    updates=', '.join(updates),
+                ),
+                [value for row in batch for value in row],
+            )
+
+
+def update(model, columns, rows, key='id', changed_only=False):
+    """Sets `columns` on the rows whose `key` column matches the first
+    value of each of `rows`, tuples of (key, *values), with one
+    UPDATE ... FROM (VALUES ...) per batch, and returns how many rows
+    were updated. With `changed_only`, rows whose non-null columns
+    already hold the new values are left alone. Works on PostgreSQL and
+    SQLite 3.33+. PostgreSQL infers each column's type from its values,
+    so a column can't be None in every row of a batch"""
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    assignments = ', '.join(
+        '{column} = batch.column{position}'.format(column=quote(column),
+                                                   position=position)
+        for position, column in enumerate(columns, 2)
+    )
+    condition = '{table}.{key} = batch.column1'.format(table=table,
+                                                       key=quote(key))
+    if changed_only:
+        condition += ' AND (%s)' % ' OR '.join(
+            '{table}.{column} <> batch.column{position}'.format(
+                table=table, column=quote(column), position=position)
+            for position, column in enumerate(columns, 2)
+        )
+    row_placeholder = '(%s)' % ', '.join(['%s'] * (len(columns) + 1))
+
+    max_params = connection.features.max_query_params or 5000
+    batch_size = max(1, max_params // (len(columns) + 1))
+
+    updated = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                'UPDATE {table} SET {assignments} FROM (VALUES {values}) '
+                'AS batch WHERE {condition}'.format(
+                    table=table,
+                    assignments=assignments,
+                    values=', '.join([row_placeholder] * len(batch)),
+                    condition=condition,
+                ),
+                [value for row in batch for value in row],
+            )
+            updated += cursor.rowcount
+
+    return updated
+
+
+def insert(model, objects, batch_size=10000):
+    """Inserts unsaved `model` instances without sending signals or
+    reading their ids back: with COPY on PostgreSQL, which loads rows
+    several times faster than INSERT, and with bulk_create elsewhere.
+    Instances keep their primary keys when the first one has one set"""
+    with_pk = bool(objects) and objects[0].pk is not None
+    fields = [field for field in model._meta.concrete_fields
+              if with_pk or not field.primary_key]
+
+    if connection.vendor != 'postgresql':
+        # bulk_create in this Django version doesn't cap a given batch
+        # size at the backend's limit on parameters
+        model.objects.bulk_create(objects, batch_size=min(
+            batch_size, connection.ops.bulk_batch_size(fields, objects)))
+        return
+
+    quote = connection.ops.quote_name
+    statement = "COPY {table} ({columns}) FROM STDIN " \
+        "WITH (FORMAT csv, NULL '\\N')".format(
+            table=quote(model._meta.db_table),
+            columns=', '.join(quote(field.column) for field in fields))
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(objects), batch_size):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for instance in objects[start:start + batch_size]:
+                row = []
+                for field in fields:
+                    value = field.get_db_prep_save(
+                        field.pre_save(instance, True), connection)
+                    row.append(NULL if value is None else value)
+                writer.writerow(row)
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
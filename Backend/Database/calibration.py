@@ -0,0 +1,130 @@
+"""Recalibrates Questions.difficulty from how often it is answered
+correctly.
+
+Every UserAnswers row for the questions being calibrated is streamed in
+chunks, through a server-side cursor on PostgreSQL, and summed per
+question with numpy, so memory stays flat however many rows there are.
+Each question gets its accuracy and a Rasch (1PL IRT) difficulty, the
+log-odds of a player of average ability answering it wrongly, with one
+success and one failure added so questions with few answers aren't
+pushed to the extremes. Questions with at least
+MIN_ANSWERS answers are then relabelled easy, medium or hard.
+
+Runs are incremental: only questions with answers written since the
+previous run, less an overlap for transactions still open at the time,
+are recalibrated."""
+from datetime import timedelta
+
+import numpy
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from Database.bulk import update
+from Database.models import Questions, UserAnswers
+from Database.question_pool import question_pool
+from Database.signals import rows_changed
+
+
+CHUNK_SIZE = 50000
+MIN_ANSWERS = 30
+EASY_ACCURACY = 0.7
+HARD_ACCURACY = 0.4
+OVERLAP = timedelta(minutes=5)
+
+
+def last_calibrated():
+    return Questions.objects.aggregate(
+        last=Max('calibrated_at'))['last']
+
+
+def answer_counts(answers, size, chunk_size=CHUNK_SIZE):
+    """Sums count_correct and count_incorrect per question id over
+    `answers`, returning two arrays indexed by question id"""
+    correct = numpy.zeros(size, dtype=numpy.int64)
+    incorrect = numpy.zeros(size, dtype=numpy.int64)
+    rows = answers.order_by().values_list(
+        'question_id', 'count_correct', 'count_incorrect')
+
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            _add_chunk(chunk, correct, incorrect)
+            chunk = []
+    _add_chunk(chunk, correct, incorrect)
+
+    return correct, incorrect
+
+
+def _add_chunk(chunk, correct, incorrect):
+    if not chunk:
+        return
+    block = numpy.array(chunk, dtype=numpy.int64)
+    correct += numpy.bincount(block[:, 0], weights=block[:, 1],
+                              minlength=len(correct)).astype(numpy.int64)
+    incorrect += numpy.bincount(block[:, 0], weights=block[:, 2],
+                                minlength=len(incorrect)).astype(numpy.int64)
+
+
+def difficulty_scores(correct, incorrect):
+    """Returns the raw accuracy and the smoothed Rasch difficulty"""
+    answered = correct + incorrect
+    accuracy = correct / numpy.maximum(answered, 1)
+    smoothed = (correct + 1) / (answered + 2)
+
+    return accuracy, numpy.log((1 - smoothed) / smoothed)
+
+
+def labels(accuracy, answered):
+    """Returns the difficulty label for each question, or '' for those
+    with too few answers to relabel"""
+    return numpy.where(
+        answered < MIN_ANSWERS, '',
+        numpy.where(accuracy >= EASY_ACCURACY, 'easy',
+                    numpy.where(accuracy < HARD_ACCURACY, 'hard',
+                                'medium')))
+
+
+def calibrate(full=False, chunk_size=CHUNK_SIZE):
+    """Recalibrates the questions answered since the last run, or every
+    answered question when `full` is set, and returns how many were
+    calibrated and how many changed label"""
+    started = timezone.now()
+    size = (Questions.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    answers = UserAnswers.objects.filter(question_id__lt=size)
+    since = None if full else last_calibrated()
+    if since is not None:
+        answers = answers.filter(question_id__in=UserAnswers.objects.filter(
+            last_answered__gte=since - OVERLAP).values('question_id'))
+
+    correct, incorrect = answer_counts(answers, size, chunk_size)
+
+    question_ids = numpy.flatnonzero(correct + incorrect)
+    correct, incorrect = correct[question_ids], incorrect[question_ids]
+    answered = correct + incorrect
+    accuracy, scores = difficulty_scores(correct, incorrect)
+    new_labels = labels(accuracy, answered)
+
+    stats, new_difficulties = [], []
+    for question_id, count, rate, score, label in zip(
+            question_ids.tolist(), answered.tolist(), accuracy.tolist(),
+            scores.tolist(), new_labels.tolist()):
+        stats.append((question_id, count, rate, score, started))
+        if label:
+            new_difficulties.append((question_id, label))
+
+    with transaction.atomic():
+        update(Questions, ['answer_count', 'accuracy', 'difficulty_score',
+                           'calibrated_at'], stats)
+        relabelled = update(Questions, ['difficulty'], new_difficulties,
+                            changed_only=True)
+
+    # The raw UPDATEs don't send the signals that keep the pool in step
+    if relabelled:
+        question_pool.invalidate()
+    if stats:
+        rows_changed.send(sender=Questions)
+
+    return {'calibrated': len(stats), 'relabelled': relabelled}
@@ -0,0 +1,169 @@
+"""Friend graph lookups served from cached adjacency sets.
+
+Each user's friends, blocks and pending requests are loaded with one
+query and kept in the cache until one of their relationships is saved
+or deleted, so friendship and block checks are set lookups and mutual
+friends and suggestions are set operations rather than self-joins.
+
+The most recently used adjacencies are also kept unpickled in each
+process, in a bounded LRU. Every change bumps the user's generation
+counter in the cache, so a check costs reading that counter rather than
+the whole adjacency, and other processes drop their copy."""
+from collections import Counter, OrderedDict, namedtuple
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Database.generations import bump_generation, current_generations
+from Database.models import UserRelationships
+
+
+MAX_USERS = 1000
+
+Adjacency = namedtuple('Adjacency', [
+    'friends',
+    'blocked',
+    'requests_sent',
+    'requests_received',
+])
+
+
+def _cache_key(user_id):
+    return 'friend_graph:%d' % user_id
+
+
+def _generation_key(user_id):
+    return 'friend_graph:%d:generation' % user_id
+
+
+class FriendGraph:
+    """Answers relationship questions for a user from their adjacency,
+    keeping the most recently used `max_users` in the process"""
+
+    def __init__(self, timeout=None, max_users=MAX_USERS):
+        self.timeout = timeout or settings.FRIEND_GRAPH_CACHE_SECONDS
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._adjacencies = OrderedDict()
+
+    def _remember(self, user_id, generation, adjacency):
+        self._adjacencies[user_id] = (generation, adjacency)
+        self._adjacencies.move_to_end(user_id)
+        while len(self._adjacencies) > self.max_users:
+            self._adjacencies.popitem(last=False)
+
+    def adjacency(self, user_id):
+        return self.adjacencies([user_id])[user_id]
+
+    def adjacencies(self, user_ids):
+        """Returns each user's Adjacency, reading the ones the process
+        has no current copy of from the cache with a single get_many and
+        loading the ones missing there too"""
+        user_ids = list(user_ids)
+        generations = dict(zip(user_ids, current_generations(
+            [_generation_key(user_id) for user_id in user_ids])))
+        found, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                current = self._adjacencies.get(user_id)
+                if current is not None and \
+                        current[0] == generations[user_id]:
+                    self._adjacencies.move_to_end(user_id)
+                    found[user_id] = current[1]
+                else:
+                    missing.append(user_id)
+        if not missing:
+            return found
+
+        # Each cached adjacency is stored with the generation it was
+        # loaded at, which was read before the query, so one loaded
+        # while a relationship changed is never taken as current
+        cached = cache.get_many([_cache_key(user_id) for user_id in missing])
+        loaded, stored = {}, {}
+        for user_id in missing:
+            entry = cached.get(_cache_key(user_id))
+            if entry is not None and entry[0] == generations[user_id]:
+                loaded[user_id] = entry[1]
+            else:
+                loaded[user_id] = self._load(user_id)
+                stored[_cache_key(user_id)] = (generations[user_id],
+                                               loaded[user_id])
+        if stored:
+            cache.set_many(stored, self.timeout)
+
+        with self._lock:
+            for user_id, adjacency in loaded.items():
+                self._remember(user_id, generations[user_id], adjacency)
+        found.update(loaded)
+
+        return found
+
+    def _load(self, user_id):
+        sets = {field: set() for field in Adjacency._fields}
+        rows = UserRelationships.objects.filter(
+            Q(user_first=user_id) | Q(user_second=user_id),
+        ).values_list('user_first_id', 'user_second_id',
+                      'relationship_status', 'action_by_id')
+
+        for first, second, status, action_by in rows:
+            other = second if first == user_id else first
+            if status == 'friends':
+                sets['friends'].add(other)
+            elif status == 'blocked':
+                sets['blocked'].add(other)
+            elif action_by == user_id:
+                sets['requests_sent'].add(other)
+            else:
+                sets['requests_received'].add(other)
+
+        return Adjacency(**{field: frozenset(members)
+                            for field, members in sets.items()})
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            bump_generation(_generation_key(user_id))
+            with self._lock:
+                self._adjacencies.pop(user_id, None)
+        cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+    def friends(self, user_id):
+        return self.adjacency(user_id).friends
+
+    def are_friends(self, user_id, other_id):
+        return other_id in self.adjacency(user_id).friends
+
+    def is_blocked(self, user_id, other_id):
+        """Whether either user has blocked the other"""
+        return other_id in self.adjacency(user_id).blocked
+
+    def mutual_friends(self, user_id, other_id):
+        adjacencies = self.adjacencies([user_id, other_id])
+        return adjacencies[user_id].friends & adjacencies[other_id].friends
+
+    def suggestions(self, user_id, limit=10):
+        """Friends of friends the user has no relationship with yet,
+        with the most mutual friends first, as (user id, mutual count)"""
+        adjacency = self.adjacency(user_id)
+        excluded = adjacency.friends | adjacency.blocked | \
+            adjacency.requests_sent | adjacency.requests_received | \
+            {user_id}
+
+        counts = Counter()
+        for friend in self.adjacencies(adjacency.friends).values():
+            counts.update(friend.friends - excluded)
+
+        return sorted(counts.items(),
+                      key=lambda item: (-item[1], item[0]))[:limit]
+
+
+friend_graph = FriendGraph()
+
+
+@receiver(post_save, sender=UserRelationships)
+@receiver(post_delete, sender=UserRelationships)
+def invalidate_friend_graph(sender, instance, **kwargs):
+    friend_graph.invalidate(instance.user_first_id, instance.user_second_id)
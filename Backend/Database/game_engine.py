@@ -0,0 +1,288 @@
+"""An asyncio engine that runs each multiplayer game as an in-memory
+room: players join over a WebSocket, every round is timed on the event
+loop and answers are scored in memory until the game ends"""
+import asyncio
+from decimal import Decimal
+import logging
+
+from asgiref.sync import sync_to_async
+
+from Database.answer_recorder import AnswerRecorder
+from Database.games import Standing, finish_game, load_game, \
+    pick_questions
+
+
+logger = logging.getLogger(__name__)
+
+ROUND_SECONDS = 20
+LOBBY_SECONDS = 60
+BONUS_PLACES = Decimal('0.001')
+
+
+class Player:
+    """A player's connection and running score within a room"""
+    __slots__ = ('standing', 'send', 'connected')
+
+    def __init__(self, user_id, send):
+        self.standing = Standing(user_id)
+        self.send = send
+        self.connected = True
+
+
+class Room:
+    """Runs one game. `send` callbacks are coroutines taking a message
+    dictionary and `on_finish` is a coroutine given the standings once
+    the last round has been scored. Answers are passed on to `recorder`,
+    which is flushed between rounds whenever its thresholds are met.
+    When `choose_questions` is given it is a coroutine that replaces
+    `questions` once the lobby closes, given the ids of the players.
+    `on_close` is called once the room stops, whether the game finished
+    or failed"""
+
+    def __init__(self, game_id, questions, number_of_players, on_finish,
+                 round_seconds=ROUND_SECONDS, lobby_seconds=LOBBY_SECONDS,
+                 recorder=None, choose_questions=None, on_close=None):
+        self.game_id = game_id
+        self.questions = questions
+        self.number_of_players = number_of_players
+        self.round_seconds = round_seconds
+        self.lobby_seconds = lobby_seconds
+        self.players = {}
+        self.recorder = recorder
+        self.finished = asyncio.Event()
+        self._on_finish = on_finish
+        self._choose_questions = choose_questions
+        self._on_close = on_close
+        self._full = asyncio.Event()
+        self._task = None
+        self._round = None
+        self._round_started = 0.0
+        self._round_answers = {}
+        self._round_complete = asyncio.Event()
+
+    @property
+    def started(self):
+        return self._full.is_set()
+
+    async def join(self, user_id, send):
+        """Adds a player, or reconnects one, and starts the game task on
+        the first join"""
+        player = self.players.get(user_id)
+        if player is None:
+            if self.started:
+                raise ValueError('Game %d has already started'
+                                 % self.game_id)
+            player = self.players[user_id] = Player(user_id, send)
+        else:
+            player.send = send
+            player.connected = True
+
+        if len(self.players) >= self.number_of_players:
+            self._full.set()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+        await self.broadcast({'type': 'joined', 'user': user_id,
+                              'players': list(self.players)})
+
+    def leave(self, user_id):
+        """Stops sending to a player, who keeps their score so far"""
+        player = self.players.get(user_id)
+        if player is not None:
+            player.connected = False
+            self._check_round_complete()
+
+    def answer(self, user_id, round_number, answer):
+        """Records a player's first answer to the current round and
+        returns whether it was accepted"""
+        if round_number != self._round or user_id not in self.players or \
+                user_id in self._round_answers:
+            return False
+
+        loop = asyncio.get_event_loop()
+        self._round_answers[user_id] = (
+            answer, loop.time() - self._round_started)
+        self._check_round_complete()
+
+        return True
+
+    def _check_round_complete(self):
+        if self._round is not None and all(
+                user_id in self._round_answers
+                for user_id, player in self.players.items()
+                if player.connected):
+            self._round_complete.set()
+
+    async def broadcast(self, message):
+        """Sends a message to every connected player. A player whose send
+        fails, as it does when their socket closed before their receive
+        loop noticed, is marked disconnected rather than failing the
+        game"""
+        sending = [(user_id, player, player.send)
+                   for user_id, player in self.players.items()
+                   if player.connected]
+        results = await asyncio.gather(
+            *(send(message) for _, _, send in sending),
+            return_exceptions=True)
+
+        dropped = False
+        for (user_id, player, send), result in zip(sending, results):
+            if isinstance(result, BaseException):
+                logger.warning('Could not send to user %s in game %d: %r',
+                               user_id, self.game_id, result)
+                # Unless they reconnected meanwhile
+                if player.send is send:
+                    player.connected = False
+                    dropped = True
+        if dropped:
+            self._check_round_complete()
+
+    async def run(self):
+        """Plays the game, then sets `finished` and closes the room even
+        if the game failed"""
+        try:
+            await self._play()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Game %d failed', self.game_id)
+        finally:
+            self.finished.set()
+            if self._on_close is not None:
+                self._on_close()
+
+    async def _play(self):
+        try:
+            await asyncio.wait_for(self._full.wait(), self.lobby_seconds)
+        except asyncio.TimeoutError:
+            self._full.set()
+
+        if self._choose_questions is not None:
+            self.questions = await self._choose_questions(
+                list(self.players))
+        await self.broadcast({'type': 'start',
+                              'players': list(self.players),
+                              'rounds': len(self.questions)})
+
+        loop = asyncio.get_event_loop()
+        for number, question in enumerate(self.questions):
+            self._round_answers = {}
+            self._round_complete.clear()
+            self._round = number
+            self._round_started = loop.time()
+            await self.broadcast({
+                'type': 'question',
+                'round': number,
+                'category': question['category'],
+                'text': question['text'],
+                'answers': question['answers'],
+                'seconds': self.round_seconds,
+            })
+            self._check_round_complete()
+
+            try:
+                await asyncio.wait_for(self._round_complete.wait(),
+                                       self.round_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+            self._round = None
+            self._score_round(question)
+            if self.recorder is not None and self.recorder.should_flush():
+                await sync_to_async(self.recorder.flush)()
+            await self.broadcast({
+                'type': 'round_result',
+                'round': number,
+                'correct': question['correct'],
+                'scores': {
+                    user_id: str(player.standing.total_score)
+                    for user_id, player in self.players.items()
+                },
+            })
+
+        standings = self.standings()
+        await self._on_finish(standings)
+        await self.broadcast({
+            'type': 'finished',
+            'standings': [standing.user_id for standing in standings],
+        })
+
+    def _score_round(self, question):
+        for user_id, player in self.players.items():
+            standing = player.standing
+            answer, elapsed = self._round_answers.get(
+                user_id, (None, self.round_seconds))
+            standing.time_taken_seconds += elapsed
+            if answer is None:
+                continue
+
+            correct = answer == question['correct']
+            if self.recorder is not None:
+                self.recorder.record(user_id, question['id'], correct)
+            if correct:
+                remaining = max(0.0, 1 - elapsed / self.round_seconds)
+                standing.base_score += 1
+                standing.bonus_score += Decimal(remaining) \
+                    .quantize(BONUS_PLACES)
+
+    def standings(self):
+        """Orders players by total score, breaking ties on time taken"""
+        return sorted(
+            (player.standing for player in self.players.values()),
+            key=lambda standing: (-standing.total_score,
+                                  standing.time_taken_seconds),
+        )
+
+
+class RoomRegistry:
+    """Keeps one room per game that is being played in this process"""
+
+    def __init__(self, round_seconds=ROUND_SECONDS,
+                 lobby_seconds=LOBBY_SECONDS):
+        self.round_seconds = round_seconds
+        self.lobby_seconds = lobby_seconds
+        self.rooms = {}
+        self._opening = {}
+
+    async def open(self, game_id):
+        """Returns the room for a game, loading it from the database the
+        first time it is asked for"""
+        room = self.rooms.get(game_id)
+        if room is not None:
+            return room
+
+        opening = self._opening.get(game_id)
+        if opening is None:
+            opening = self._opening[game_id] = asyncio.ensure_future(
+                self._create(game_id))
+        try:
+            return await asyncio.shield(opening)
+        finally:
+            self._opening.pop(game_id, None)
+
+    async def _create(self, game_id):
+        game = await sync_to_async(load_game)(game_id)
+        recorder = AnswerRecorder()
+
+        async def choose_questions(user_ids):
+            return await sync_to_async(pick_questions)(game, user_ids)
+
+        async def on_finish(standings):
+            await sync_to_async(finish_game)(game, standings, recorder)
+
+        def on_close():
+            self.rooms.pop(game_id, None)
+
+        room = self.rooms[game_id] = Room(
+            game_id, [], game.number_of_players, on_finish,
+            round_seconds=self.round_seconds,
+            lobby_seconds=self.lobby_seconds,
+            recorder=recorder,
+            choose_questions=choose_questions,
+            on_close=on_close,
+        )
+
+        return room
+
+
+rooms = RoomRegistry()
@@ -0,0 +1,142 @@
+"""The only places a real-time game touches the database: loading it
+and its questions when it starts and recording the scores when it
+ends"""
+from contextlib import nullcontext
+from dataclasses import dataclass
+from decimal import Decimal
+import random
+
+from django.db import transaction
+from django.utils import timezone
+
+from Database.answered_questions import answered_questions
+from Database.models import Answers, Games, Practice, Results, \
+    UserScores
+from Database.question_pool import question_pool
+from Database.signals import game_finished
+
+
+@dataclass
+class Standing:
+    """A player's final score in a game"""
+    user_id: int
+    base_score: int = 0
+    bonus_score: Decimal = Decimal('0.000')
+    time_taken_seconds: float = 0.0
+
+    @property
+    def total_score(self):
+        return self.base_score + self.bonus_score
+
+
+def load_game(game_id):
+    """Returns the Games row for a game that hasn't finished yet and has
+    enough questions to be played"""
+    game = Games.objects.get(pk=game_id)
+    if game.finished_at is not None or game.winner_id is not None:
+        raise ValueError('Game %d has already finished' % game_id)
+    available = question_pool.count(game.category)
+    if available < game.number_of_questions:
+        raise ValueError('Only %d questions match game %d'
+                         % (available, game_id))
+
+    return game
+
+
+def pick_questions(game, user_ids=(), rng=random):
+    """Returns the questions a game will be played with, as plain
+    dictionaries with the answers already shuffled, preferring questions
+    none of `user_ids` has answered before"""
+    exclude = answered_questions.union(user_ids) if user_ids else None
+    question_ids = question_pool.sample(game.number_of_questions,
+                                        game.category, exclude=exclude)
+
+    answers = {}
+    for answer in Answers.objects.filter(question_id__in=question_ids) \
+            .select_related('question'):
+        answers.setdefault(answer.question_id, answer)
+
+    questions = []
+    for question_id in question_ids:
+        answer = answers[question_id]
+        choices = [choice for choice in (
+            answer.correct_answer,
+            answer.incorrect_answer,
+            answer.incorrect_answer2,
+            answer.incorrect_answer3,
+        ) if choice]
+        rng.shuffle(choices)
+        questions.append({
+            'id': question_id,
+            'category': answer.question.category,
+            'text': answer.question.text,
+            'answers': choices,
+            'correct': answer.correct_answer,
+        })
+
+    return questions
+
+
+def start_game(game_id, rng=random, user_ids=()):
+    """Returns the Games row and the questions it will be played with"""
+    game = load_game(game_id)
+
+    return game, pick_questions(game, user_ids, rng)
+
+
+def _flushing(recorder):
+    """recorder.flushing(), or one that writes nothing without a
+    recorder"""
+    if recorder is None:
+        return nullcontext(lambda: 0)
+    return recorder.flushing()
+
+
+def finish_game(game, standings, recorder=None):
+    """Records every player's score and, for games with at least two
+    players, the finishing order. `standings` runs from first to last.
+    Answers still buffered in `recorder` are written in the same
+    transaction, and buffered again if it rolls back. Raises ValueError
+    if the game has already finished"""
+    with _flushing(recorder) as write_answers, transaction.atomic():
+        finished_at = timezone.now()
+        if not Games.objects.filter(pk=game.pk, finished_at__isnull=True) \
+                .update(finished_at=finished_at):
+            raise ValueError('Game %d has already finished' % game.pk)
+        game.finished_at = finished_at
+        write_answers()
+
+        UserScores.objects.bulk_create([
+            UserScores(
+                user_id=standing.user_id,
+                base_score=standing.base_score,
+                bonus_score=standing.bonus_score,
+                total_score=standing.total_score,
+                time_taken_seconds='%.3f' % standing.time_taken_seconds,
+            )
+            for standing in standings
+        ])
+
+        result = None
+        if len(standings) >= 2:
+            result = Results.objects.create(**{
+                '%s_id' % place: standing.user_id
+                for place, standing in zip(Results.PLACES, standings)
+            })
+            game.winner = result
+            game.save(update_fields=['winner'])
+
+        game_finished.send(sender=Games, game=game, result=result,
+                           standings=standings)
+
+    return result
+
+
+def finish_practice(user_id, score, time_taken_seconds, recorder=None):
+    """Records a practice match, with the answers still buffered in
+    `recorder`, in one transaction"""
+    with _flushing(recorder) as write_answers, transaction.atomic():
+        write_answers()
+        return Practice.objects.create(
+            user_id=user_id, score=score,
+            time_taken_seconds='%.3f' % time_taken_seconds)
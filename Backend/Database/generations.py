@@ -0,0 +1,36 @@
+"""Generation counters kept in the shared cache.
+
+A process keeps its own copy of something cached alongside the
+generation it was loaded at, and every change bumps the counter, so
+comparing the two tells whether the copy is still current at the cost
+of reading one small integer."""
+import random
+
+from django.core.cache import cache
+
+
+def _new_generation():
+    # Random rather than 0 so a counter that was evicted from the cache
+    # never comes back with a value a stale copy was loaded at
+    return random.getrandbits(48)
+
+
+def bump_generation(key):
+    """Moves the generation at `key` on and returns the new one"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        generation = _new_generation()
+        cache.set(key, generation, timeout=None)
+        return generation
+
+
+def current_generations(keys):
+    """Returns the generation at each of `keys`, in the same order"""
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, _new_generation(), timeout=None)
+            generations[key] = cache.get(key)
+
+    return [generations[key] for key in keys]
@@ -0,0 +1,15 @@
+"""Password hashers whose cost is set in settings"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 with PASSWORD_HASH_ITERATIONS iterations.
+
+    It keeps the pbkdf2_sha256 algorithm name, so existing hashes still
+    verify, and hashes made with a different iteration count are
+    reported by must_update() and rehashed on the user's next login."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
@@ -0,0 +1,119 @@
+"""Exports everything recorded about a user's play: the games they were
+placed in, their scores, practice matches and answers.
+
+The export is produced as a stream of text parts, each holding up to
+CHUNK_SIZE records, read from one table at a time with `iterator()`, so
+PostgreSQL sends the rows through a server-side cursor and memory use
+doesn't grow with the length of the history. Records are NDJSON objects
+with a `record` key naming their table, or CSV rows with a column for
+every field of every record, left empty where a record has no such
+field."""
+import csv
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from Database.models import Placements, Practice, UserAnswers, UserScores
+
+
+CHUNK_SIZE = 2000
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _games(user_id):
+    return Placements.objects.filter(user_id=user_id).order_by(
+        'result_id',
+    ).values_list(
+        'result__games__id', 'result__games__category',
+        'result__games__number_of_questions',
+        'result__games__number_of_players', 'result__games__start_time',
+        'position')
+
+
+def _scores(user_id):
+    return UserScores.objects.filter(user_id=user_id).order_by('id') \
+        .values_list('id', 'base_score', 'bonus_score', 'total_score',
+                     'time_taken_seconds')
+
+
+def _practice(user_id):
+    return Practice.objects.filter(user_id=user_id).order_by('id') \
+        .values_list('id', 'score', 'start_time', 'time_taken_seconds')
+
+
+def _answers(user_id):
+    return UserAnswers.objects.filter(user_id=user_id).order_by('id') \
+        .values_list('question_id', 'question__category', 'result',
+                     'count_correct', 'count_incorrect', 'last_answered')
+
+
+# (record, its fields, the user's rows as tuples of those fields)
+RECORDS = [
+    ('game', ('game', 'category', 'number_of_questions',
+              'number_of_players', 'start_time', 'position'), _games),
+    ('score', ('id', 'base_score', 'bonus_score', 'total_score',
+               'time_taken_seconds'), _scores),
+    ('practice', ('id', 'score', 'start_time', 'time_taken_seconds'),
+     _practice),
+    ('answer', ('question', 'category', 'result', 'count_correct',
+                'count_incorrect', 'last_answered'), _answers),
+]
+COLUMNS = ['record'] + list(dict.fromkeys(
+    field for _, fields, _ in RECORDS for field in fields))
+
+
+def _rows(user_id, chunk_size):
+    for record, fields, rows in RECORDS:
+        for row in rows(user_id).iterator(chunk_size=chunk_size):
+            yield record, fields, row
+
+
+def _ndjson(user_id, chunk_size):
+    encode = DjangoJSONEncoder(separators=(',', ':')).encode
+    lines = []
+    for record, fields, row in _rows(user_id, chunk_size):
+        values = dict(zip(fields, row))
+        values['record'] = record
+        lines.append(encode(values))
+        if len(lines) == chunk_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _csv(user_id, chunk_size):
+    encoder = DjangoJSONEncoder()
+    positions = {column: position for position, column in enumerate(COLUMNS)}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    written = 0
+    for record, fields, row in _rows(user_id, chunk_size):
+        values = [''] * len(COLUMNS)
+        values[0] = record
+        for field, value in zip(fields, row):
+            if value is not None:
+                values[positions[field]] = value if isinstance(
+                    value, (str, int)) else encoder.default(value)
+        writer.writerow(values)
+        written += 1
+        if written == chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            written = 0
+    yield buffer.getvalue()
+
+
+def export(user_id, export_format='ndjson', chunk_size=CHUNK_SIZE):
+    """Yields the user's history in `export_format`, one of FORMATS, in
+    parts of up to `chunk_size` records"""
+    if export_format not in FORMATS:
+        raise ValueError('Unknown export format %r' % export_format)
+
+    writer = _ndjson if export_format == 'ndjson' else _csv
+    return writer(user_id, chunk_size)
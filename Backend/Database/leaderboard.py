@@ -0,0 +1,426 @@
+"""Leaderboards kept in memory and updated as games finish.
+
+Each board ranks users by the total score they earned in a category (or
+across all of them) during a day, a week or all time. Scores added in
+this process are written to LeaderboardEntries as increments every
+`snapshot_seconds`, and rows changed by other processes since the last
+sync are read back, so every worker converges on the same ranking."""
+import atexit
+from datetime import date, timedelta
+from decimal import Decimal
+from functools import partial
+import logging
+import random
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.dispatch import receiver
+from django.utils import timezone
+
+from Database.bulk import upsert
+from Database.models import LeaderboardEntries, Placements, UserScores
+from Database.signals import game_finished, rows_changed
+
+
+logger = logging.getLogger(__name__)
+
+ALL_CATEGORIES = 'all'
+WINDOWS = ('daily', 'weekly', 'all-time')
+ALL_TIME_START = date(1970, 1, 1)
+SNAPSHOT_SECONDS = 60
+MAX_LEVEL = 32
+
+
+class _Node:
+    __slots__ = ('key', 'forward', 'span')
+
+    def __init__(self, key, level):
+        self.key = key
+        self.forward = [None] * level
+        self.span = [0] * level
+
+
+class RankedSet:
+    """A sorted set backed by an indexable skip list: adding, removing
+    and finding the rank of a key, or the key at a rank, are all
+    O(log n)"""
+
+    def __init__(self, rng=None):
+        self._random = rng or random.Random()
+        self._head = _Node(None, MAX_LEVEL)
+        self._level = 1
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and self._random.random() < 0.25:
+            level += 1
+        return level
+
+    def _path(self, key):
+        """Returns the last node before `key` on every level and the
+        rank of each of those nodes"""
+        update = [self._head] * MAX_LEVEL
+        ranks = [0] * MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self._level)):
+            ranks[level] = 0 if level == self._level - 1 else ranks[level + 1]
+            while node.forward[level] is not None and \
+                    node.forward[level].key < key:
+                ranks[level] += node.span[level]
+                node = node.forward[level]
+            update[level] = node
+
+        return update, ranks
+
+    def add(self, key):
+        update, ranks = self._path(key)
+        level = self._random_level()
+        if level > self._level:
+            for new_level in range(self._level, level):
+                ranks[new_level] = 0
+                update[new_level] = self._head
+                self._head.span[new_level] = self._length
+            self._level = level
+
+        node = _Node(key, level)
+        for current in range(level):
+            previous = update[current]
+            node.forward[current] = previous.forward[current]
+            previous.forward[current] = node
+            node.span[current] = previous.span[current] - \
+                (ranks[0] - ranks[current])
+            previous.span[current] = ranks[0] - ranks[current] + 1
+
+        for current in range(level, self._level):
+            update[current].span[current] += 1
+        self._length += 1
+
+    def extend_sorted(self, keys):
+        """Fills an empty set from keys already in order in O(n) by
+        appending each one to the tail of its levels"""
+        if self._length:
+            raise ValueError('extend_sorted needs an empty set')
+
+        tails = [self._head] * MAX_LEVEL
+        tail_ranks = [0] * MAX_LEVEL
+        rank = 0
+        for rank, key in enumerate(keys, 1):
+            level = self._random_level()
+            node = _Node(key, level)
+            for current in range(level):
+                tails[current].forward[current] = node
+                tails[current].span[current] = rank - tail_ranks[current]
+                tails[current] = node
+                tail_ranks[current] = rank
+            self._level = max(self._level, level)
+
+        for current in range(self._level):
+            tails[current].span[current] = rank - tail_ranks[current]
+        self._length = rank
+
+    def remove(self, key):
+        update, _ = self._path(key)
+        node = update[0].forward[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+
+        for level in range(self._level):
+            if update[level].forward[level] is node:
+                update[level].span[level] += node.span[level] - 1
+                update[level].forward[level] = node.forward[level]
+            else:
+                update[level].span[level] -= 1
+
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._length -= 1
+
+    def bisect(self, key):
+        """Returns how many keys are less than `key`, which is the
+        0-based position of `key` if it is in the set"""
+        return self._path(key)[1][0]
+
+    def rank(self, key):
+        """Returns the 1-based position of `key`, or None"""
+        rank = 0
+        node = self._head
+        for level in reversed(range(self._level)):
+            while node.forward[level] is not None and \
+                    node.forward[level].key <= key:
+                rank += node.span[level]
+                node = node.forward[level]
+            if node is not self._head and node.key == key:
+                return rank
+
+        return None
+
+    def slice(self, start, count):
+        """Returns up to `count` keys starting from the 0-based `start`"""
+        traversed = 0
+        node = self._head
+        for level in reversed(range(self._level)):
+            while node.forward[level] is not None and \
+                    traversed + node.span[level] <= start:
+                traversed += node.span[level]
+                node = node.forward[level]
+
+        keys = []
+        node = node.forward[0]
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.forward[0]
+
+        return keys
+
+
+class Leaderboard:
+    """Ranks users by score, most first, breaking ties on the number of
+    wins and then the lower user id"""
+
+    def __init__(self):
+        self._entries = {}
+        self._ranking = RankedSet()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, entries):
+        """Fills an empty board from (user id, score, wins) rows"""
+        for user_id, score, wins in entries:
+            self._entries[user_id] = (score, wins)
+        self._ranking.extend_sorted(sorted(
+            (-score, -wins, user_id)
+            for user_id, (score, wins) in self._entries.items()))
+
+    def set(self, user_id, score, wins):
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._ranking.remove((-entry[0], -entry[1], user_id))
+        self._entries[user_id] = (score, wins)
+        self._ranking.add((-score, -wins, user_id))
+
+    def add(self, user_id, points, wins=0):
+        score, current_wins = self._entries.get(user_id, (0, 0))
+        self.set(user_id, score + points, current_wins + wins)
+
+    def rank(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return self._ranking.rank((-entry[0], -entry[1], user_id))
+
+    def top(self, count=100, offset=0):
+        """Returns (rank, user id, score, wins) for a page of the board"""
+        return [
+            (rank, user_id, -score, -wins)
+            for rank, (score, wins, user_id) in enumerate(
+                self._ranking.slice(offset, count), offset + 1)
+        ]
+
+
+def period_start(window, day):
+    if window == 'daily':
+        return day
+    if window == 'weekly':
+        return day - timedelta(days=day.weekday())
+    return ALL_TIME_START
+
+
+class Leaderboards:
+    """Every category and window's leaderboard for the current period"""
+
+    def __init__(self, snapshot_seconds=SNAPSHOT_SECONDS,
+                 clock=time.monotonic, today=None):
+        self.snapshot_seconds = snapshot_seconds
+        self._clock = clock
+        self._today = today or timezone.localdate
+        self._lock = threading.RLock()
+        self._boards = {}
+        self._pending = {}
+        self._synced_at = None
+        self._refreshed_from = None
+
+    def current_period(self, window):
+        """Returns the first day of a window's current period"""
+        return period_start(window, self._today())
+
+    def _board(self, category, window):
+        """Returns the board for the current period, loading it from the
+        snapshot when the period is new to this process"""
+        start = period_start(window, self._today())
+        current = self._boards.get((category, window))
+        if current is not None and current[0] == start:
+            return current[1]
+
+        board = Leaderboard()
+        rows = LeaderboardEntries.objects.filter(
+            category=category, window=window, period_start=start,
+        ).values_list('user_id', 'score', 'wins')
+        board.load((user_id, float(score), wins) for user_id, score, wins
+                   in rows.iterator(chunk_size=10000))
+        self._boards[(category, window)] = (start, board)
+
+        return board
+
+    def record_game(self, category, standings):
+        """Adds each player's total score, and the winner's win, to every
+        board the game counts towards"""
+        day = self._today()
+        with self._lock:
+            for board_category in {category, ALL_CATEGORIES}:
+                for window in WINDOWS:
+                    board = self._board(board_category, window)
+                    start = period_start(window, day)
+                    for place, standing in enumerate(standings):
+                        won = int(place == 0 and len(standings) > 1)
+                        board.add(standing.user_id,
+                                  float(standing.total_score), won)
+                        pending = self._pending.setdefault(
+                            (board_category, window, start,
+                             standing.user_id), [Decimal(0), 0])
+                        pending[0] += standing.total_score
+                        pending[1] += won
+
+            self._maybe_sync()
+
+    def top(self, category=ALL_CATEGORIES, window='all-time', count=100,
+            offset=0):
+        with self._lock:
+            self._maybe_sync()
+            return self._board(category, window).top(count, offset)
+
+    def rank(self, user_id, category=ALL_CATEGORIES, window='all-time'):
+        with self._lock:
+            self._maybe_sync()
+            return self._board(category, window).rank(user_id)
+
+    def _maybe_sync(self):
+        now = self._clock()
+        if self._synced_at is None or \
+                now - self._synced_at >= self.snapshot_seconds:
+            self.sync()
+            self._synced_at = now
+
+    def sync(self):
+        """Writes this process's new scores to the snapshot and applies
+        rows other processes have changed since the last sync"""
+        with self._lock:
+            self.persist()
+            self.refresh()
+
+    def persist(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    upsert(
+                        LeaderboardEntries,
+                        ['category', 'window', 'period_start', 'user_id',
+                         'score', 'wins', 'updated_at'],
+                        [key + (score, wins, now)
+                         for key, (score, wins) in pending.items()],
+                        conflict=['category', 'window', 'period_start',
+                                  'user_id'],
+                        increment=['score', 'wins'],
+                        replace=['updated_at'],
+                    )
+            except Exception:
+                for key, (score, wins) in pending.items():
+                    merged = self._pending.setdefault(key, [Decimal(0), 0])
+                    merged[0] += score
+                    merged[1] += wins
+                raise
+
+            rows_changed.send(sender=LeaderboardEntries)
+
+    def clear(self):
+        """Forgets every loaded board and score not yet persisted"""
+        with self._lock:
+            self._boards = {}
+            self._pending = {}
+            self._synced_at = None
+            self._refreshed_from = None
+
+    def refresh(self):
+        """Re-reads the loaded boards' rows changed since the last
+        refresh, overlapping by one interval so rows committed late by
+        slow transactions aren't missed"""
+        with self._lock:
+            started = timezone.now()
+            if self._refreshed_from is not None and self._boards:
+                periods = Q()
+                for (category, window), (start, _) in self._boards.items():
+                    periods |= Q(category=category, window=window,
+                                 period_start=start)
+                rows = LeaderboardEntries.objects.filter(
+                    periods, updated_at__gte=self._refreshed_from,
+                ).values_list('category', 'window', 'user_id', 'score',
+                              'wins')
+                for category, window, user_id, score, wins in \
+                        rows.iterator(chunk_size=10000):
+                    board = self._boards[(category, window)][1]
+                    board.set(user_id, float(score), wins)
+
+            self._refreshed_from = started - timedelta(
+                seconds=self.snapshot_seconds)
+
+
+def rebuild_all_time():
+    """Recreates the all-time board across every category from the
+    UserScores and Placements history"""
+    totals = UserScores.objects.values('user_id').annotate(
+        score=Sum('total_score')).order_by()
+    wins = dict(Placements.objects.filter(position=1)
+                .values('user_id').annotate(wins=Count('id'))
+                .order_by().values_list('user_id', 'wins'))
+    now = timezone.now()
+
+    with transaction.atomic():
+        LeaderboardEntries.objects.filter(
+            category=ALL_CATEGORIES, window='all-time').delete()
+        batch = []
+        for row in totals.iterator(chunk_size=10000):
+            batch.append(LeaderboardEntries(
+                category=ALL_CATEGORIES,
+                window='all-time',
+                period_start=ALL_TIME_START,
+                user_id=row['user_id'],
+                score=row['score'],
+                wins=wins.get(row['user_id'], 0),
+                updated_at=now,
+            ))
+            if len(batch) == 10000:
+                LeaderboardEntries.objects.bulk_create(batch)
+                batch = []
+        LeaderboardEntries.objects.bulk_create(batch)
+
+    rows_changed.send(sender=LeaderboardEntries)
+
+
+def persist_on_exit():
+    try:
+        leaderboards.persist()
+    except Exception:
+        logger.exception('Could not persist the leaderboards')
+
+
+leaderboards = Leaderboards()
+atexit.register(persist_on_exit)
+
+
+@receiver(game_finished)
+def record_finished_game(sender, game, standings, **kwargs):
+    # Only once the game's transaction commits, so a game rolled back is
+    # never counted or persisted
+    transaction.on_commit(partial(leaderboards.record_game, game.category,
+                                  standings))
@@ -0,0 +1,27 @@
+"""The ASGI lifespan protocol, shared by Database.asgi and
+Database.asgi_game, which writes out everything buffered in memory
+before the server shuts down"""
+from asgiref.sync import sync_to_async
+
+from Database import answer_recorder, avatars, leaderboard, \
+    login_throttle
+
+
+SHUTDOWN_HOOKS = [
+    answer_recorder.flush_all,
+    avatars.shutdown,
+    leaderboard.persist_on_exit,
+    login_throttle.flush_on_exit,
+]
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for hook in SHUTDOWN_HOOKS:
+                await sync_to_async(hook)()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
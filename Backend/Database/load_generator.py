@@ -0,0 +1,288 @@
+"""Synthetic users, games and answers in production volumes, for sizing
+the database and load testing.
+
+The rows are generated in chunks spread over a process pool, each chunk
+from its own random seed and with explicit ids, so a chunk never waits
+for another's ids and the same seed builds the same data however many
+workers there are. Every user shares one precomputed password hash, and
+rows are written with COPY on PostgreSQL. Users are written before the
+games they play and the answers they give.
+
+The distributions: games have two to six players, mostly two to four;
+categories are chosen by a Zipf-like popularity; a player's activity
+falls off with a power law, so a few play most games; and each answer is
+right with the logistic chance of the player's skill, normally
+distributed, against the question's difficulty."""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+import math
+import multiprocessing
+import random
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from Database.bulk import insert
+from Database.models import Answers, Games, Placements, Questions, \
+    Results, UserAnswers, UserScores
+from Database.question_pool import question_pool
+from Database.signals import rows_changed
+
+
+CHUNK_SIZE = 50000
+PLAYER_COUNTS = (2, 3, 4, 5, 6)
+PLAYER_WEIGHTS = (35, 25, 20, 10, 10)
+CATEGORIES = [name for name, _ in Games.CATEGORY if name != 'random']
+CATEGORY_WEIGHTS = [1 / rank for rank in range(1, len(CATEGORIES) + 1)]
+DIFFICULTY_OFFSETS = {'easy': -1.0, 'medium': 0.0, 'hard': 1.0}
+QUESTIONS_PER_GAME = 10
+ACTIVITY_SKEW = 3
+HISTORY_DAYS = 365
+PASSWORD = 'password123'
+
+_questions = []
+
+
+def chunk_rng(seed, phase, chunk):
+    return random.Random('%d:%s:%d' % (seed, phase, chunk))
+
+
+def skill(seed, user_id):
+    """The same normally distributed skill for a user in every chunk"""
+    return random.Random('%d:skill:%d' % (seed, user_id)).gauss(0, 1)
+
+
+def chance_correct(user_skill, difficulty):
+    return 1 / (1 + math.exp(DIFFICULTY_OFFSETS.get(difficulty, 0) -
+                             user_skill))
+
+
+def active_user(rng, first_user, users):
+    """A user id, with low ids, the oldest accounts, far more likely"""
+    return first_user + int(users * rng.random() ** ACTIVITY_SKEW)
+
+
+def questions():
+    """Every question's (id, difficulty), read once per process"""
+    if not _questions:
+        _questions.extend(Questions.objects.order_by('id')
+                          .values_list('id', 'difficulty'))
+    return _questions
+
+
+def generate_questions(plan, chunk, start, count):
+    rng = chunk_rng(plan['seed'], 'questions', chunk)
+    first = plan['first_question'] + start
+    insert(Questions, [
+        Questions(id=first + number,
+                  category=rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+                  difficulty=rng.choice(list(DIFFICULTY_OFFSETS)),
+                  question_type='multiple',
+                  text='Generated question %d' % (first + number))
+        for number in range(count)
+    ])
+    insert(Answers, [
+        Answers(question_id=first + number, correct_answer='right',
+                incorrect_answer='wrong', incorrect_answer2='wrong',
+                incorrect_answer3='wrong')
+        for number in range(count)
+    ])
+
+    return count
+
+
+def generate_users(plan, chunk, start, count):
+    first = plan['first_user'] + start
+    now = timezone.now()
+    rng = chunk_rng(plan['seed'], 'users', chunk)
+    user_model = get_user_model()
+    insert(user_model, [
+        user_model(id=first + number, username='u%d' % (first + number),
+                   email='u%d@example.com' % (first + number),
+                   password=plan['password'],
+                   date_joined=now - timedelta(
+                       days=rng.uniform(0, HISTORY_DAYS)))
+        for number in range(count)
+    ])
+
+    return count
+
+
+def generate_games(plan, chunk, start, count):
+    """Finished games with their results, placements and scores"""
+    rng = chunk_rng(plan['seed'], 'games', chunk)
+    first = plan['first_game'] + start
+    first_result = plan['first_result'] + start
+    now = timezone.now()
+    games, results, placements, scores = [], [], [], []
+
+    for number in range(count):
+        size = rng.choices(PLAYER_COUNTS, PLAYER_WEIGHTS)[0]
+        players = set()
+        while len(players) < size:
+            players.add(active_user(rng, plan['first_user'], plan['users']))
+
+        standings = []
+        for user_id in players:
+            chance = chance_correct(skill(plan['seed'], user_id), 'medium')
+            base = sum(rng.random() < chance
+                       for _ in range(QUESTIONS_PER_GAME))
+            bonus = Decimal(rng.randrange(base * 500 + 1)) / 1000
+            standings.append((base + bonus, base, bonus, user_id))
+        standings.sort(reverse=True)
+
+        result_id = first_result + number
+        results.append(Results(id=result_id, **{
+            '%s_id' % place: standing[3]
+            for place, standing in zip(Results.PLACES, standings)}))
+        start_time = now - timedelta(days=rng.uniform(0, HISTORY_DAYS))
+        games.append(Games(
+            id=first + number, number_of_questions=QUESTIONS_PER_GAME,
+            number_of_players=size, start_time=start_time,
+            category=rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+            created_by_id=standings[0][3], winner_id=result_id,
+            finished_at=start_time))
+        for position, (total, base, bonus, user_id) in enumerate(
+                standings, 1):
+            placements.append(Placements(result_id=result_id,
+                                         user_id=user_id, position=position))
+            scores.append(UserScores(
+                user_id=user_id, base_score=base, bonus_score=bonus,
+                total_score=total,
+                time_taken_seconds='%.3f' % rng.uniform(20, 120)))
+
+    insert(Results, results)
+    insert(Games, games)
+    insert(Placements, placements)
+    insert(UserScores, scores)
+
+    return count
+
+
+def generate_answers(plan, chunk, start, count):
+    """UserAnswers for `count` users from `start`, each answering a
+    number of questions in proportion to their activity"""
+    rng = chunk_rng(plan['seed'], 'answers', chunk)
+    pool = questions()
+    rows = []
+
+    for user_id in range(plan['first_user'] + start,
+                         plan['first_user'] + start + count):
+        user_skill = skill(plan['seed'], user_id)
+        position = (user_id - plan['first_user']) / plan['users']
+        # Inverts the activity curve so busier users answer more
+        answered = min(len(pool), max(1, int(
+            plan['answers_per_user'] * ACTIVITY_SKEW *
+            (1 - position) ** (ACTIVITY_SKEW - 1))))
+        for question_id, difficulty in rng.sample(pool, answered):
+            attempts = 1 + int(rng.expovariate(1))
+            correct = sum(rng.random() < chance_correct(user_skill,
+                                                        difficulty)
+                          for _ in range(attempts))
+            rows.append(UserAnswers(
+                user_id=user_id, question_id=question_id,
+                result='correct' if correct else 'incorrect',
+                count_correct=correct, count_incorrect=attempts - correct))
+
+    insert(UserAnswers, rows)
+
+    return len(rows)
+
+
+PHASES = [
+    ('questions', generate_questions, [Questions, Answers]),
+    ('users', generate_users, [get_user_model()]),
+    ('games', generate_games, [Results, Games, Placements, UserScores]),
+    ('answers', generate_answers, [UserAnswers]),
+]
+
+
+def _run_chunk(phase, plan, chunk, start, count):
+    generate = dict((name, function) for name, function, _ in PHASES)[phase]
+    with transaction.atomic():
+        return generate(plan, chunk, start, count)
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def make_plan(users, games, answers_per_user, questions=0, seed=0,
+              password=PASSWORD):
+    """Returns what to generate and the first id of each table"""
+    return {
+        'seed': seed,
+        'users': users,
+        'games': games,
+        'questions': questions,
+        'answers_per_user': answers_per_user,
+        'password': make_password(password),
+        'first_user': _next_id(get_user_model()),
+        'first_game': _next_id(Games),
+        'first_result': _next_id(Results),
+        'first_question': _next_id(Questions),
+    }
+
+
+def generate(plan, workers=1, chunk_size=CHUNK_SIZE, progress=None):
+    """Generates everything in `plan`, in chunks of `chunk_size` rows,
+    on `workers` processes, calling `progress(phase, rows)` as chunks
+    finish, and returns the rows written per phase"""
+    totals = {
+        'questions': plan['questions'],
+        'users': plan['users'],
+        'games': plan['games'],
+        'answers': plan['users'] if plan['answers_per_user'] else 0,
+    }
+    written = {}
+    del _questions[:]
+    # Spawned rather than forked, so no worker shares this process's
+    # database connection
+    pool = ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup) if workers > 1 else None
+
+    try:
+        for phase, _, models in PHASES:
+            chunks = [(chunk, start, min(chunk_size, totals[phase] - start))
+                      for chunk, start in enumerate(
+                          range(0, totals[phase], chunk_size))]
+            if pool is None:
+                counts = (_run_chunk(phase, plan, *chunk) for chunk in chunks)
+            else:
+                futures = [pool.submit(_run_chunk, phase, plan, *chunk)
+                           for chunk in chunks]
+                counts = (future.result() for future in futures)
+
+            written[phase] = 0
+            for count in counts:
+                written[phase] += count
+                if progress is not None:
+                    progress(phase, count)
+
+            if written[phase]:
+                _reset_sequences(models)
+                for model in models:
+                    rows_changed.send(sender=model)
+                if phase == 'questions':
+                    question_pool.invalidate()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return written
+
+
+def _reset_sequences(models):
+    """Moves the id sequences past the explicit ids written"""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -0,0 +1,216 @@
+"""Retention for LoginAttempts.
+
+On PostgreSQL the table is partitioned by month of last_login (see
+migration 0016), so a month past its retention period is compacted into
+LoginAttemptsDaily, optionally archived to a gzipped CSV and then
+detached and dropped. Elsewhere the same compaction is followed by
+batched DELETEs."""
+from datetime import date, datetime, time
+import gzip
+import os
+import re
+
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from Database.bulk import upsert
+from Database.models import LoginAttempts, LoginAttemptsDaily
+
+
+TABLE = LoginAttempts._meta.db_table
+DEFAULT_PARTITION = TABLE + '_default'
+PARTITION_NAME = re.compile(r'^%s_p(\d{4})(\d{2})$' % TABLE)
+DELETE_BATCH_SIZE = 10000
+
+
+def add_months(month, months):
+    years, month_index = divmod(month.month - 1 + months, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def partition_name(month):
+    return '%s_p%04d%02d' % (TABLE, month.year, month.month)
+
+
+def _moment(day):
+    return timezone.make_aware(datetime.combine(day, time.min),
+                               timezone.utc)
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table '
+            'WHERE partrelid = %s::regclass',
+            [connection.ops.quote_name(TABLE)])
+        return cursor.fetchone() is not None
+
+
+def partitions():
+    """Returns the month each monthly partition holds, oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = %s::regclass',
+            [connection.ops.quote_name(TABLE)])
+        names = [row[0] for row in cursor.fetchall()]
+
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+
+    return sorted(months)
+
+
+def create_partitions(months_ahead, today=None):
+    """Makes sure this month and the next `months_ahead` have partitions
+    so new rows never land in the default partition"""
+    month = (today or timezone.now().date()).replace(day=1)
+    created = []
+    existing = set(partitions())
+
+    for _ in range(months_ahead + 1):
+        if month not in existing:
+            _create_partition(month)
+            created.append(month)
+        month = add_months(month, 1)
+
+    return created
+
+
+def _create_partition(month):
+    """Creates a month's partition as a table of its own and attaches it
+    once any of the month's rows that fell into the default partition,
+    as they do after a gap in running this, have been moved into it,
+    which PostgreSQL requires before the partition can be attached"""
+    quote = connection.ops.quote_name
+    name = quote(partition_name(month))
+    bounds = [_moment(month), _moment(add_months(month, 1))]
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING '
+            'CONSTRAINTS)' % (name, quote(TABLE)))
+        cursor.execute(
+            'WITH moved AS (DELETE FROM {default} WHERE last_login >= %s '
+            'AND last_login < %s RETURNING {columns}) '
+            'INSERT INTO {name} ({columns}) SELECT {columns} FROM moved'
+            .format(default=quote(DEFAULT_PARTITION), name=name,
+                    columns='id, last_login, login_status, user_id'),
+            bounds)
+        cursor.execute(
+            'ALTER TABLE %s ATTACH PARTITION %s FOR VALUES FROM (%%s) '
+            'TO (%%s)' % (quote(TABLE), name), bounds)
+
+
+def compact(start, end):
+    """Adds the attempts made between `start` and `end` to the per-user
+    daily counts and returns how many attempts that covered"""
+    rows = LoginAttempts.objects.filter(
+        last_login__gte=start, last_login__lt=end,
+    ).annotate(day=TruncDate('last_login')).values('user_id', 'day') \
+        .annotate(
+            successes=Count('id', filter=Q(login_status='success')),
+            failures=Count('id', filter=Q(login_status='failed')),
+    ).order_by()
+
+    compacted = 0
+    batch = []
+    for row in rows.iterator(chunk_size=DELETE_BATCH_SIZE):
+        batch.append((row['user_id'], row['day'], row['successes'],
+                      row['failures']))
+        compacted += row['successes'] + row['failures']
+        if len(batch) == DELETE_BATCH_SIZE:
+            _add_daily_counts(batch)
+            batch = []
+    _add_daily_counts(batch)
+
+    return compacted
+
+
+def _add_daily_counts(rows):
+    if rows:
+        upsert(LoginAttemptsDaily, ['user_id', 'day', 'successes',
+                                    'failures'],
+               rows, conflict=['user_id', 'day'],
+               increment=['successes', 'failures'])
+
+
+def archive(month, directory):
+    """Copies a partition to <directory>/<partition>.csv.gz"""
+    name = partition_name(month)
+    path = os.path.join(directory, '%s.csv.gz' % name)
+    with gzip.open(path, 'wt', encoding='utf-8') as output, \
+            connection.cursor() as cursor:
+        cursor.copy_expert(
+            'COPY %s TO STDOUT WITH CSV HEADER'
+            % connection.ops.quote_name(name), output)
+
+    return path
+
+
+def expire(keep_months, archive_dir=None, today=None):
+    """Compacts and removes every month older than the current month
+    minus `keep_months` and returns the months removed"""
+    cutoff = add_months((today or timezone.now().date()).replace(day=1),
+                        -keep_months)
+
+    if is_partitioned():
+        return _expire_partitions(cutoff, archive_dir)
+    return _expire_rows(cutoff)
+
+
+def _expire_partitions(cutoff, archive_dir):
+    quote = connection.ops.quote_name
+    expired = []
+    for month in partitions():
+        if month >= cutoff:
+            break
+
+        with transaction.atomic():
+            compact(_moment(month), _moment(add_months(month, 1)))
+            if archive_dir:
+                archive(month, archive_dir)
+            with connection.cursor() as cursor:
+                cursor.execute('ALTER TABLE %s DETACH PARTITION %s' % (
+                    quote(TABLE), quote(partition_name(month))))
+                cursor.execute('DROP TABLE %s' % quote(partition_name(month)))
+        expired.append(month)
+
+    # Anything that fell into the default partition is removed row by row
+    return expired + [month for month in _expire_rows(cutoff)
+                      if month not in expired]
+
+
+def _expire_rows(cutoff):
+    oldest = LoginAttempts.objects.filter(last_login__lt=_moment(cutoff)) \
+        .aggregate(oldest=Min('last_login'))['oldest']
+    if oldest is None:
+        return []
+
+    expired = []
+    month = oldest.date().replace(day=1)
+    while month < cutoff:
+        start, end = _moment(month), _moment(add_months(month, 1))
+        with transaction.atomic():
+            compacted = compact(start, end)
+            rows = LoginAttempts.objects.filter(
+                last_login__gte=start, last_login__lt=end,
+            ).order_by().values_list('pk', flat=True)
+            while True:
+                primary_keys = list(rows[:DELETE_BATCH_SIZE])
+                if not primary_keys:
+                    break
+                LoginAttempts.objects.filter(pk__in=primary_keys).delete()
+        if compacted:
+            expired.append(month)
+        month = add_months(month, 1)
+
+    return expired
@@ -0,0 +1,283 @@
+"""Login throttling.
+
+Failed logins are counted per account and per IP address in sliding
+windows held in a counter store, so deciding whether to lock a login
+out costs a couple of cache reads instead of counting LoginAttempts
+rows. The audit trail is still written to LoginAttempts, in batches, by
+a background thread."""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.core.exceptions import PermissionDenied
+from django.db import DataError, IntegrityError, close_old_connections
+from django.utils import timezone
+
+from Database.models import LoginAttempts
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCounterStore:
+    """Counters kept in a dictionary, for a single process or tests"""
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def incr(self, key, timeout):
+        now = self._clock()
+        with self._lock:
+            value, expires = self._counters.get(key, (0, None))
+            if expires is not None and expires <= now:
+                value = 0
+            self._counters[key] = (value + 1, now + timeout)
+            return value + 1
+
+    def get_many(self, keys):
+        now = self._clock()
+        with self._lock:
+            return {
+                key: self._counters[key][0] for key in keys
+                if key in self._counters and self._counters[key][1] > now
+            }
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._counters.pop(key, None)
+
+
+class CacheCounterStore:
+    """Counters kept in a Django cache so every worker shares them"""
+
+    def __init__(self, cache):
+        self._cache = cache
+
+    def incr(self, key, timeout):
+        if self._cache.add(key, 1, timeout):
+            return 1
+        try:
+            return self._cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            self._cache.set(key, 1, timeout)
+            return 1
+
+    def get_many(self, keys):
+        return self._cache.get_many(keys)
+
+    def delete_many(self, keys):
+        self._cache.delete_many(keys)
+
+
+class LoginAttemptWriter:
+    """Queues LoginAttempts rows and writes them with bulk_create, from a
+    background thread when `background` is set"""
+
+    def __init__(self, batch_size=500, interval=1.0, background=True):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.background = background
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def add(self, user_id, login_status, when=None):
+        self._queue.put(LoginAttempts(
+            user_id=user_id,
+            login_status=login_status,
+            last_login=when or timezone.now(),
+        ))
+        if self.background and self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='login-attempt-writer',
+                    daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            # As a request would, so a connection broken by a database
+            # restart is replaced before the next batch
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write login attempts')
+
+    def flush(self):
+        """Writes everything queued so far and returns how many rows. A
+        batch the database rejects is written row by row, and the rows it
+        rejects, such as an attempt by a user deleted meanwhile, are
+        logged and dropped rather than holding back every later batch.
+        Any other error, such as a lost connection, puts the rows not
+        written back in the queue and is raised"""
+        written = 0
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return written
+
+            try:
+                LoginAttempts.objects.bulk_create(batch)
+            except (IntegrityError, DataError):
+                written += self._write_rows(batch)
+                continue
+            except Exception:
+                self._requeue(batch)
+                raise
+            written += len(batch)
+
+    def _write_rows(self, batch):
+        written = 0
+        for position, attempt in enumerate(batch):
+            try:
+                LoginAttempts.objects.bulk_create([attempt])
+            except (IntegrityError, DataError):
+                logger.exception('Dropped the %s login attempt of user %s',
+                                 attempt.login_status, attempt.user_id)
+            except Exception:
+                self._requeue(batch[position:])
+                raise
+            else:
+                written += 1
+
+        return written
+
+    def _requeue(self, attempts):
+        for attempt in attempts:
+            self._queue.put(attempt)
+
+
+class LoginThrottle:
+    """Locks out an account after `user_failures` failed logins, or an
+    IP address after `ip_failures`, within `window` seconds.
+
+    Each limit is counted in fixed buckets of `window` seconds and the
+    previous bucket is weighted by how much of it still overlaps the
+    sliding window, which keeps every check O(1)."""
+
+    def __init__(self, store, writer=None, window=None, user_failures=None,
+                 ip_failures=None, clock=time.time):
+        self.store = store
+        self.writer = writer
+        self.window = window or settings.LOGIN_THROTTLE_WINDOW_SECONDS
+        self.user_failures = user_failures or \
+            settings.LOGIN_THROTTLE_USER_FAILURES
+        self.ip_failures = ip_failures or settings.LOGIN_THROTTLE_IP_FAILURES
+        self._clock = clock
+
+    def _keys(self, kind, identifier, bucket):
+        return ('login_throttle:%s:%s:%d' % (kind, identifier, bucket),
+                'login_throttle:%s:%s:%d' % (kind, identifier, bucket - 1))
+
+    def _subjects(self, username, ip):
+        subjects = [('user', username.lower(), self.user_failures)]
+        if ip:
+            subjects.append(('ip', ip, self.ip_failures))
+        return subjects
+
+    def failures(self, kind, identifier):
+        """Returns the estimated failures within the sliding window"""
+        now = self._clock()
+        bucket, elapsed = divmod(now, self.window)
+        current, previous = self._keys(kind, identifier, int(bucket))
+        counts = self.store.get_many([current, previous])
+
+        return counts.get(current, 0) + \
+            counts.get(previous, 0) * (1 - elapsed / self.window)
+
+    def is_locked(self, username, ip=None):
+        return any(self.failures(kind, identifier) >= limit
+                   for kind, identifier, limit in
+                   self._subjects(username, ip))
+
+    def record_failure(self, username, ip=None, user_id=None):
+        bucket = int(self._clock() // self.window)
+        for kind, identifier, _ in self._subjects(username, ip):
+            self.store.incr(self._keys(kind, identifier, bucket)[0],
+                            self.window * 2)
+        if user_id is not None and self.writer is not None:
+            self.writer.add(user_id, 'failed')
+
+    def record_success(self, username, ip=None, user_id=None):
+        """Clears the account's failures, but not the IP address's"""
+        bucket = int(self._clock() // self.window)
+        self.store.delete_many(self._keys('user', username.lower(), bucket))
+        if user_id is not None and self.writer is not None:
+            self.writer.add(user_id, 'success')
+
+
+def client_ip(request):
+    if request is None:
+        return None
+    return request.META.get('REMOTE_ADDR')
+
+
+class ThrottledModelBackend(ModelBackend):
+    """ModelBackend that refuses logins while the account or IP address
+    is locked out and records the outcome of every attempt"""
+
+    def authenticate(self, request, username=None, password=None,
+                     **kwargs):
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        ip = client_ip(request)
+        if login_throttle.is_locked(username, ip):
+            raise PermissionDenied('Too many failed login attempts')
+
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # Hash anyway so a missing account takes as long to reject
+            user_model().set_password(password)
+            login_throttle.record_failure(username, ip)
+            return None
+
+        if user.check_password(password) and \
+                self.user_can_authenticate(user):
+            login_throttle.record_success(username, ip, user.pk)
+            return user
+
+        login_throttle.record_failure(username, ip, user.pk)
+        return None
+
+
+login_attempt_writer = LoginAttemptWriter()
+login_throttle = LoginThrottle(
+    CacheCounterStore(caches[settings.LOGIN_THROTTLE_CACHE]),
+    writer=login_attempt_writer,
+)
+
+
+def flush_on_exit():
+    try:
+        login_attempt_writer.flush()
+    except Exception:
+        logger.exception('Could not write login attempts')
+
+
+atexit.register(flush_on_exit)
@@ -0,0 +1,57 @@
+from importlib import import_module
+import json
+import pkgutil
+import platform
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from Database import benchmarks
+from Database.benchmarks import benchmark_database, clear_results
+
+
+def available_benchmarks():
+    return sorted(
+        module.name for module in pkgutil.iter_modules(benchmarks.__path__)
+        if module.name != 'seed'
+    )
+
+
+class Command(BaseCommand):
+    help = 'Runs a benchmark from Database.benchmarks against a throwaway ' \
+        'test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=available_benchmarks())
+        parser.add_argument(
+            '--sizes', nargs='+', type=int,
+            help='Dataset sizes to run at, defaults to the benchmark\'s own')
+        parser.add_argument(
+            '--repeat', type=int, default=100,
+            help='How many times each timed operation is run')
+        parser.add_argument(
+            '--json', metavar='PATH',
+            help='Also save the timings to PATH as JSON')
+
+    def handle(self, *args, **options):
+        module = import_module('Database.benchmarks.%s' % options['name'])
+        sizes = options['sizes'] or module.DEFAULT_SIZES
+
+        started = timezone.now()
+        clear_results()
+
+        with benchmark_database(options['verbosity'] - 1):
+            module.run(self.stdout, sizes=sizes, repeat=options['repeat'])
+
+        if options['json']:
+            with open(options['json'], 'w') as output:
+                json.dump({
+                    'benchmark': options['name'],
+                    'sizes': sizes,
+                    'repeat': options['repeat'],
+                    'started': started.isoformat(),
+                    'database': connection.vendor,
+                    'python': platform.python_version(),
+                    'results': benchmarks.results,
+                }, output, indent=2)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Database.calibration import CHUNK_SIZE, calibrate
+
+
+class Command(BaseCommand):
+    help = 'Recalibrates question difficulty from the UserAnswers ' \
+        'written since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Recalibrate every answered question, not only those with '
+            'new answers')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='UserAnswers rows read per chunk')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = calibrate(full=options['full'],
+                           chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Calibrated %d questions, relabelled %d, in %.1fs' % (
+                counts['calibrated'], counts['relabelled'],
+                time.perf_counter() - start)))
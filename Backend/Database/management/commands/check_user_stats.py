@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Database.user_stats import check, rebuild_users
+
+
+class Command(BaseCommand):
+    help = 'Compares the stored statistics of a random sample of users ' \
+        'with the live aggregates and lists the differences'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=1000)
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Recompute the statistics of the users that differ')
+
+    def handle(self, *args, **options):
+        differences = check(options['sample'])
+        for user_id, category, stored, live in differences:
+            self.stdout.write('user %d%s: stored %s, live %s' % (
+                user_id, ' in %s' % category if category else '', stored,
+                live))
+        if not differences:
+            self.stdout.write(self.style.SUCCESS(
+                'The statistics of every sampled user match'))
+            return
+
+        user_ids = {difference[0] for difference in differences}
+        if not options['fix']:
+            raise CommandError('The statistics of %d sampled users differ' %
+                               len(user_ids))
+        rebuild_users(user_id__in=user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt the statistics of %d users' % len(user_ids)))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Database.account_deletion import BATCH_SIZE, CHUNK_SIZE, delete_users
+
+
+class Command(BaseCommand):
+    help = 'Deletes user accounts in bulk, moving their game history to ' \
+        'the sentinel user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int)
+        parser.add_argument(
+            '--file',
+            help='File with one user id per line to delete as well')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Users handled per set of UPDATE/DELETE statements')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Most rows deleted from a table per transaction')
+
+    def handle(self, *args, **options):
+        user_ids = list(options['user_ids'])
+        if options['file']:
+            with open(options['file']) as ids:
+                try:
+                    user_ids.extend(int(line) for line in ids
+                                    if line.strip())
+                except ValueError as error:
+                    raise CommandError('Invalid user id: %s' % error)
+        if not user_ids:
+            raise CommandError('No user ids given')
+
+        counts = delete_users(sorted(set(user_ids)),
+                              chunk_size=options['chunk_size'],
+                              batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted %(users)d users, reassigned %(reassigned)d and deleted '
+            '%(cascaded)d related rows' % counts))
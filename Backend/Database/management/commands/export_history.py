@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from Database.history_export import CHUNK_SIZE, FORMATS, export
+
+
+class Command(BaseCommand):
+    help = 'Writes everything recorded about a user\'s play as NDJSON ' \
+        'or CSV, streamed so memory use stays flat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_id', type=int)
+        parser.add_argument('--format', choices=sorted(FORMATS),
+                            default='ndjson')
+        parser.add_argument(
+            '--output', help='File to write to instead of standard output')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        parts = export(options['user_id'], options['format'],
+                       options['chunk_size'])
+        if options['output'] is None:
+            for part in parts:
+                self.stdout.write(part, ending='')
+            return
+
+        with open(options['output'], 'w', newline='') as output:
+            for part in parts:
+                output.write(part)
+        self.stdout.write(self.style.SUCCESS(
+            'Exported the history of user %d to %s' % (
+                options['user_id'], options['output'])))
@@ -0,0 +1,59 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Database.load_generator import CHUNK_SIZE, PASSWORD, generate, \
+    make_plan, questions
+
+
+class Command(BaseCommand):
+    help = 'Generates synthetic users, finished games and answers in ' \
+        'bulk for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100000)
+        parser.add_argument('--games', type=int, default=200000)
+        parser.add_argument(
+            '--answers-per-user', type=int, default=50,
+            help='Average UserAnswers rows per user, 0 for none')
+        parser.add_argument(
+            '--questions', type=int, default=0,
+            help='Questions to generate first, if too few are imported')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='The same seed generates the same rows')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes generating chunks in parallel')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--password', default=PASSWORD,
+            help='The password every generated user logs in with')
+
+    def handle(self, *args, **options):
+        if options['games'] and options['users'] < 6:
+            raise CommandError('Games need at least 6 users to choose from')
+        if options['answers_per_user'] and not options['questions'] and \
+                not questions():
+            raise CommandError('There are no questions to answer, import '
+                               'some or pass --questions')
+
+        plan = make_plan(options['users'], options['games'],
+                         options['answers_per_user'], options['questions'],
+                         options['seed'], options['password'])
+        start = time.perf_counter()
+
+        def progress(phase, count):
+            if options['verbosity'] > 1:
+                self.stdout.write('%s: %d rows (%.1fs)' % (
+                    phase, count, time.perf_counter() - start))
+
+        written = generate(plan, options['workers'], options['chunk_size'],
+                           progress)
+        self.stdout.write(self.style.SUCCESS(
+            'Generated %s in %.1fs' % (', '.join(
+                '%d %s' % (count, phase) for phase, count in written.items()
+            ), time.perf_counter() - start)))
+        self.stdout.write('Run rebuild_leaderboards, rebuild_user_stats and '
+                          'rebuild_ratings to count the new games')
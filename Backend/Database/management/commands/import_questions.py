@@ -0,0 +1,254 @@
+import csv
+import hashlib
+import html
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from Database.models import Answers, Questions
+from Database.question_pool import question_pool
+from Database.signals import rows_changed
+
+
+CATEGORY_ALIASES = {
+    'science & nature': 'science',
+}
+READ_CHUNK_SIZE = 64 * 1024
+# The longest value each field stored from a record can hold
+MAX_LENGTHS = {
+    field.name: field.max_length
+    for model, names in (
+        (Questions, ('category', 'difficulty', 'question_type', 'text')),
+        (Answers, ('correct_answer', 'incorrect_answer',
+                   'incorrect_answer2', 'incorrect_answer3')),
+    )
+    for field in map(model._meta.get_field, names)
+}
+
+
+def content_hash(category, difficulty, question_type, text, correct_answer):
+    """Identifies a question by what it asks rather than by its row, so
+    the same question imported twice is only stored once"""
+    content = '\x1f'.join(
+        (category, difficulty, question_type, text, correct_answer))
+
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def read_json(stream):
+    """Yields the objects in the first JSON array of the stream one at a
+    time, which covers both a bare array and Open Trivia DB's
+    {"response_code": 0, "results": [...]} envelope, without loading the
+    whole document"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    while '[' not in buffer:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            raise CommandError('No JSON array found in the input')
+        buffer += chunk
+    position = buffer.index('[') + 1
+
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+
+        if position < len(buffer) and buffer[position] == ']':
+            return
+
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError('The JSON input is truncated or invalid')
+            chunk = stream.read(READ_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+
+        yield record
+
+
+def read_ndjson(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    """Yields rows from a CSV with the Open Trivia DB column names, where
+    incorrect_answers is either a JSON list or separated by '|'"""
+    for row in csv.DictReader(stream):
+        incorrect = row.get('incorrect_answers') or ''
+        if incorrect.startswith('['):
+            row['incorrect_answers'] = json.loads(incorrect)
+        else:
+            row['incorrect_answers'] = [
+                answer for answer in incorrect.split('|') if answer]
+        yield row
+
+
+READERS = {
+    'json': read_json,
+    'ndjson': read_ndjson,
+    'csv': read_csv,
+}
+
+
+def normalise(record):
+    """Maps an Open Trivia DB record onto the fields of Questions and
+    Answers, or returns None if it can't be stored"""
+    try:
+        category = html.unescape(record['category']).strip().lower()
+        difficulty = record['difficulty'].strip().lower()
+        question_type = record['type'].strip().lower()
+        text = html.unescape(record['question']).strip()
+        correct_answer = html.unescape(record['correct_answer']).strip()
+        incorrect = [html.unescape(answer).strip()
+                     for answer in record['incorrect_answers']]
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+    category = CATEGORY_ALIASES.get(category, category.split(':')[0].strip())
+    if not text or not correct_answer or not incorrect:
+        return None
+    incorrect = (incorrect + ['', '', ''])[:3]
+
+    row = {
+        'category': category,
+        'difficulty': difficulty,
+        'question_type': question_type,
+        'text': text,
+        'correct_answer': correct_answer,
+        'incorrect_answer': incorrect[0],
+        'incorrect_answer2': incorrect[1],
+        'incorrect_answer3': incorrect[2],
+    }
+    if any(len(row[name]) > max_length
+           for name, max_length in MAX_LENGTHS.items()):
+        return None
+    row['content_hash'] = content_hash(category, difficulty, question_type,
+                                       text, correct_answer)
+
+    return row
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_batch(batch):
+    """Stores the questions in `batch` that aren't already in the
+    database and returns how many were added"""
+    rows = {}
+    for row in batch:
+        rows.setdefault(row['content_hash'], row)
+
+    existing = Questions.objects.filter(content_hash__in=list(rows)) \
+        .values_list('content_hash', flat=True)
+    for known in existing:
+        del rows[known]
+    if not rows:
+        return 0
+
+    Questions.objects.bulk_create([
+        Questions(
+            category=row['category'],
+            difficulty=row['difficulty'],
+            question_type=row['question_type'],
+            text=row['text'],
+            content_hash=row['content_hash'],
+        )
+        for row in rows.values()
+    ], ignore_conflicts=True)
+
+    # bulk_create only returns primary keys on PostgreSQL
+    question_ids = Questions.objects.filter(content_hash__in=list(rows)) \
+        .values_list('content_hash', 'id')
+    Answers.objects.bulk_create([
+        Answers(
+            question_id=question_id,
+            correct_answer=rows[question_hash]['correct_answer'],
+            incorrect_answer=rows[question_hash]['incorrect_answer'],
+            incorrect_answer2=rows[question_hash]['incorrect_answer2'],
+            incorrect_answer3=rows[question_hash]['incorrect_answer3'],
+        )
+        for question_hash, question_id in question_ids
+    ])
+
+    return len(rows)
+
+
+class Command(BaseCommand):
+    help = 'Imports questions in the Open Trivia DB format from a JSON, ' \
+        'NDJSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Input format, guessed from the file extension by default')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Questions written per bulk insert')
+        parser.add_argument(
+            '--batches-per-transaction', type=int, default=10,
+            help='Bulk inserts committed together')
+
+    def handle(self, *args, **options):
+        input_format = options['format'] or \
+            os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if input_format not in READERS:
+            raise CommandError('Unknown input format %r, use --format'
+                               % input_format)
+
+        stats = {'read': 0, 'rejected': 0, 'created': 0}
+
+        def normalised(records):
+            for record in records:
+                stats['read'] += 1
+                row = normalise(record)
+                if row is None:
+                    stats['rejected'] += 1
+                    continue
+                yield row
+
+        start = time.perf_counter()
+        with open(options['path'], newline='', encoding='utf-8') as stream:
+            batches = batched(normalised(READERS[input_format](stream)),
+                              options['batch_size'])
+            for group in batched(batches,
+                                 options['batches_per_transaction']):
+                with transaction.atomic():
+                    for batch in group:
+                        stats['created'] += write_batch(batch)
+                if options['verbosity'] > 1:
+                    self.stdout.write('%(read)d read, %(created)d created'
+                                      % stats)
+
+        if stats['created']:
+            question_pool.invalidate()
+            rows_changed.send(sender=Questions)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %d questions from %d rows (%d rejected, %d duplicates) '
+            'in %.1fs, %.0f rows/sec' % (
+                stats['created'], stats['read'], stats['rejected'],
+                stats['read'] - stats['rejected'] - stats['created'],
+                elapsed, stats['read'] / elapsed if elapsed else 0,
+            )))
@@ -0,0 +1,41 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Database.login_retention import create_partitions, expire, \
+    is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Creates upcoming LoginAttempts partitions and compacts and ' \
+        'removes months past the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months', type=int, default=6,
+            help='Full months of detailed login attempts to keep besides '
+            'the current one')
+        parser.add_argument(
+            '--months-ahead', type=int, default=3,
+            help='Future monthly partitions to create')
+        parser.add_argument(
+            '--archive-dir',
+            help='Directory to copy expired partitions to as gzipped CSV '
+            'before they are dropped')
+
+    def handle(self, *args, **options):
+        archive_dir = options['archive_dir']
+        if archive_dir and not os.path.isdir(archive_dir):
+            raise CommandError('%s is not a directory' % archive_dir)
+
+        if is_partitioned():
+            for month in create_partitions(options['months_ahead']):
+                self.stdout.write('Created the partition for %s'
+                                  % month.strftime('%Y-%m'))
+        elif archive_dir:
+            raise CommandError('Archiving needs the partitioned '
+                               'PostgreSQL table')
+
+        for month in expire(options['keep_months'], archive_dir):
+            self.stdout.write('Compacted and removed %s'
+                              % month.strftime('%Y-%m'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Database.sessions import BATCH_SIZE, purge_expired, session_model
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired sessions in batches when they are stored in ' \
+        'the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Sessions deleted per transaction')
+
+    def handle(self, *args, **options):
+        if session_model() is None:
+            self.stdout.write('The session engine expires sessions itself')
+            return
+
+        start = time.perf_counter()
+        deleted = purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Deleted %d expired sessions in %.1fs' % (
+                deleted, time.perf_counter() - start)))
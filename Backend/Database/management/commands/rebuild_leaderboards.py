@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from Database.leaderboard import rebuild_all_time
+
+
+class Command(BaseCommand):
+    help = 'Recreates the all-time leaderboard snapshot from the full ' \
+        'UserScores and Results history'
+
+    def handle(self, *args, **options):
+        rebuild_all_time()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the all-time '
+                                             'leaderboard'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Database.ratings import CHUNK_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every user\'s rating by replaying all Results in ' \
+        'the order they were recorded'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Results read per chunk')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        done = [0]
+
+        def progress(results):
+            done[0] += results
+            if options['verbosity'] > 1:
+                self.stdout.write('%d results read (%.1fs)' % (
+                    done[0], time.perf_counter() - start))
+
+        users = rebuild(options['chunk_size'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            'Rated %d users from %d results in %.1fs' % (
+                users, done[0], time.perf_counter() - start)))
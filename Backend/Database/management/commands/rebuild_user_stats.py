@@ -0,0 +1,34 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from Database.user_stats import CHUNK_SIZE, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every user\'s UserStats and UserCategoryStats ' \
+        'from the games, practice matches and answers they count'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='User ids recomputed per transaction')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes recomputing chunks in parallel')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        done = [0]
+
+        def progress(users):
+            done[0] += users
+            if options['verbosity'] > 1:
+                self.stdout.write('%d users (%.1fs)' % (
+                    done[0], time.perf_counter() - start))
+
+        users = rebuild(options['chunk_size'], options['workers'], progress)
+        self.stdout.write(self.style.SUCCESS(
+            'Rebuilt the statistics of %d users in %.1fs' % (
+                users, time.perf_counter() - start)))
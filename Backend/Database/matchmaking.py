@@ -0,0 +1,279 @@
+"""Skill-based matchmaking kept in memory.
+
+Players looking for a game wait in a queue per category and room size,
+ordered by skill in a RankedSet, so a player joining is compared only
+with the players either side of them, in O(log n). A room is a run of
+neighbouring players in one queue whose skills are no further apart than
+every member's window, which starts at `window` and widens by
+`widen_per_second` while they wait, up to `max_window`.
+
+A run's members never change while they wait, so the time it will fit
+is known. Each player who couldn't be matched is given the earliest time
+a run including them will fit, kept in a heap, and a sweep, run at most
+every `sweep_seconds` by whichever call comes first, checks only the
+players who are due. Players either side of a gap left by a room or a
+player leaving are given new times, as the runs across it are new.
+
+The Games row is created only once a room fills, outside the lock, and
+the room is kept for its players to collect for `matched_seconds`. The
+queues are this process's own: players must reach the same process to
+be matched with each other, so the API is served by a single process."""
+from collections import namedtuple
+import heapq
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from Database.leaderboard import RankedSet
+from Database.models import Games
+
+
+logger = logging.getLogger(__name__)
+
+ROOM_SIZES = range(2, 7)
+QUESTIONS_PER_GAME = 10
+DEFAULT_SKILL = 1500
+MATCHED_SECONDS = 60
+
+Ticket = namedtuple('Ticket', 'user_id category players skill since')
+Room = namedtuple('Room', 'game_id category user_ids')
+
+
+def create_game(category, players, user_ids):
+    """Creates the Games row for a full room and returns its id"""
+    return Games.objects.create(
+        number_of_questions=QUESTIONS_PER_GAME, number_of_players=players,
+        category=category, created_by_id=user_ids[0]).id
+
+
+def _key(ticket):
+    return ticket.skill, ticket.user_id
+
+
+class Matchmaker:
+    """Queues players by category, room size and skill and groups them
+    into rooms"""
+
+    def __init__(self, window=None, widen_per_second=None, max_window=None,
+                 sweep_seconds=None, matched_seconds=MATCHED_SECONDS,
+                 clock=time.monotonic, create_game=create_game, rng=None):
+        self.window = settings.MATCHMAKING_WINDOW \
+            if window is None else window
+        self.widen_per_second = settings.MATCHMAKING_WIDEN_PER_SECOND \
+            if widen_per_second is None else widen_per_second
+        self.max_window = settings.MATCHMAKING_MAX_WINDOW \
+            if max_window is None else max_window
+        self.sweep_seconds = settings.MATCHMAKING_SWEEP_SECONDS \
+            if sweep_seconds is None else sweep_seconds
+        self.matched_seconds = matched_seconds
+        self._clock = clock
+        self._create_game = create_game
+        self._rng = rng
+        self._queues = {}
+        self._tickets = {}
+        self._due = []
+        self._deadlines = {}
+        self._matched = {}
+        self._swept = clock()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def _fits_from(self, group):
+        """Returns when every member of a group, sorted by skill, will
+        accept the spread of its skills, or None if some never will"""
+        spread = group[-1].skill - group[0].skill
+        if spread > self.max_window:
+            return None
+        if spread <= self.window:
+            wait = 0
+        elif self.widen_per_second:
+            wait = (spread - self.window) / self.widen_per_second
+        else:
+            return None
+        return max(ticket.since for ticket in group) + wait
+
+    def _groups_around(self, queue, ticket):
+        """Yields each run of a room's worth of neighbouring players that
+        includes a player, with when it will fit"""
+        players = ticket.players
+        position = queue.bisect(_key(ticket))
+        start = max(0, position - players + 1)
+        neighbours = [self._tickets[user_id] for _, user_id in
+                      queue.slice(start, 2 * players - 1)]
+        position -= start
+
+        for first in range(max(0, position - players + 1),
+                           min(position, len(neighbours) - players) + 1):
+            group = neighbours[first:first + players]
+            yield self._fits_from(group), group
+
+    def _schedule(self, queue, ticket):
+        """Gives a player the earliest time a run including them fits"""
+        due = min((fits_from for fits_from, _ in
+                   self._groups_around(queue, ticket)
+                   if fits_from is not None), default=None)
+        if due is None:
+            self._deadlines.pop(ticket.user_id, None)
+        elif due != self._deadlines.get(ticket.user_id):
+            self._deadlines[ticket.user_id] = due
+            heapq.heappush(self._due, (due, ticket.user_id))
+
+    def _reschedule_gap(self, queue, ticket):
+        """Schedules the players either side of where a player was taken
+        out of the queue"""
+        players = ticket.players
+        position = queue.bisect(_key(ticket))
+        start = max(0, position - players + 1)
+        for _, user_id in queue.slice(start, position - start + players - 1):
+            self._schedule(queue, self._tickets[user_id])
+
+    def _take(self, queue, group):
+        for ticket in group:
+            queue.remove(_key(ticket))
+            del self._tickets[ticket.user_id]
+            self._deadlines.pop(ticket.user_id, None)
+        self._reschedule_gap(queue, group[0])
+        return group
+
+    def _check(self, queue, ticket, now):
+        """Returns the closest group around a player that fits, taken out
+        of the queue, or schedules the player and returns None"""
+        fitting = [(group[-1].skill - group[0].skill, group)
+                   for fits_from, group in self._groups_around(queue, ticket)
+                   if fits_from is not None and fits_from <= now]
+        if fitting:
+            return self._take(queue, min(
+                fitting, key=lambda fit: fit[0])[1])
+
+        self._schedule(queue, ticket)
+        return None
+
+    def _sweep(self, now, force=False):
+        if not force and now - self._swept < self.sweep_seconds:
+            return []
+        self._swept = now
+        # Rooms are added in the order they open, so the oldest come first
+        while self._matched:
+            user_id, (_, matched_at) = next(iter(self._matched.items()))
+            if now - matched_at <= self.matched_seconds:
+                break
+            del self._matched[user_id]
+
+        groups = []
+        while self._due and self._due[0][0] <= now:
+            due, user_id = heapq.heappop(self._due)
+            # Entries replaced by a later _schedule are skipped
+            if self._deadlines.get(user_id) != due:
+                continue
+            del self._deadlines[user_id]
+            ticket = self._tickets[user_id]
+            group = self._check(self._queues[ticket.category,
+                                             ticket.players], ticket, now)
+            if group is not None:
+                groups.append(group)
+        return groups
+
+    def _remove(self, user_id):
+        ticket = self._tickets.pop(user_id, None)
+        if ticket is not None:
+            self._deadlines.pop(user_id, None)
+            queue = self._queues[ticket.category, ticket.players]
+            queue.remove(_key(ticket))
+            self._reschedule_gap(queue, ticket)
+        return ticket
+
+    def _open(self, groups):
+        """Creates a game for each full room, or puts its players back in
+        their queue if that fails, and returns the rooms opened"""
+        rooms = []
+        for group in groups:
+            first = group[0]
+            user_ids = [ticket.user_id for ticket in
+                        sorted(group, key=lambda ticket: ticket.since)]
+            try:
+                game_id = self._create_game(first.category, first.players,
+                                            user_ids)
+            except Exception:
+                logger.exception('Could not create a game for %s', user_ids)
+                with self._lock:
+                    queue = self._queues[first.category, first.players]
+                    returned = [ticket for ticket in group
+                                if ticket.user_id not in self._tickets]
+                    for ticket in returned:
+                        self._tickets[ticket.user_id] = ticket
+                        queue.add(_key(ticket))
+                    for ticket in returned:
+                        self._schedule(queue, ticket)
+                continue
+
+            room = Room(game_id, first.category, user_ids)
+            rooms.append(room)
+            with self._lock:
+                now = self._clock()
+                for user_id in user_ids:
+                    self._matched[user_id] = room, now
+        return rooms
+
+    def join(self, user_id, category, players, skill=DEFAULT_SKILL):
+        """Queues a player, taking them out of any queue they were in,
+        and returns the Room they were matched into straight away, or
+        None while they wait"""
+        if players not in ROOM_SIZES:
+            raise ValueError('Rooms hold %d to %d players' % (
+                ROOM_SIZES[0], ROOM_SIZES[-1]))
+
+        with self._lock:
+            now = self._clock()
+            self._remove(user_id)
+            self._matched.pop(user_id, None)
+            ticket = Ticket(user_id, category, players, skill, now)
+            queue = self._queues.get((category, players))
+            if queue is None:
+                queue = self._queues[category, players] = \
+                    RankedSet(self._rng)
+            self._tickets[user_id] = ticket
+            queue.add(_key(ticket))
+
+            groups = self._sweep(now)
+            if user_id in self._tickets:
+                group = self._check(queue, ticket, now)
+                if group is not None:
+                    groups.append(group)
+
+        self._open(groups)
+        with self._lock:
+            matched = self._matched.get(user_id)
+        return None if matched is None else matched[0]
+
+    def poll(self, user_id):
+        """Returns the Room a player was matched into, or None while they
+        wait. Raises KeyError if they are neither queued nor matched"""
+        with self._lock:
+            groups = self._sweep(self._clock())
+        self._open(groups)
+
+        with self._lock:
+            matched = self._matched.get(user_id)
+            if matched is None and user_id not in self._tickets:
+                raise KeyError(user_id)
+        return None if matched is None else matched[0]
+
+    def leave(self, user_id):
+        """Takes a player out of their queue and returns whether they
+        were in one"""
+        with self._lock:
+            return self._remove(user_id) is not None
+
+    def sweep(self):
+        """Matches every group whose windows have widened enough, now,
+        and returns the rooms opened"""
+        with self._lock:
+            groups = self._sweep(self._clock(), force=True)
+        return self._open(groups)
+
+
+matchmaker = Matchmaker()
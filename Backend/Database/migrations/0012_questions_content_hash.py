@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0011_auto_20200716_2144'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questions',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.0.14 on 2026-10-18 02:09
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_answers(apps, schema_editor):
+    """Folds repeated (user, question) rows into the oldest one so the
+    unique constraint can be added"""
+    UserAnswers = apps.get_model('Database', 'UserAnswers')
+    duplicates = UserAnswers.objects.values('user_id', 'question_id') \
+        .annotate(rows=Count('id'), keep=Min('id'),
+                  correct=Sum('count_correct'),
+                  incorrect=Sum('count_incorrect')) \
+        .filter(rows__gt=1).order_by()
+
+    for duplicate in duplicates.iterator():
+        rows = UserAnswers.objects.filter(
+            user_id=duplicate['user_id'],
+            question_id=duplicate['question_id'],
+        )
+        latest = rows.order_by('-id').values_list('result', flat=True)[0]
+        rows.filter(id=duplicate['keep']).update(
+            result=latest,
+            count_correct=duplicate['correct'],
+            count_incorrect=duplicate['incorrect'],
+        )
+        rows.exclude(id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0012_questions_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_answers,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='useranswers',
+            constraint=models.UniqueConstraint(fields=('user', 'question'), name='unique_user_answer'),
+        ),
+    ]
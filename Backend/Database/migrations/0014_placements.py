@@ -0,0 +1,59 @@
+# Generated by Django 3.0.14 on 2026-10-18 02:11
+
+import Database.models
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+PLACES = ('winner', 'second_place', 'third_place', 'fourth_place',
+          'fifth_place', 'sixth_place')
+
+
+def backfill_placements(apps, schema_editor):
+    """Creates the placements of every existing result"""
+    Results = apps.get_model('Database', 'Results')
+    Placements = apps.get_model('Database', 'Placements')
+    rows = Results.objects.order_by('id').values_list(
+        'id', *('%s_id' % place for place in PLACES))
+
+    batch = []
+    for result_id, *user_ids in rows.iterator(chunk_size=5000):
+        for position, user_id in enumerate(user_ids, 1):
+            if user_id is not None:
+                batch.append(Placements(result_id=result_id,
+                                        user_id=user_id,
+                                        position=position))
+        if len(batch) >= 5000:
+            Placements.objects.bulk_create(batch)
+            batch = []
+    Placements.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0013_useranswers_unique_user_question'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Placements',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('position', models.SmallIntegerField()),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='placements', to='Database.Results')),
+                ('user', models.ForeignKey(db_index=False, on_delete=models.SET(Database.models.get_sentinel_user), to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='placements',
+            index=models.Index(fields=['user', 'position'], name='placement_user_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='placements',
+            constraint=models.UniqueConstraint(fields=('result', 'position'), name='unique_result_position'),
+        ),
+        migrations.RunPython(backfill_placements,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.0.14 on 2026-10-18 02:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0014_placements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntries',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('category', models.CharField(max_length=18)),
+                ('window', models.CharField(choices=[('daily', 'daily'), ('weekly', 'weekly'), ('all-time', 'all-time')], max_length=8)),
+                ('period_start', models.DateField()),
+                ('score', models.DecimalField(decimal_places=3, default=0, max_digits=12)),
+                ('wins', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentries',
+            index=models.Index(fields=['updated_at'], name='leaderboard_updated_at'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaderboardentries',
+            constraint=models.UniqueConstraint(fields=('category', 'window', 'period_start', 'user'), name='unique_leaderboard_entry'),
+        ),
+    ]
@@ -0,0 +1,115 @@
+# Generated by Django 3.0.14 on 2026-10-18 02:19
+
+from datetime import date
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+MONTHS_AHEAD = 3
+
+
+def add_months(month, months):
+    years, month_index = divmod(month.month - 1 + months, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def partition_login_attempts(apps, schema_editor):
+    """Rebuilds LoginAttempts as a table partitioned by month of
+    last_login on PostgreSQL, so old months can be dropped instead of
+    deleted row by row. Other databases keep the plain table"""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    table = 'Database_loginattempts'
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND "
+            "indexname NOT IN (SELECT conname FROM pg_constraint "
+            "WHERE conrelid = %s::regclass)", [table, quote(table)])
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'", [quote(table)])
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT pg_get_serial_sequence(%s, 'id')", [quote(table)])
+        sequence = cursor.fetchone()[0]
+        cursor.execute('SELECT min(last_login) FROM %s' % quote(table))
+        oldest = cursor.fetchone()[0]
+
+        old = quote(table + '_unpartitioned')
+        cursor.execute('ALTER TABLE %s RENAME TO %s' % (quote(table), old))
+        cursor.execute(
+            'CREATE TABLE {table} ('
+            'id bigint NOT NULL DEFAULT nextval(%s::regclass), '
+            'last_login timestamp with time zone NOT NULL, '
+            'login_status varchar(7) NOT NULL, '
+            'user_id bigint NOT NULL, '
+            'PRIMARY KEY (id, last_login)'
+            ') PARTITION BY RANGE (last_login)'.format(table=quote(table)),
+            [sequence])
+        cursor.execute('CREATE TABLE %s PARTITION OF %s DEFAULT' % (
+            quote(table + '_default'), quote(table)))
+
+        this_month = date.today().replace(day=1)
+        month = oldest.date().replace(day=1) if oldest else this_month
+        while month <= add_months(this_month, MONTHS_AHEAD):
+            cursor.execute(
+                'CREATE TABLE %s PARTITION OF %s FOR VALUES FROM (%%s) '
+                'TO (%%s)' % (
+                    quote('%s_p%04d%02d' % (table, month.year, month.month)),
+                    quote(table)),
+                [month, add_months(month, 1)])
+            month = add_months(month, 1)
+
+        cursor.execute(
+            'INSERT INTO %s (id, last_login, login_status, user_id) '
+            'SELECT id, last_login, login_status, user_id FROM %s' % (
+                quote(table), old))
+        cursor.execute('ALTER SEQUENCE %s OWNED BY %s.id' % (
+            sequence, quote(table)))
+        cursor.execute('DROP TABLE %s' % old)
+
+        for name, definition in foreign_keys:
+            cursor.execute('ALTER TABLE %s ADD CONSTRAINT %s %s' % (
+                quote(table), quote(name), definition))
+        for definition in indexes:
+            cursor.execute(definition)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0015_leaderboardentries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginAttemptsDaily',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('successes', models.IntegerField(default=0)),
+                ('failures', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='loginattempts',
+            index=models.Index(fields=['user', 'last_login'], name='login_attempt_user_time'),
+        ),
+        migrations.AddField(
+            model_name='loginattemptsdaily',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='loginattemptsdaily',
+            constraint=models.UniqueConstraint(fields=('user', 'day'), name='unique_login_day'),
+        ),
+        migrations.RunPython(partition_login_attempts,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.0.14 on 2026-10-18 02:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+def canonicalise_relationships(apps, schema_editor):
+    """Records who created each relationship, stores every pair with the
+    lower user id first and keeps only the newest row for a pair"""
+    UserRelationships = apps.get_model('Database', 'UserRelationships')
+    seen = set()
+    rows = UserRelationships.objects.order_by('-id')
+
+    for relationship in rows.iterator(chunk_size=5000):
+        first = relationship.user_first_id
+        second = relationship.user_second_id
+        pair = (min(first, second), max(first, second))
+        if pair in seen:
+            relationship.delete()
+            continue
+        seen.add(pair)
+
+        relationship.action_by_id = first
+        relationship.user_first_id, relationship.user_second_id = pair
+        relationship.save(update_fields=['action_by', 'user_first',
+                                         'user_second'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0016_partition_loginattempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userrelationships',
+            name='action_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='relationship_actions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(canonicalise_relationships,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userrelationships',
+            constraint=models.UniqueConstraint(fields=('user_first', 'user_second'), name='unique_relationship'),
+        ),
+        migrations.AddConstraint(
+            model_name='userrelationships',
+            constraint=models.CheckConstraint(check=models.Q(user_first__lte=django.db.models.expressions.F('user_second')), name='relationship_canonical_order'),
+        ),
+    ]
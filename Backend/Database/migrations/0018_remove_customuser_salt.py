@@ -0,0 +1,17 @@
+# Generated by Django 3.0.14 on 2026-10-18 02:24
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0017_canonical_userrelationships'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='customuser',
+            name='salt',
+        ),
+    ]
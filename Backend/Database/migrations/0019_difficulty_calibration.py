@@ -0,0 +1,38 @@
+# Generated by Django 3.0.14 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0018_remove_customuser_salt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questions',
+            name='accuracy',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questions',
+            name='answer_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='questions',
+            name='calibrated_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='questions',
+            name='difficulty_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='useranswers',
+            name='last_answered',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
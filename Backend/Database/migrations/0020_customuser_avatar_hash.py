@@ -0,0 +1,59 @@
+# Generated by Django 3.0.14 on 2026-10-18 03:18
+
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+logger = logging.getLogger(__name__)
+
+
+def hash_avatars(apps, schema_editor):
+    """Stores the variants of every avatar uploaded before avatars were
+    kept by hash and points their users at them. The uploaded files are
+    left where they are"""
+    from Database.avatars import digest, render, variant_name
+
+    CustomUser = apps.get_model('Database', 'CustomUser')
+    sizes = tuple(sorted(settings.AVATAR_SIZES))
+    users = CustomUser.objects.exclude(avatar='').exclude(avatar=None)
+    for user in users.only('id', 'avatar').iterator():
+        try:
+            with user.avatar.open('rb') as upload:
+                data = upload.read()
+            avatar_hash = digest(data)
+            if not default_storage.exists(variant_name(avatar_hash,
+                                                       sizes[-1])):
+                for size, content in sorted(render(data, sizes).items()):
+                    name = variant_name(avatar_hash, size)
+                    if not default_storage.exists(name):
+                        default_storage.save(name, ContentFile(content))
+        except (OSError, ValueError):
+            logger.warning('Could not keep the avatar of user %d', user.id,
+                           exc_info=True)
+            continue
+
+        CustomUser.objects.filter(pk=user.pk).update(avatar_hash=avatar_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0019_difficulty_calibration'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(hash_avatars, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='avatar',
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.0.14 on 2026-10-18 03:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0020_customuser_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('games_played', models.IntegerField(default=0)),
+                ('placed_games', models.IntegerField(default=0)),
+                ('position_total', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('practice_played', models.IntegerField(default=0)),
+                ('best_practice_score', models.SmallIntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserCategoryStats',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('category', models.CharField(max_length=18)),
+                ('games_played', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('correct', models.IntegerField(default=0)),
+                ('incorrect', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='usercategorystats',
+            constraint=models.UniqueConstraint(fields=('user', 'category'), name='unique_user_category_stats'),
+        ),
+    ]
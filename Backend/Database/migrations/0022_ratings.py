@@ -0,0 +1,24 @@
+# Generated by Django 3.0.14 on 2026-10-18 04:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0021_user_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ratings',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('rating', models.FloatField()),
+                ('games', models.IntegerField(default=0)),
+                ('last_result_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.14 on 2026-10-18 04:24
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_finished_at(apps, schema_editor):
+    """Marks the games that already have a result as finished when they
+    started, the nearest time recorded"""
+    Games = apps.get_model('Database', 'Games')
+    Games.objects.filter(winner__isnull=False).update(
+        finished_at=F('start_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0022_ratings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='games',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_finished_at,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.0.14 on 2026-10-18 05:12
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_rated(apps, schema_editor):
+    """Marks the results up to the last one any rating counts as rated,
+    as every result was applied in id order until now"""
+    Ratings = apps.get_model('Database', 'Ratings')
+    Results = apps.get_model('Database', 'Results')
+    last = Ratings.objects.aggregate(last=Max('last_result_id'))['last']
+    if last is not None:
+        Results.objects.filter(id__lte=last).update(rated=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0023_games_finished_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='results',
+            name='rated',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(backfill_rated, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.14 on 2026-10-18 05:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Database', '0024_results_rated'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='placements',
+            index=models.Index(fields=['user', '-result'], name='placement_user_result'),
+        ),
+    ]
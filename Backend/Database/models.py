@@ -45,9 +45,9 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     username = models.CharField(max_length=15, unique=True)
     email = models.EmailField(max_length=128, unique=True)
     password = models.CharField(max_length=254)
-    salt = models.CharField(max_length=128)
     email_verified = models.BooleanField(default=False)
-    avatar = models.ImageField(blank=True, null=True)
+    # The SHA-256 of the uploaded image, see Database/avatars.py
+    avatar_hash = models.CharField(max_length=64, blank=True, default='')
     date_joined = models.DateTimeField(default=timezone.now)
     last_updated = models.DateTimeField(blank=True, null=True)
     is_logged = models.BooleanField(default=False)
@@ -68,6 +68,13 @@ class Questions(models.Model):
     difficulty = models.CharField(max_length=8)
     question_type = models.CharField(max_length=20)
     text = models.CharField(max_length=254)
+    content_hash = models.CharField(
+        max_length=64, unique=True, blank=True, null=True)
+    answer_count = models.PositiveIntegerField(default=0)
+    accuracy = models.FloatField(blank=True, null=True)
+    difficulty_score = models.FloatField(blank=True, null=True)
+    calibrated_at = models.DateTimeField(blank=True, null=True,
+                                         db_index=True)
 
     objects = models.Manager()
 
@@ -108,9 +115,16 @@ class UserAnswers(models.Model):
     result = models.CharField(max_length=10, choices=RESULT)
     count_correct = models.SmallIntegerField(default=0)
     count_incorrect = models.SmallIntegerField(default=0)
+    last_answered = models.DateTimeField(auto_now=True, db_index=True)
 
     objects = models.Manager()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'],
+                                    name='unique_user_answer'),
+        ]
+
     def __str__(self):
         return self.result
 
@@ -136,9 +150,35 @@ class UserRelationships(models.Model):
     )
     relationship_status = models.CharField(
         max_length=7, choices=RELATIONSHIP_STATUS)
+    action_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='relationship_actions',
+        blank=True,
+        null=True,
+    )
 
     objects = models.Manager()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_first', 'user_second'],
+                                    name='unique_relationship'),
+            models.CheckConstraint(
+                check=models.Q(user_first__lte=models.F('user_second')),
+                name='relationship_canonical_order'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Stores each pair with the lower user id first so a pair only
+        has one row, keeping who sent the request or block in action_by"""
+        if self.action_by_id is None:
+            self.action_by_id = self.user_first_id
+        if self.user_first_id > self.user_second_id:
+            self.user_first_id, self.user_second_id = \
+                self.user_second_id, self.user_first_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.relationship_status
 
@@ -160,10 +200,40 @@ class LoginAttempts(models.Model):
 
     objects = models.Manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'last_login'],
+                         name='login_attempt_user_time'),
+        ]
+
     def __str__(self):
         return self.login_status
 
 
+class LoginAttemptsDaily(models.Model):
+    """Creates a model for the per-day login counts that LoginAttempts
+    rows are compacted into once they are past their retention period"""
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    day = models.DateField()
+    successes = models.IntegerField(default=0)
+    failures = models.IntegerField(default=0)
+
+    objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'],
+                                    name='unique_login_day'),
+        ]
+
+    def __str__(self):
+        return '%s' % self.day
+
+
 class Practice(models.Model):
     """Creates a model to record a users practice matches"""
     id = models.BigAutoField(primary_key=True)
@@ -183,6 +253,9 @@ class Practice(models.Model):
 
 class Results(models.Model):
     """Creates a model to record results for every match"""
+    PLACES = ('winner', 'second_place', 'third_place', 'fourth_place',
+              'fifth_place', 'sixth_place')
+
     id = models.BigAutoField(primary_key=True)
     winner = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -222,12 +295,75 @@ class Results(models.Model):
         blank=True,
         null=True,
     )
+    # Set once the result counts towards its players' Ratings
+    rated = models.BooleanField(default=False)
     objects = models.Manager()
 
     def __str__(self):
         return '%s' % self.winner
 
 
+class PlacementsManager(models.Manager):
+    """Answers a user's placement questions from the (user, position)
+    and (user, -result) indexes instead of checking every place column
+    of Results"""
+
+    def history(self, user):
+        """Every placement the user has had, newest first"""
+        return self.filter(user=user).order_by('-result_id')
+
+    def win_count(self, user):
+        return self.filter(user=user, position=1).count()
+
+    def average_position(self, user):
+        return self.filter(user=user).aggregate(
+            average=models.Avg('position'))['average']
+
+    def sync(self, result):
+        """Replaces the placements of a result with its place columns"""
+        self.filter(result=result).delete()
+        self.bulk_create([
+            Placements(result=result, user_id=user_id, position=position)
+            for position, user_id in enumerate(
+                (getattr(result, '%s_id' % place)
+                 for place in Results.PLACES), 1)
+            if user_id is not None
+        ])
+
+
+class Placements(models.Model):
+    """Creates a model with a row for each player placed in a match"""
+    id = models.BigAutoField(primary_key=True)
+    result = models.ForeignKey(
+        Results,
+        on_delete=models.CASCADE,
+        related_name='placements',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET(get_sentinel_user),
+        db_index=False,
+    )
+    position = models.SmallIntegerField()
+
+    objects = PlacementsManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['result', 'position'],
+                                    name='unique_result_position'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'position'],
+                         name='placement_user_position'),
+            models.Index(fields=['user', '-result'],
+                         name='placement_user_result'),
+        ]
+
+    def __str__(self):
+        return '%s' % self.position
+
+
 class SuddenDeath(models.Model):
     """Creates a model to record the results of any matches that
     make it to sudden death"""
@@ -268,6 +404,8 @@ class Games(models.Model):
     )
     winner = models.ForeignKey(
         Results, on_delete=models.CASCADE, null=True, blank=True)
+    # Set when the scores are recorded, for games of any size
+    finished_at = models.DateTimeField(null=True, blank=True)
     sudden_death_id = models.ForeignKey(
         SuddenDeath, on_delete=models.CASCADE, null=True, blank=True)
 
@@ -293,3 +431,120 @@ class UserScores(models.Model):
 
     def __str__(self):
         return '%s' % self.total_score
+
+
+class LeaderboardEntries(models.Model):
+    """Creates a model for the persisted snapshot of the leaderboards,
+    with a row per user for each category, window and period"""
+    WINDOW = (
+        ('daily', 'daily'),
+        ('weekly', 'weekly'),
+        ('all-time', 'all-time')
+    )
+
+    id = models.BigAutoField(primary_key=True)
+    category = models.CharField(max_length=18)
+    window = models.CharField(max_length=8, choices=WINDOW)
+    period_start = models.DateField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    score = models.DecimalField(max_digits=12, decimal_places=3, default=0)
+    wins = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'window', 'period_start', 'user'],
+                name='unique_leaderboard_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at'],
+                         name='leaderboard_updated_at'),
+        ]
+
+    def __str__(self):
+        return '%s' % self.score
+
+
+class UserStats(models.Model):
+    """Creates a model for each user's running totals, kept up to date
+    as games and practice matches finish, see Database/user_stats.py"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    games_played = models.IntegerField(default=0)
+    placed_games = models.IntegerField(default=0)
+    position_total = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    practice_played = models.IntegerField(default=0)
+    best_practice_score = models.SmallIntegerField(blank=True, null=True)
+
+    objects = models.Manager()
+
+    @property
+    def average_position(self):
+        if not self.placed_games:
+            return None
+        return self.position_total / self.placed_games
+
+    def __str__(self):
+        return '%s' % self.games_played
+
+
+class Ratings(models.Model):
+    """Creates a model for each rated user's Elo rating, with the games
+    and the last result it counts, see Database/ratings.py"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    rating = models.FloatField()
+    games = models.IntegerField(default=0)
+    last_result_id = models.BigIntegerField(default=0)
+
+    objects = models.Manager()
+
+    def __str__(self):
+        return '%.0f' % self.rating
+
+
+class UserCategoryStats(models.Model):
+    """Creates a model for each user's running totals in a category:
+    placed games and wins by game category, answers by question
+    category"""
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    category = models.CharField(max_length=18)
+    games_played = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    incorrect = models.IntegerField(default=0)
+
+    objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'],
+                                    name='unique_user_category_stats'),
+        ]
+
+    @property
+    def accuracy(self):
+        answered = self.correct + self.incorrect
+        if not answered:
+            return None
+        return self.correct / answered
+
+    def __str__(self):
+        return '%s' % self.category
@@ -0,0 +1,162 @@
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+import random
+import threading
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Database.models import Answers, Questions
+
+
+GENERATION_KEY = 'question_pool:generation'
+REJECTION_ATTEMPTS = 4
+
+
+class QuestionPool:
+    """Keeps the id of every playable question in memory, grouped by
+    (category, difficulty, question_type), so a game can pick its
+    questions without the database shuffling the whole table.
+
+    A question is playable once it has an answer. The index is rebuilt
+    lazily the first time it is needed after a save or delete, and the
+    generation counter lives in the cache so every worker sharing that
+    cache notices the change."""
+
+    def __init__(self, rng=None):
+        self._random = rng or random.Random()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._index = {}
+
+    def invalidate(self):
+        """Marks the index as stale in every process sharing the cache"""
+        if cache.add(GENERATION_KEY, 1, timeout=None):
+            return
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            # The key was evicted between add() and incr()
+            cache.set(GENERATION_KEY, 1, timeout=None)
+
+    def _current_generation(self):
+        return cache.get_or_set(GENERATION_KEY, 0, timeout=None)
+
+    def _build(self):
+        index = {}
+        rows = Questions.objects.filter(answers__isnull=False) \
+            .values_list('id', 'category', 'difficulty', 'question_type') \
+            .distinct().order_by()
+
+        for pk, category, difficulty, question_type in \
+                rows.iterator(chunk_size=10000):
+            key = (category, difficulty, question_type)
+            ids = index.get(key)
+            if ids is None:
+                ids = index[key] = array('q')
+            ids.append(pk)
+
+        return index
+
+    def index(self):
+        """Returns the id arrays keyed by (category, difficulty,
+        question_type), rebuilding them if they are stale"""
+        generation = self._current_generation()
+        if generation == self._generation:
+            return self._index
+
+        with self._lock:
+            if generation != self._generation:
+                self._index = self._build()
+                self._generation = generation
+
+        return self._index
+
+    def _buckets(self, category, difficulty, question_type):
+        buckets = []
+        for (bucket_category, bucket_difficulty, bucket_type), ids in \
+                self.index().items():
+            if category not in (None, 'random') and \
+                    bucket_category != category:
+                continue
+            if difficulty is not None and bucket_difficulty != difficulty:
+                continue
+            if question_type is not None and bucket_type != question_type:
+                continue
+            buckets.append(ids)
+
+        return buckets
+
+    def count(self, category='random', difficulty=None, question_type=None):
+        """Returns how many playable questions match the filters"""
+        return sum(len(ids) for ids in
+                   self._buckets(category, difficulty, question_type))
+
+    def sample(self, number, category='random', difficulty=None,
+               question_type=None, exclude=None):
+        """Picks `number` distinct question ids matching the filters.
+
+        The 'random' category, like a difficulty or type of None, matches
+        everything. Positions are drawn across the matching buckets as if
+        they were one list and then mapped back to their bucket, so the
+        cost depends on `number` rather than the size of the bank.
+
+        Questions in `exclude`, such as the players' answered questions,
+        are only picked when there aren't enough others to go round."""
+        buckets = self._buckets(category, difficulty, question_type)
+        offsets = list(accumulate(len(ids) for ids in buckets))
+        total = offsets[-1] if offsets else 0
+
+        if number > total:
+            raise ValueError('Only %d questions match the requested filters'
+                             % total)
+
+        def question_at(position):
+            bucket = bisect_right(offsets, position)
+            start = offsets[bucket - 1] if bucket else 0
+            return buckets[bucket][position - start]
+
+        if exclude is None:
+            return [question_at(position) for position in
+                    self._random.sample(range(total), number)]
+
+        picked, tried = [], set()
+        for _ in range(number * REJECTION_ATTEMPTS):
+            position = self._random.randrange(total)
+            if position in tried:
+                continue
+            tried.add(position)
+            question_id = question_at(position)
+            if question_id not in exclude:
+                picked.append(question_id)
+                if len(picked) == number:
+                    return picked
+
+        # Most of the matching questions have been excluded, so go
+        # through all of them
+        unseen, seen = [], []
+        for ids in buckets:
+            for question_id in ids:
+                (seen if question_id in exclude else unseen).append(
+                    question_id)
+        if len(unseen) >= number:
+            return self._random.sample(unseen, number)
+
+        picked = unseen + self._random.sample(seen, number - len(unseen))
+        self._random.shuffle(picked)
+        return picked
+
+
+question_pool = QuestionPool()
+
+
+@receiver(post_save, sender=Questions)
+@receiver(post_delete, sender=Questions)
+@receiver(post_save, sender=Answers)
+@receiver(post_delete, sender=Answers)
+def invalidate_question_pool(sender, **kwargs):
+    """Any change to a question or its answers can move it between
+    buckets or make it (un)playable"""
+    question_pool.invalidate()
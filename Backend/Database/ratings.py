@@ -0,0 +1,260 @@
+"""Elo ratings from the finishing order of Results.
+
+A game counts as a match between every pair of its players, won by the
+one placed higher, and each player's rating moves by their K factor,
+higher for their first PROVISIONAL_GAMES, times their score less their
+expected score over all their opponents, divided by the number of
+opponents. Two player games are plain Elo.
+
+Ratings are kept in Ratings, one row per rated user with the number of
+games counted and the id of the last result counted. As a game finishes,
+the game_finished receiver marks its result rated, locks its players'
+rows, computes their new ratings and writes one row per player, all in
+one transaction. A result already marked is skipped, so applying it
+twice is harmless, and results are rated in the order they commit,
+whatever their ids.
+
+`rebuild` replays every result in id order with numpy. Each game is
+given a round one after the latest round of any of its players, so no
+player appears twice in a round and all of a round's games are updated
+at once, giving the ratings a game by game replay would. numpy is only
+imported by the replay, so processes that just rate finished games, in
+plain Python, never load it."""
+from django.db import transaction
+from django.dispatch import receiver
+
+from Database.bulk import insert, upsert
+from Database.models import Ratings, Results
+from Database.signals import game_finished
+
+
+CHUNK_SIZE = 50000
+# Results that committed after the rebuild read them, marked unrated a
+# batch at a time
+LATE_BATCH_SIZE = 500
+DEFAULT_RATING = 1500
+K_FACTOR = 24
+PROVISIONAL_K_FACTOR = 48
+PROVISIONAL_GAMES = 20
+SEATS = len(Results.PLACES)
+
+
+def _expected(rating, opponent):
+    return 1 / (1 + 10 ** ((opponent - rating) / 400))
+
+
+def _k_factor(games):
+    return PROVISIONAL_K_FACTOR if games < PROVISIONAL_GAMES else K_FACTOR
+
+
+def game_changes(ratings, games):
+    """Returns the rating change of each player of one game from their
+    ratings and the games they've counted, first place first"""
+    opponents = max(len(ratings) - 1, 1)
+    return [
+        _k_factor(played) * sum(
+            (place < other) - _expected(rating, ratings[other])
+            for other in range(len(ratings)) if other != place
+        ) / opponents
+        for place, (rating, played) in enumerate(zip(ratings, games))
+    ]
+
+
+def changes(ratings, games, seated):
+    """Returns the rating change of every player in a batch of games, as
+    arrays of one row per game and one column per place: the players'
+    ratings, the games they've counted and whether the seat is taken"""
+    import numpy
+
+    # S[i, j] is 1 when the player in seat i finished above the one in
+    # seat j
+    above = numpy.triu(numpy.ones((SEATS, SEATS)), 1)
+    expected = 1 / (1 + 10 ** (
+        (ratings[:, None, :] - ratings[:, :, None]) / 400))
+    pairs = seated[:, :, None] & seated[:, None, :] & \
+        ~numpy.eye(seated.shape[1], dtype=bool)
+    scores = numpy.where(pairs, above[:seated.shape[1], :seated.shape[1]] -
+                         expected, 0).sum(axis=2)
+    k_factors = numpy.where(games < PROVISIONAL_GAMES, PROVISIONAL_K_FACTOR,
+                            K_FACTOR)
+    opponents = numpy.maximum(seated.sum(axis=1, keepdims=True) - 1, 1)
+
+    return numpy.where(seated, k_factors * scores / opponents, 0)
+
+
+def rounds(seats, users):
+    """Returns the round of each game, rows of player indexes below
+    `users` from first place to last, with -1 for empty seats"""
+    import numpy
+
+    latest = [0] * users
+    numbers = numpy.empty(len(seats), dtype=numpy.int64)
+    # Converted a chunk at a time, as a list of every row would take
+    # several times the memory of the array
+    for start in range(0, len(seats), CHUNK_SIZE):
+        for row, players in enumerate(
+                seats[start:start + CHUNK_SIZE].tolist(), start):
+            players = [player for player in players if player >= 0]
+            number = max([latest[player] for player in players])
+            numbers[row] = number
+            number += 1
+            for player in players:
+                latest[player] = number
+
+    return numbers
+
+
+def replay(seats, users):
+    """Replays games, rows of player indexes below `users` from first
+    place to last with -1 for empty seats, in order, and returns every
+    player's rating, the games they counted and the row of their last
+    game, -1 if they had none"""
+    import numpy
+
+    ratings = numpy.full(users, DEFAULT_RATING, dtype=numpy.float64)
+    games = numpy.zeros(users, dtype=numpy.int64)
+    last = numpy.full(users, -1, dtype=numpy.int64)
+    if not len(seats):
+        return ratings, games, last
+
+    numbers = rounds(seats, users)
+    order = numpy.argsort(numbers, kind='stable')
+    bounds = numpy.searchsorted(numbers[order],
+                                numpy.arange(numbers.max() + 2))
+    for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        rows = order[start:end]
+        table = seats[rows]
+        seated = table >= 0
+        players = table[seated]
+        current = numpy.zeros(table.shape)
+        current[seated] = ratings[players]
+        played = numpy.zeros(table.shape, dtype=numpy.int64)
+        played[seated] = games[players]
+
+        ratings[players] += changes(current, played, seated)[seated]
+        games[players] += 1
+        last[players] = numpy.broadcast_to(rows[:, None], table.shape)[seated]
+
+    return ratings, games, last
+
+
+def load(chunk_size=CHUNK_SIZE, progress=None):
+    """Returns the id of every result, in order, and its players' user
+    ids from first place to last, 0 for empty seats, calling
+    `progress(results)` as chunks are read"""
+    import numpy
+
+    ids, players = [], []
+    rows = Results.objects.order_by('id').values_list(
+        'id', *('%s_id' % place for place in Results.PLACES))
+
+    def add(chunk):
+        # Read as floats so empty seats become NaN, which is then 0
+        block = numpy.array(chunk, dtype=numpy.float64)
+        ids.append(block[:, 0].astype(numpy.int64))
+        players.append(numpy.nan_to_num(block[:, 1:]).astype(numpy.int64))
+        if progress is not None:
+            progress(len(chunk))
+
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            add(chunk)
+            chunk = []
+    if chunk:
+        add(chunk)
+    if not ids:
+        return (numpy.zeros(0, dtype=numpy.int64),
+                numpy.zeros((0, SEATS), dtype=numpy.int64))
+
+    return numpy.concatenate(ids), numpy.concatenate(players)
+
+
+def record_result(result):
+    """Applies a result to its players' ratings, writing one row per
+    player, and returns whether it hadn't been counted already"""
+    user_ids = [user_id for user_id in (
+        getattr(result, '%s_id' % place) for place in Results.PLACES)
+        if user_id is not None]
+
+    with transaction.atomic():
+        if not Results.objects.filter(pk=result.id, rated=False).update(
+                rated=True):
+            return False
+        stored = {
+            user_id: (rating, games, last_result_id)
+            for user_id, rating, games, last_result_id in
+            Ratings.objects.select_for_update().filter(
+                user_id__in=user_ids).values_list(
+                    'user_id', 'rating', 'games', 'last_result_id')
+        }
+        ratings = [stored[user_id][0] if user_id in stored
+                   else DEFAULT_RATING for user_id in user_ids]
+        games = [stored[user_id][1] if user_id in stored else 0
+                 for user_id in user_ids]
+
+        upsert(Ratings, ['user_id', 'rating', 'games', 'last_result_id'], [
+            (user_id, rating + change, played + 1, result.id)
+            for user_id, rating, played, change in zip(
+                user_ids, ratings, games, game_changes(ratings, games))
+        ], conflict=['user_id'],
+            replace=['rating', 'games', 'last_result_id'])
+
+    return True
+
+
+@receiver(game_finished)
+def rate_finished_game(sender, game, result, standings, **kwargs):
+    if result is not None:
+        record_result(result)
+
+
+def rating_of(user_id):
+    """Returns a user's rating, DEFAULT_RATING until they have one"""
+    ratings = Ratings.objects.filter(user_id=user_id).values_list(
+        'rating', flat=True)
+    return next(iter(ratings), DEFAULT_RATING)
+
+
+def rebuild(chunk_size=CHUNK_SIZE, progress=None):
+    """Replaces every rating with a replay of all results and returns
+    how many users are rated. Results finishing meanwhile, including
+    ones with lower ids that committed late, are applied once the new
+    ratings are written"""
+    import numpy
+
+    ids, players = load(chunk_size, progress)
+    user_ids, seats = numpy.unique(players, return_inverse=True)
+    seats = seats.reshape(players.shape)
+    del players
+    if len(user_ids) and user_ids[0] == 0:
+        user_ids = user_ids[1:]
+        seats -= 1
+    ratings, games, last = replay(seats, len(user_ids))
+
+    with transaction.atomic():
+        Ratings.objects.all().delete()
+        insert(Ratings, [
+            Ratings(user_id=user_id, rating=rating, games=played,
+                    last_result_id=last_result_id)
+            for user_id, rating, played, last_result_id in zip(
+                user_ids.tolist(), ratings.tolist(), games.tolist(),
+                ids[last].tolist())
+        ])
+        replayed = ids[-1] if len(ids) else 0
+        Results.objects.filter(id__lte=replayed).update(rated=True)
+        Results.objects.filter(id__gt=replayed).update(rated=False)
+        late = numpy.setdiff1d(numpy.fromiter(
+            Results.objects.filter(id__lte=replayed).order_by('id')
+            .values_list('id', flat=True).iterator(chunk_size=chunk_size),
+            dtype=numpy.int64), ids, assume_unique=True).tolist()
+        for start in range(0, len(late), LATE_BATCH_SIZE):
+            Results.objects.filter(
+                id__in=late[start:start + LATE_BATCH_SIZE]).update(
+                    rated=False)
+
+    for result in Results.objects.filter(rated=False).order_by('id'):
+        record_result(result)
+
+    return Ratings.objects.count()
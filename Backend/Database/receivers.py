@@ -0,0 +1,12 @@
+"""Signal receivers that keep denormalised tables in step with the
+models they are derived from"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from Database.models import Placements, Results
+
+
+@receiver(post_save, sender=Results)
+def sync_placements(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Placements.objects.sync(instance)
@@ -0,0 +1,50 @@
+"""Removing expired sessions for the database session engines.
+
+Django's clearsessions deletes every expired row in one statement, which
+holds its locks for as long as that takes on a large table. Here they
+are deleted a batch at a time, oldest first, each batch found through
+the expire_date index and committed on its own. The signed cookie and
+cache engines need none of this: their sessions expire by themselves."""
+from importlib import import_module
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+
+BATCH_SIZE = 5000
+
+
+def session_model():
+    """Returns the model the configured engine stores sessions in, or
+    None when it doesn't use the database"""
+    store = import_module(settings.SESSION_ENGINE).SessionStore
+    if not hasattr(store, 'get_model_class'):
+        return None
+    return store.get_model_class()
+
+
+def purge_expired(batch_size=BATCH_SIZE, now=None):
+    """Deletes sessions that expired before `now` and returns how many
+    were deleted"""
+    model = session_model()
+    if model is None:
+        return 0
+
+    now = now or timezone.now()
+    using = model.objects.db
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    sql = 'DELETE FROM {table} WHERE session_key IN (' \
+        'SELECT session_key FROM {table} WHERE expire_date < %s ' \
+        'ORDER BY expire_date LIMIT %s)'.format(table=table)
+
+    deleted = 0
+    while True:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, [
+                connection.ops.adapt_datetimefield_value(now), batch_size])
+            count = cursor.rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/3.0/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -39,10 +41,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'Database',
+    'rest_framework',
+    'Database.apps.DatabaseConfig',
+    'API.apps.ApiConfig',
 ]
 
 MIDDLEWARE = [
+    'Database.sql_metrics.SQLMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -106,6 +111,48 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing, see Database/hashers.py and Database/authentication.py
+
+PASSWORD_HASHERS = [
+    'Database.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+PASSWORD_HASH_ITERATIONS = int(
+    os.environ.get('PASSWORD_HASH_ITERATIONS', 180000))
+
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 4))
+
+
+# Sessions, chosen by SESSION_STORE. 'cached_db' by default, so most
+# authenticated requests read the session from the cache and it can
+# still be revoked by deleting its row; 'cache' keeps them only in
+# SESSION_CACHE_ALIAS, which must be shared by every process, and
+# 'cookies' in signed cookies, which don't touch django_session but
+# can't be revoked before they expire except by changing the password,
+# which invalidates the session hash. Expired database sessions are
+# removed by the purge_sessions command
+
+SESSION_STORES = {
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'db': 'django.contrib.sessions.backends.db',
+}
+
+
+def session_engine(store, setting='SESSION_STORE'):
+    if store not in SESSION_STORES:
+        raise ImproperlyConfigured('%s must be one of %s, not %r' % (
+            setting, ', '.join(sorted(SESSION_STORES)), store))
+    return SESSION_STORES[store]
+
+
+SESSION_ENGINE = session_engine(os.environ.get('SESSION_STORE', 'cached_db'))
+
+SESSION_CACHE_ALIAS = 'default'
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.0/topics/i18n/
 
@@ -125,4 +172,75 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
+MEDIA_URL = '/media/'
+
 AUTH_USER_MODEL = 'Database.CustomUser'
+
+AUTHENTICATION_BACKENDS = [
+    'Database.login_throttle.ThrottledModelBackend',
+]
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.AllowAny',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'API.pagination.KeysetPagination',
+    'PAGE_SIZE': 100,
+}
+
+# Versioned response cache, see API/response_cache.py
+
+RESPONSE_CACHE = 'default'
+
+RESPONSE_CACHE_SECONDS = 5 * 60
+
+RESPONSE_CACHE_LOCAL_ENTRIES = 1024
+
+# Login throttling, see Database/login_throttle.py
+
+LOGIN_THROTTLE_CACHE = 'default'
+
+LOGIN_THROTTLE_WINDOW_SECONDS = 15 * 60
+
+LOGIN_THROTTLE_USER_FAILURES = 5
+
+LOGIN_THROTTLE_IP_FAILURES = 100
+
+# Sampled per-view SQL metrics, see Database/sql_metrics.py
+
+SQL_METRICS_SAMPLE_RATE = float(
+    os.environ.get('SQL_METRICS_SAMPLE_RATE', 0.05))
+
+SQL_METRICS_DUPLICATE_THRESHOLD = 3
+
+SQL_METRICS_SLOWEST = 5
+
+# The bearer token /metrics/ is scraped with; it is not served without one
+SQL_METRICS_TOKEN = os.environ.get('SQL_METRICS_TOKEN', '')
+
+# Cached friend graph adjacency, see Database/friend_graph.py
+
+FRIEND_GRAPH_CACHE_SECONDS = 60 * 60
+
+# Avatar processing, see Database/avatars.py
+
+AVATAR_SIZES = (32, 64, 128, 256)
+
+AVATAR_WORKERS = int(os.environ.get('AVATAR_WORKERS', 2))
+
+AVATAR_MAX_BYTES = 5 * 1024 * 1024
+
+# Matchmaking, see Database/matchmaking.py
+
+MATCHMAKING_WINDOW = 100
+
+MATCHMAKING_WIDEN_PER_SECOND = 10
+
+MATCHMAKING_MAX_WINDOW = 600
+
+MATCHMAKING_SWEEP_SECONDS = 1
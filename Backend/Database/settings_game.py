@@ -0,0 +1,37 @@
+"""
+Django settings for game workers, served by Database.asgi_game.
+
+Game workers only run the real-time engine and logins, so the admin,
+messages, static files, templates and the API's REST framework are left
+out, and no middleware is loaded, which shortens cold starts and keeps
+each worker's memory down. The API app stays installed for the
+receivers that bump its version stamps when games finish.
+"""
+import os
+
+from Database.settings import *  # noqa: F401,F403
+from Database.settings import session_engine
+
+# Each query is kept on the connection when DEBUG is on, which costs
+# time and memory on the game's hot path
+DEBUG = False
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'Database.apps.DatabaseConfig',
+    'API.apps.ApiConfig',
+]
+
+MIDDLEWARE = []
+
+# Game logins are kept in signed cookies, so a game's requests never
+# touch django_session, under a cookie name of their own so the rest of
+# the site doesn't mistake them for its sessions. GAME_SESSION_STORE
+# chooses another store, as SESSION_STORE does for the site
+SESSION_ENGINE = session_engine(
+    os.environ.get('GAME_SESSION_STORE', 'cookies'), 'GAME_SESSION_STORE')
+SESSION_COOKIE_NAME = 'gamesessionid'
+
+TEMPLATES = []
@@ -0,0 +1,12 @@
+from django.dispatch import Signal
+
+
+# Sent by Database.games.finish_game inside the transaction that records
+# a finished game, with the Games row, its Results row (None for a solo
+# game) and the list of Standing objects ordered from first to last.
+game_finished = Signal()
+
+# Sent with a model as the sender after a bulk write to its table that
+# bypasses save() and delete(), and so their post_save and post_delete
+# signals, such as an import or a bulk UPDATE.
+rows_changed = Signal()
@@ -0,0 +1,259 @@
+"""Per-view SQL metrics for a sample of requests.
+
+SQLMetricsMiddleware picks SQL_METRICS_SAMPLE_RATE of requests and runs
+them under a connection execute wrapper that times every statement. Each
+sampled request adds its query count and time in the database to the
+view's histograms, the statements it repeated at least
+SQL_METRICS_DUPLICATE_THRESHOLD times (usually an N+1 loop) to the
+view's duplicate counts, and its slowest statements to the view's
+slowest. Statements are grouped by fingerprint: the SQL with literals
+replaced and placeholder and column lists collapsed.
+
+The totals are kept per process and served in the Prometheus text
+format by `metrics_view`, to requests carrying SQL_METRICS_TOKEN."""
+from collections import Counter
+import hmac
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+MAX_FINGERPRINTS = 50
+MAX_STATEMENT_LENGTH = 300
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_placeholder_list = re.compile(r'%s(?:\s*,\s*%s)+')
+_row_list = re.compile(r'(\(%s, \.\.\.\))(?:\s*,\s*\(%s, \.\.\.\))+')
+_select_list = re.compile(r'^SELECT (DISTINCT )?.+? FROM ', re.S)
+_spaces = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Returns `sql` with its literals replaced by ?, its lists of
+    placeholders or rows shortened and its selected columns left out, so
+    the same statement with different values or list lengths has the
+    same, short, fingerprint"""
+    sql = _select_list.sub(r'SELECT \1... FROM ', sql)
+    sql = _literals.sub('?', sql)
+    sql = _placeholder_list.sub('%s, ...', sql)
+    sql = _row_list.sub(r'\1, ...', sql)
+
+    return _spaces.sub(' ', sql).strip()[:MAX_STATEMENT_LENGTH]
+
+
+class QueryRecorder:
+    """A connection execute wrapper that times each statement run while
+    it is installed. Statements are fingerprinted once the request is
+    over, once for each distinct SQL string"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self._runs = Counter()
+        self._longest = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            self._runs[sql] += 1
+            if elapsed > self._longest.get(sql, -1):
+                self._longest[sql] = elapsed
+
+    def statements(self):
+        """Returns (fingerprint, times run, longest run in seconds) for
+        each statement"""
+        merged = {}
+        for sql, runs in self._runs.items():
+            statement = fingerprint(sql)
+            total, longest = merged.get(statement, (0, 0))
+            merged[statement] = (total + runs,
+                                 max(longest, self._longest[sql]))
+
+        return [(statement, runs, longest)
+                for statement, (runs, longest) in merged.items()]
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+        self.total += value
+        self.count += 1
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+class SQLMetrics:
+    """Per-view totals of the sampled requests' queries"""
+
+    def __init__(self, duplicate_threshold=None, slowest=None):
+        self.duplicate_threshold = duplicate_threshold or \
+            settings.SQL_METRICS_DUPLICATE_THRESHOLD
+        self.slowest_kept = slowest or settings.SQL_METRICS_SLOWEST
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._queries = {}
+        self._seconds = {}
+        self._duplicates = {}
+        self._slowest = {}
+
+    def record(self, view, recorder):
+        statements = recorder.statements()
+        with self._lock:
+            self._requests[view] += 1
+            if view not in self._queries:
+                self._queries[view] = Histogram(QUERY_BUCKETS)
+                self._seconds[view] = Histogram(SECONDS_BUCKETS)
+                self._duplicates[view] = Counter()
+                self._slowest[view] = {}
+            self._queries[view].observe(recorder.count)
+            self._seconds[view].observe(recorder.seconds)
+
+            duplicates = self._duplicates[view]
+            slowest = self._slowest[view]
+            for statement, runs, longest in statements:
+                if runs >= self.duplicate_threshold and (
+                        statement in duplicates or
+                        len(duplicates) < MAX_FINGERPRINTS):
+                    duplicates[statement] += runs
+                if longest > slowest.get(statement, -1):
+                    slowest[statement] = longest
+            if len(slowest) > self.slowest_kept:
+                kept = sorted(slowest.items(), key=lambda item: item[1],
+                              reverse=True)[:self.slowest_kept]
+                self._slowest[view] = dict(kept)
+
+    def reset(self):
+        with self._lock:
+            for totals in (self._requests, self._queries, self._seconds,
+                           self._duplicates, self._slowest):
+                totals.clear()
+
+    def _histogram_lines(self, name, histograms):
+        for view, histogram in sorted(histograms.items()):
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                yield '%s_bucket{view="%s",le="%s"} %d' % (
+                    name, _label(view), bound, count)
+            yield '%s_bucket{view="%s",le="+Inf"} %d' % (
+                name, _label(view), histogram.count)
+            yield '%s_sum{view="%s"} %s' % (
+                name, _label(view), histogram.total)
+            yield '%s_count{view="%s"} %d' % (
+                name, _label(view), histogram.count)
+
+    def exposition(self):
+        """Returns every metric in the Prometheus text format"""
+        with self._lock:
+            lines = [
+                '# HELP sql_sampled_requests_total Requests whose queries '
+                'were recorded',
+                '# TYPE sql_sampled_requests_total counter',
+            ]
+            lines.extend(
+                'sql_sampled_requests_total{view="%s"} %d' % (
+                    _label(view), count)
+                for view, count in sorted(self._requests.items()))
+
+            lines += [
+                '# HELP sql_queries_per_request Queries run by a sampled '
+                'request',
+                '# TYPE sql_queries_per_request histogram',
+            ]
+            lines.extend(self._histogram_lines('sql_queries_per_request',
+                                               self._queries))
+            lines += [
+                '# HELP sql_seconds_per_request Seconds a sampled request '
+                'spent running queries',
+                '# TYPE sql_seconds_per_request histogram',
+            ]
+            lines.extend(self._histogram_lines('sql_seconds_per_request',
+                                               self._seconds))
+
+            lines += [
+                '# HELP sql_duplicate_queries_total Statements run at least '
+                '%d times by one sampled request' % self.duplicate_threshold,
+                '# TYPE sql_duplicate_queries_total counter',
+            ]
+            for view, duplicates in sorted(self._duplicates.items()):
+                lines.extend(
+                    'sql_duplicate_queries_total{view="%s",statement="%s"} '
+                    '%d' % (_label(view), _label(statement), count)
+                    for statement, count in duplicates.most_common())
+
+            lines += [
+                '# HELP sql_slowest_statement_seconds Longest run of the '
+                'slowest statements seen',
+                '# TYPE sql_slowest_statement_seconds gauge',
+            ]
+            for view, slowest in sorted(self._slowest.items()):
+                lines.extend(
+                    'sql_slowest_statement_seconds{view="%s",statement="%s"} '
+                    '%s' % (_label(view), _label(statement), seconds)
+                    for statement, seconds in sorted(
+                        slowest.items(), key=lambda item: -item[1]))
+
+        return '\n'.join(lines) + '\n'
+
+
+class SQLMetricsMiddleware:
+    """Records the queries of a sample of requests in `sql_metrics`"""
+
+    def __init__(self, get_response, rng=random.random):
+        self.get_response = get_response
+        self.sample_rate = settings.SQL_METRICS_SAMPLE_RATE
+        self._random = rng
+
+    def __call__(self, request):
+        if self._random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        sql_metrics.record(match.view_name if match else 'unresolved',
+                           recorder)
+
+        return response
+
+
+def metrics_view(request):
+    """The metrics in the Prometheus text format, for a scraper sending
+    `Authorization: Bearer <SQL_METRICS_TOKEN>`. REMOTE_ADDR can't be
+    trusted for this, as behind a proxy every request is local"""
+    token = settings.SQL_METRICS_TOKEN
+    if not token or not hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', '').encode(),
+            ('Bearer %s' % token).encode()):
+        raise Http404
+
+    return HttpResponse(sql_metrics.exposition(),
+                        content_type='text/plain; version=0.0.4')
+
+
+sql_metrics = SQLMetrics()
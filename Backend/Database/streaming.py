@@ -0,0 +1,70 @@
+"""Streaming responses under ASGI.
+
+Django 3.0's ASGI handler iterates a streaming response on the event
+loop, where a query raises SynchronousOnlyOperation and would hold up
+every other connection besides. StreamingASGIHandler produces each part
+on a thread of the response's own instead, always the same one, so a
+response can stream rows from a server-side cursor opened by its first
+part. The thread has a database connection of its own: the thread
+sync_to_async shares between requests closes its connection as each
+request starts and finishes, which would close the cursor under a
+response still streaming."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connections
+
+
+def _next_part(parts):
+    return next(parts, None)
+
+
+def _close(response):
+    try:
+        response.close()
+    finally:
+        connections.close_all()
+
+
+class StreamingASGIHandler(ASGIHandler):
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='')
+                            .encode('ascii').strip()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+
+        loop = asyncio.get_running_loop()
+        streamer = ThreadPoolExecutor(1, thread_name_prefix='streaming')
+        parts = iter(response)
+        try:
+            while True:
+                part = await loop.run_in_executor(streamer, _next_part,
+                                                  parts)
+                if part is None:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk,
+                                'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            # Closes the parts' generator, and with it any cursor, and
+            # the connection on the thread that opened them
+            await loop.run_in_executor(streamer, _close, response)
+            streamer.shutdown(wait=False)
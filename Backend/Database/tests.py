@@ -1,9 +1,66 @@
-from django.test import TestCase
+from django.test import Client, TestCase, TransactionTestCase, \
+    override_settings
 from django.contrib.auth import get_user_model
 from Database.models import Questions, Answers, UserAnswers, LoginAttempts, \
     UserRelationships, Practice, Results, SuddenDeath, \
-    Games, UserScores, get_sentinel_user
-from django.db import IntegrityError, transaction
+    Games, UserScores, Placements, LeaderboardEntries, LoginAttemptsDaily, \
+    Ratings, UserCategoryStats, UserStats, get_sentinel_user
+from Database.account_deletion import delete_users
+from Database.benchmarks import flush_buffers
+from Database.calibration import calibrate
+from Database.answer_recorder import AnswerRecorder
+from Database.answered_questions import QuestionSet, answered_questions
+from Database import authentication
+from Database.friend_graph import FriendGraph, friend_graph
+from Database.game_engine import Player, Room
+from Database.games import Standing, finish_game, finish_practice, \
+    start_game
+from Database.login_retention import DEFAULT_PARTITION, \
+    create_partitions, expire, partition_name, partitions
+from Database.login_throttle import LocalCounterStore, LoginAttemptWriter, \
+    LoginThrottle, ThrottledModelBackend
+from Database.leaderboard import Leaderboards, RankedSet
+from Database.load_generator import generate, make_plan
+from Database.matchmaking import Matchmaker
+from Database.question_pool import QuestionPool
+from Database import ratings
+from Database.sessions import purge_expired
+from Database.settings import session_engine
+from Database.streaming import StreamingASGIHandler
+from Database.user_stats import check, rebuild
+from Database.sql_metrics import QueryRecorder, SQLMetrics, fingerprint, \
+    sql_metrics
+from Database.signals import game_finished
+from Database.websocket import authenticated_user_id, \
+    websocket_application
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.contrib.auth import authenticate
+from django.contrib.sessions.models import Session
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.core.exceptions import ImproperlyConfigured, \
+    PermissionDenied
+from django.core.management import call_command
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.db import IntegrityError, OperationalError, connection, \
+    transaction
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+import asyncio
+from unittest import mock, skipUnless
+import json
+import numpy
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import weakref
 
 
 class ModelTests(TestCase):
@@ -298,3 +355,1850 @@ class ModelTests(TestCase):
 
         self.assertEqual(Games.objects.get().created_by,
                          get_sentinel_user())
+
+
+class QuestionPoolTests(TestCase):
+    """Tests to be performed on the in-memory question pool"""
+
+    def setUp(self):
+        cache.clear()
+        self.pool = QuestionPool(random.Random(1))
+
+    def add_question(self, category, difficulty='easy',
+                     question_type='multiple', answered=True):
+        question = Questions.objects.create(
+            category=category,
+            difficulty=difficulty,
+            question_type=question_type,
+            text='A %s question' % category,
+        )
+        if answered:
+            Answers.objects.create(
+                question=question,
+                correct_answer='yes',
+                incorrect_answer='no',
+                incorrect_answer2='no',
+                incorrect_answer3='no',
+            )
+
+        return question
+
+    def test_sample_filters_by_bucket(self):
+        """Test that only questions from the requested category,
+        difficulty and type are picked"""
+        history = [self.add_question('history').id for _ in range(5)]
+        self.add_question('history', difficulty='hard')
+        self.add_question('science')
+
+        picked = self.pool.sample(5, 'history', 'easy', 'multiple')
+
+        self.assertEqual(sorted(picked), history)
+
+    def test_random_category_samples_every_category(self):
+        """Test that the random category draws from every category
+        without repeating a question"""
+        ids = {self.add_question(category).id
+               for category in ('history', 'science', 'art')}
+
+        picked = self.pool.sample(3, 'random')
+
+        self.assertEqual(set(picked), ids)
+        self.assertEqual(self.pool.count(), 3)
+
+    def test_unanswered_questions_are_skipped(self):
+        """Test that a question without an answer is never picked"""
+        self.add_question('history', answered=False)
+
+        self.assertEqual(self.pool.count('history'), 0)
+
+        with self.assertRaises(ValueError):
+            self.pool.sample(1, 'history')
+
+    def test_saving_invalidates_pool(self):
+        """Test that saving and deleting questions is picked up by a
+        pool that was already built"""
+        first = self.add_question('history')
+        self.assertEqual(self.pool.count('history'), 1)
+
+        second = self.add_question('history')
+        self.assertEqual(self.pool.count('history'), 2)
+
+        Answers.objects.filter(question=first).delete()
+        self.assertEqual(self.pool.sample(1, 'history'), [second.id])
+
+
+class ImportQuestionsTests(TestCase):
+    """Tests to be performed on the import_questions command"""
+
+    records = [
+        {
+            'category': 'Science &amp; Nature',
+            'type': 'multiple',
+            'difficulty': 'easy',
+            'question': 'What is H&#039;2&#039;O?',
+            'correct_answer': 'Water',
+            'incorrect_answers': ['Salt', 'Iron', 'Gold'],
+        },
+        {
+            'category': 'Entertainment: Books',
+            'type': 'boolean',
+            'difficulty': 'hard',
+            'question': 'Is Dune a novel?',
+            'correct_answer': 'True',
+            'incorrect_answers': ['False'],
+        },
+    ]
+
+    def import_file(self, suffix, content, **options):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as stream:
+            stream.write(content)
+        self.addCleanup(os.remove, path)
+
+        call_command('import_questions', path, stdout=StringIO(), **options)
+
+    def test_import_json_envelope(self):
+        """Test that the Open Trivia DB JSON shape is imported even when
+        records straddle read chunks"""
+        content = json.dumps({'response_code': 0, 'results': self.records})
+
+        with mock.patch('Database.management.commands.import_questions.'
+                        'READ_CHUNK_SIZE', 16):
+            self.import_file('.json', content)
+
+        question = Questions.objects.get(question_type='multiple')
+        self.assertEqual(question.category, 'science')
+        self.assertEqual(question.text, "What is H'2'O?")
+        self.assertEqual(question.answers_set.get().incorrect_answer3,
+                         'Gold')
+
+        boolean = Answers.objects.get(question__question_type='boolean')
+        self.assertEqual(boolean.question.category, 'entertainment')
+        self.assertEqual(boolean.incorrect_answer, 'False')
+        self.assertEqual(boolean.incorrect_answer2, '')
+
+    def test_import_skips_duplicates(self):
+        """Test that questions already imported, or repeated in the
+        same file, are only stored once"""
+        content = '\n'.join(json.dumps(record)
+                            for record in self.records * 2)
+
+        self.import_file('.ndjson', content, batch_size=1)
+        self.import_file('.ndjson', content)
+
+        self.assertEqual(Questions.objects.count(), 2)
+        self.assertEqual(Answers.objects.count(), 2)
+
+    def test_import_csv(self):
+        """Test that a CSV file with either list format is imported and
+        invalid rows are rejected"""
+        content = (
+            'category,type,difficulty,question,correct_answer,'
+            'incorrect_answers\n'
+            'History,multiple,medium,Who?,Me,"[""You"", ""Them"", ""Us""]"\n'
+            'Art,boolean,easy,Is paint wet?,True,False\n'
+            'Art,boolean,easy,,True,False\n'
+        )
+
+        self.import_file('.csv', content)
+
+        self.assertEqual(Questions.objects.count(), 2)
+        self.assertEqual(
+            Answers.objects.get(question__category='history')
+            .incorrect_answer2, 'Them')
+
+    def test_import_rejects_values_too_long(self):
+        """Test that a record with any value too long for its column is
+        rejected instead of failing its batch"""
+        record = self.records[0]
+        too_long = [
+            dict(record, question='Q' * 255),
+            dict(record, correct_answer='A' * 255),
+            dict(record, incorrect_answers=['Salt', 'I' * 255]),
+            dict(record, difficulty='very hard'),
+            dict(record, type='t' * 21),
+        ]
+        content = '\n'.join(json.dumps(record)
+                            for record in too_long + self.records)
+
+        self.import_file('.ndjson', content, batch_size=2)
+
+        self.assertEqual(
+            sorted(Questions.objects.values_list('text', flat=True)),
+            ['Is Dune a novel?', "What is H'2'O?"])
+        self.assertEqual(
+            Answers.objects.get(question__question_type='multiple')
+            .incorrect_answer2, 'Iron')
+
+
+class GameEngineTests(TestCase):
+    """Tests to be performed on the real-time game engine"""
+
+    def setUp(self):
+        cache.clear()
+        self.users = [get_user_model().objects.create_user(
+            username='Player%d' % number,
+            email='player%d@gmail.com' % number,
+        ) for number in range(3)]
+        self.game = Games.objects.create(
+            number_of_questions=2,
+            number_of_players=2,
+            category='random',
+            created_by=self.users[0],
+        )
+
+    def test_room_scores_rounds(self):
+        """Test that a room times each round, scores correct answers
+        and finishes with the players ordered by score"""
+        questions = [{'id': number, 'category': 'history', 'text': 'Q',
+                      'answers': ['a', 'b'], 'correct': 'a'}
+                     for number in range(2)]
+        finished = []
+
+        async def play():
+            async def on_finish(standings):
+                finished.extend(standings)
+
+            room = Room(1, questions, 2, on_finish, round_seconds=0.05)
+
+            async def quick(message):
+                if message['type'] == 'question':
+                    room.answer(1, message['round'], 'a')
+
+            async def silent(message):
+                pass
+
+            await room.join(1, quick)
+            await room.join(2, silent)
+            await asyncio.wait_for(room.finished.wait(), 5)
+
+        asyncio.run(play())
+
+        self.assertEqual([standing.user_id for standing in finished], [1, 2])
+        self.assertEqual(finished[0].base_score, 2)
+        self.assertGreater(finished[0].bonus_score, 0)
+        self.assertEqual(finished[1].total_score, 0)
+
+    def test_room_ignores_late_and_repeated_answers(self):
+        """Test that only the first answer to the current round counts"""
+        async def check():
+            async def ignore(*args):
+                pass
+
+            room = Room(1, [], 2, ignore)
+            room.players = {1: Player(1, ignore), 2: Player(2, ignore)}
+            room._round = 0
+
+            self.assertTrue(room.answer(1, 0, 'a'))
+            self.assertFalse(room.answer(1, 0, 'b'))
+            self.assertFalse(room.answer(2, 1, 'a'))
+            self.assertFalse(room.answer(3, 0, 'a'))
+
+        asyncio.run(check())
+
+    def test_failed_send_drops_only_that_player(self):
+        """Test that a player whose socket fails is disconnected and the
+        game still finishes for everyone"""
+        questions = [{'id': 1, 'category': 'history', 'text': 'Q',
+                      'answers': ['a', 'b'], 'correct': 'a'}]
+        finished = []
+
+        async def play():
+            async def on_finish(standings):
+                finished.extend(standings)
+
+            room = Room(1, questions, 2, on_finish, round_seconds=5)
+
+            async def quick(message):
+                if message['type'] == 'question':
+                    room.answer(1, message['round'], 'a')
+
+            async def broken(message):
+                if message['type'] == 'question':
+                    raise ConnectionResetError
+
+            await room.join(1, quick)
+            with self.assertLogs('Database.game_engine', 'WARNING'):
+                await room.join(2, broken)
+                await asyncio.wait_for(room.finished.wait(), 1)
+            self.assertFalse(room.players[2].connected)
+
+        asyncio.run(play())
+
+        self.assertEqual([standing.user_id for standing in finished], [1, 2])
+
+    def test_failed_room_closes(self):
+        """Test that a room whose game fails still finishes, closes and
+        logs the error"""
+        closed = []
+
+        async def play():
+            async def on_finish(standings):
+                raise RuntimeError('Could not record the scores')
+
+            async def silent(message):
+                pass
+
+            room = Room(1, [], 1, on_finish, on_close=lambda: closed.append(1))
+            with self.assertLogs('Database.game_engine', 'ERROR'):
+                await room.join(1, silent)
+                await asyncio.wait_for(room.finished.wait(), 5)
+
+        asyncio.run(play())
+
+        self.assertEqual(closed, [1])
+
+    def test_solo_game_finishes_once(self):
+        """Test that a game of any size can only be finished, and
+        started, once"""
+        leaderboard = mock.patch('Database.leaderboard.leaderboards')
+        leaderboard.start()
+        self.addCleanup(leaderboard.stop)
+        self.game.number_of_players = 1
+        self.game.save()
+        self.assertIsNone(finish_game(self.game, [Standing(self.users[0].id)]))
+
+        self.game.refresh_from_db()
+        self.assertIsNotNone(self.game.finished_at)
+        with self.assertRaises(ValueError):
+            finish_game(self.game, [Standing(self.users[0].id)])
+        with self.assertRaises(ValueError):
+            start_game(self.game.id)
+        self.assertEqual(UserScores.objects.filter(
+            user=self.users[0]).count(), 1)
+
+    def test_start_game_loads_questions(self):
+        """Test that a game starts with shuffled questions from the pool"""
+        for number in range(3):
+            question = Questions.objects.create(
+                category='history', difficulty='easy',
+                question_type='multiple', text='Question %d' % number)
+            Answers.objects.create(
+                question=question, correct_answer='right',
+                incorrect_answer='x', incorrect_answer2='y',
+                incorrect_answer3='z')
+
+        game, questions = start_game(self.game.id)
+
+        self.assertEqual(game, self.game)
+        self.assertEqual(len(questions), 2)
+        self.assertEqual(sorted(questions[0]['answers']),
+                         ['right', 'x', 'y', 'z'])
+
+    def test_finish_game_records_results(self):
+        """Test that finishing a game stores scores and the finishing
+        order and announces it"""
+        received = []
+
+        def receiver(sender, **kwargs):
+            received.append(kwargs)
+
+        game_finished.connect(receiver)
+        self.addCleanup(game_finished.disconnect, receiver)
+
+        standings = [
+            Standing(self.users[2].id, 3, Decimal('1.500'), 12.5),
+            Standing(self.users[1].id, 1, Decimal('0.250'), 30),
+        ]
+        result = finish_game(self.game, standings)
+
+        self.assertEqual(result.winner, self.users[2])
+        self.assertEqual(result.second_place, self.users[1])
+        self.assertEqual(Games.objects.get().winner, result)
+        self.assertEqual(
+            UserScores.objects.get(user=self.users[2]).total_score,
+            Decimal('4.500'))
+        self.assertEqual(received[0]['standings'], standings)
+
+    def test_websocket_rejects_anonymous_users(self):
+        """Test that a connection without a logged in session or to an
+        unknown path is closed"""
+        def connect(path):
+            sent = []
+
+            async def receive():
+                return {'type': 'websocket.connect'}
+
+            async def send(message):
+                sent.append(message)
+
+            asyncio.run(websocket_application(
+                {'type': 'websocket', 'path': path, 'headers': []},
+                receive, send))
+
+            return sent
+
+        self.assertEqual(connect('/ws/games/1/')[0]['code'], 4401)
+        self.assertEqual(connect('/ws/other/')[0]['code'], 4404)
+
+
+class AnswerRecorderTests(TestCase):
+    """Tests to be performed on the write-behind answer recorder"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='Answerer', email='answerer@gmail.com')
+        self.questions = [Questions.objects.create(
+            category='history', difficulty='easy', question_type='multiple',
+            text='Question %d' % number) for number in range(2)]
+        # The recorders here hold answers to rows the test rolls back, so
+        # they are kept out of the flush at exit
+        recorders = mock.patch('Database.answer_recorder._recorders',
+                               weakref.WeakSet())
+        recorders.start()
+        self.addCleanup(recorders.stop)
+
+    def test_flush_upserts_counts(self):
+        """Test that buffered answers are added to existing rows and new
+        rows are created in one flush"""
+        UserAnswers.objects.create(user=self.user,
+                                   question=self.questions[0],
+                                   result='correct', count_correct=2)
+        recorder = AnswerRecorder()
+        recorder.record(self.user.id, self.questions[0].id, False)
+        recorder.record(self.user.id, self.questions[0].id, True)
+        recorder.record(self.user.id, self.questions[1].id, False)
+
+        # The answers and their categories' totals in one transaction
+        with self.assertNumQueries(5):
+            self.assertEqual(recorder.flush(), 3)
+
+        first = UserAnswers.objects.get(question=self.questions[0])
+        self.assertEqual((first.result, first.count_correct,
+                          first.count_incorrect), ('correct', 3, 1))
+        second = UserAnswers.objects.get(question=self.questions[1])
+        self.assertEqual((second.result, second.count_correct,
+                          second.count_incorrect), ('incorrect', 0, 1))
+        self.assertEqual(len(recorder), 0)
+        self.assertEqual(recorder.flush(), 0)
+
+    def test_should_flush_thresholds(self):
+        """Test that a flush is due once enough answers are buffered or
+        the oldest has waited long enough"""
+        now = [0.0]
+        recorder = AnswerRecorder(max_events=3, max_age=5,
+                                  clock=lambda: now[0])
+        self.assertFalse(recorder.should_flush())
+
+        recorder.record(self.user.id, self.questions[0].id, True)
+        now[0] = 4
+        self.assertFalse(recorder.should_flush())
+        now[0] = 5
+        self.assertTrue(recorder.should_flush())
+
+        recorder.flush()
+        for _ in range(3):
+            recorder.record(self.user.id, self.questions[1].id, True)
+        self.assertTrue(recorder.should_flush())
+
+    def test_failed_flush_keeps_answers(self):
+        """Test that answers are kept for the next flush when writing
+        them fails"""
+        recorder = AnswerRecorder()
+        recorder.record(self.user.id, self.questions[0].id, True)
+
+        with mock.patch('Database.answer_recorder.upsert_answers',
+                        side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                recorder.flush()
+
+        self.assertEqual(len(recorder), 1)
+        recorder.flush()
+        self.assertEqual(UserAnswers.objects.get().count_correct, 1)
+
+    def test_rolled_back_game_keeps_answers(self):
+        """Test that answers flushed by a game whose transaction rolls
+        back afterwards are buffered again"""
+        game = Games.objects.create(number_of_questions=1,
+                                    number_of_players=1, category='history',
+                                    created_by=self.user)
+        recorder = AnswerRecorder()
+        recorder.record(self.user.id, self.questions[0].id, True)
+
+        def fail(sender, **kwargs):
+            raise RuntimeError('Receiver failed')
+
+        game_finished.connect(fail)
+        self.addCleanup(game_finished.disconnect, fail)
+        with mock.patch('Database.leaderboard.leaderboards'), \
+                self.assertRaises(RuntimeError):
+            finish_game(game, [Standing(self.user.id)], recorder)
+
+        self.assertFalse(UserAnswers.objects.exists())
+        self.assertEqual(len(recorder), 1)
+        self.assertEqual(recorder.flush(), 1)
+        self.assertEqual(UserAnswers.objects.get().count_correct, 1)
+        self.assertEqual(len(recorder), 0)
+
+    def test_flushing_keeps_answers_of_rolled_back_block(self):
+        """Test that answers written inside a transaction the caller
+        rolls back are buffered again, and written by the next flush"""
+        recorder = AnswerRecorder()
+        recorder.record(self.user.id, self.questions[0].id, True)
+
+        with self.assertRaises(RuntimeError):
+            with recorder.flushing() as write, transaction.atomic():
+                self.assertEqual(write(), 1)
+                self.assertEqual(len(recorder), 0)
+                raise RuntimeError('Rolled back')
+
+        self.assertFalse(UserAnswers.objects.exists())
+        recorder.record(self.user.id, self.questions[0].id, False)
+        self.assertEqual(len(recorder), 2)
+        self.assertEqual(recorder.flush(), 2)
+        answer = UserAnswers.objects.get()
+        self.assertEqual((answer.count_correct, answer.count_incorrect),
+                         (1, 1))
+
+
+class PlacementsTests(TestCase):
+    """Tests to be performed on the normalised placements table"""
+
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(
+            username='Placed%d' % number,
+            email='placed%d@gmail.com' % number,
+        ) for number in range(3)]
+
+    def test_placements_follow_results(self):
+        """Test that saving a result creates and updates its placements"""
+        result = Results.objects.create(winner=self.users[0],
+                                        second_place=self.users[1],
+                                        third_place=self.users[2])
+
+        self.assertEqual(
+            list(result.placements.order_by('position')
+                 .values_list('user', 'position')),
+            [(self.users[0].id, 1), (self.users[1].id, 2),
+             (self.users[2].id, 3)])
+
+        result.third_place = None
+        result.save()
+
+        self.assertEqual(result.placements.count(), 2)
+
+    def test_placement_queries(self):
+        """Test the per-user history, win count and average placement"""
+        first = Results.objects.create(winner=self.users[0],
+                                       second_place=self.users[1])
+        second = Results.objects.create(winner=self.users[1],
+                                        second_place=self.users[2],
+                                        third_place=self.users[0])
+
+        self.assertEqual(
+            [placement.result_id for placement in
+             Placements.objects.history(self.users[0])],
+            [second.id, first.id])
+        self.assertEqual(Placements.objects.win_count(self.users[0]), 1)
+        self.assertEqual(Placements.objects.win_count(self.users[2]), 0)
+        self.assertEqual(
+            Placements.objects.average_position(self.users[0]), 2)
+
+    def test_deleted_user_placements_use_sentinel(self):
+        """Test that a deleted user's placements move to the sentinel
+        user along with the result"""
+        Results.objects.create(winner=self.users[0],
+                               second_place=self.users[1])
+
+        self.users[0].delete()
+
+        self.assertEqual(Placements.objects.get(position=1).user,
+                         get_sentinel_user())
+
+
+class LeaderboardCommitTests(TransactionTestCase):
+    """Tests to be performed on counting finished games on the boards"""
+
+    def test_only_committed_games_counted(self):
+        """Test that a game is added to the boards once its transaction
+        commits, and never if it rolls back"""
+        user = get_user_model().objects.create_user(
+            username='Committed', email='committed@gmail.com')
+        games = [Games.objects.create(
+            number_of_questions=1, number_of_players=1, category='art',
+            created_by=user) for _ in range(2)]
+
+        def fail(sender, **kwargs):
+            raise RuntimeError('Receiver failed')
+
+        with mock.patch('Database.leaderboard.leaderboards') as boards:
+            finish_game(games[0], [Standing(user.id)])
+            game_finished.connect(fail)
+            self.addCleanup(game_finished.disconnect, fail)
+            with self.assertRaises(RuntimeError):
+                finish_game(games[1], [Standing(user.id)])
+
+        boards.record_game.assert_called_once_with('art', [Standing(user.id)])
+
+
+class LeaderboardTests(TestCase):
+    """Tests to be performed on the incremental leaderboards"""
+
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(
+            username='Ranked%d' % number,
+            email='ranked%d@gmail.com' % number,
+        ) for number in range(3)]
+        self.day = date(2020, 7, 16)
+        self.now = [0]
+
+    def make_leaderboards(self):
+        return Leaderboards(snapshot_seconds=60, clock=lambda: self.now[0],
+                            today=lambda: self.day)
+
+    def test_ranked_set_matches_sorted_list(self):
+        """Test that ranks and slices agree with a sorted list through
+        random adds and removes"""
+        rng = random.Random(3)
+        ranked = RankedSet(rng)
+        expected = []
+        for _ in range(2000):
+            key = rng.randrange(500)
+            if key in expected:
+                ranked.remove(key)
+                expected.remove(key)
+            else:
+                ranked.add(key)
+                expected.append(key)
+        expected.sort()
+
+        self.assertEqual(len(ranked), len(expected))
+        self.assertEqual(ranked.slice(0, len(expected)), expected)
+        self.assertEqual(ranked.slice(10, 5), expected[10:15])
+        for position, key in enumerate(expected, 1):
+            self.assertEqual(ranked.rank(key), position)
+        self.assertIsNone(ranked.rank(-1))
+        self.assertEqual(ranked.bisect(-1), 0)
+        self.assertEqual(ranked.bisect(expected[7]), 7)
+        self.assertEqual(ranked.bisect(expected[-1] + 1), len(expected))
+
+        loaded = RankedSet(rng)
+        loaded.extend_sorted(expected)
+        loaded.add(-1)
+        loaded.remove(expected[3])
+        expected = [-1] + expected[:3] + expected[4:]
+        self.assertEqual(loaded.slice(0, len(expected)), expected)
+        for position, key in enumerate(expected, 1):
+            self.assertEqual(loaded.rank(key), position)
+
+    def test_record_game_ranks_players(self):
+        """Test that finished games update the category and overall
+        boards for every window"""
+        boards = self.make_leaderboards()
+        boards.record_game('history', [
+            Standing(self.users[0].id, 5, Decimal('2.000')),
+            Standing(self.users[1].id, 3, Decimal('1.000')),
+        ])
+        boards.record_game('science', [
+            Standing(self.users[1].id, 6, Decimal('0.000')),
+            Standing(self.users[2].id, 1, Decimal('0.000')),
+        ])
+
+        self.assertEqual(boards.top(), [
+            (1, self.users[1].id, 10.0, 1),
+            (2, self.users[0].id, 7.0, 1),
+            (3, self.users[2].id, 1.0, 0),
+        ])
+        self.assertEqual(boards.rank(self.users[0].id, 'history', 'daily'),
+                         1)
+        self.assertIsNone(boards.rank(self.users[2].id, 'history'))
+
+    def test_snapshot_is_shared_between_processes(self):
+        """Test that scores persisted by one set of boards are picked up
+        by another on its next sync"""
+        first = self.make_leaderboards()
+        second = self.make_leaderboards()
+        second.top()
+
+        first.record_game('art', [
+            Standing(self.users[0].id, 4, Decimal('0.500')),
+            Standing(self.users[1].id, 2, Decimal('0.000')),
+        ])
+        self.now[0] = 61
+        first.record_game('art', [
+            Standing(self.users[1].id, 9, Decimal('0.000')),
+            Standing(self.users[0].id, 0, Decimal('0.000')),
+        ])
+
+        entry = LeaderboardEntries.objects.get(
+            user=self.users[1], category='all', window='all-time')
+        self.assertEqual((entry.score, entry.wins), (Decimal('11.000'), 1))
+
+        self.assertEqual(second.rank(self.users[1].id, 'art', 'weekly'), 1)
+        self.assertEqual(second.top('art', 'weekly', 2), [
+            (1, self.users[1].id, 11.0, 1),
+            (2, self.users[0].id, 4.5, 1),
+        ])
+
+        self.day = date(2020, 7, 17)
+        self.assertEqual(second.top('art', 'daily'), [])
+
+    def test_benchmark_flushes_scores_before_teardown(self):
+        """Test that scores a benchmark buffered are written while its
+        database still exists, leaving nothing for the exit hook"""
+        boards = self.make_leaderboards()
+        boards.record_game('art', [Standing(self.users[0].id, 3)])
+
+        with mock.patch('Database.benchmarks.leaderboards', boards):
+            flush_buffers()
+
+        self.assertEqual(LeaderboardEntries.objects.filter(
+            user=self.users[0]).count(), 6)
+        with self.assertNumQueries(0):
+            boards.persist()
+
+
+class AccountDeletionTests(TestCase):
+    """Tests to be performed on the bulk account deletion service"""
+
+    def make_users(self, number, prefix):
+        users = [get_user_model().objects.create_user(
+            username='%s%d' % (prefix, count),
+            email='%s%d@gmail.com' % (prefix, count),
+        ) for count in range(number)]
+
+        question = Questions.objects.create(
+            category='history', difficulty='easy', question_type='multiple',
+            text='Question for %s' % prefix)
+        for user in users:
+            Results.objects.create(winner=user, second_place=users[0])
+            Games.objects.create(number_of_questions=1, number_of_players=2,
+                                 category='history', created_by=user)
+            UserAnswers.objects.create(user=user, question=question,
+                                       result='correct')
+            LoginAttempts.objects.create(user=user, login_status='failed')
+            Practice.objects.create(user=user, score=1,
+                                    time_taken_seconds='10')
+
+        return users
+
+    def test_delete_users_reassigns_and_cascades(self):
+        """Test that history moves to the sentinel user and everything
+        else owned by the users is deleted"""
+        users = self.make_users(3, 'Leaving')
+        sentinel = get_sentinel_user()
+
+        counts = delete_users([user.id for user in users] + [sentinel.id],
+                              chunk_size=2, batch_size=1)
+
+        self.assertEqual(counts['users'], 3)
+        self.assertFalse(get_user_model().objects.filter(
+            username__startswith='Leaving').exists())
+        self.assertTrue(get_user_model().objects.filter(
+            pk=sentinel.pk).exists())
+        self.assertEqual(Results.objects.filter(winner=sentinel).count(), 3)
+        self.assertEqual(
+            Results.objects.filter(second_place=sentinel).count(), 3)
+        self.assertEqual(Placements.objects.filter(user=sentinel).count(),
+                         6)
+        self.assertEqual(Games.objects.filter(created_by=sentinel).count(),
+                         3)
+        for model in (UserAnswers, LoginAttempts, Practice):
+            self.assertFalse(model.objects.exists())
+
+    def test_query_count_does_not_grow_with_users(self):
+        """Test that a chunk of users costs the same number of queries
+        however many users it holds"""
+        get_sentinel_user()
+        few = [user.id for user in self.make_users(2, 'Few')]
+        many = [user.id for user in self.make_users(6, 'Many')]
+
+        with CaptureQueriesContext(connection) as few_queries:
+            delete_users(few)
+        with CaptureQueriesContext(connection) as many_queries:
+            delete_users(many)
+
+        self.assertEqual(len(few_queries), len(many_queries))
+
+
+class LoginThrottleTests(TestCase):
+    """Tests to be performed on login throttling"""
+
+    def setUp(self):
+        self.now = [960.0]
+        self.writer = LoginAttemptWriter(background=False)
+        self.throttle = LoginThrottle(
+            LocalCounterStore(clock=lambda: self.now[0]), writer=self.writer,
+            window=60, user_failures=3, ip_failures=5,
+            clock=lambda: self.now[0])
+        self.user = get_user_model().objects.create_user(
+            username='Guarded', email='guarded@gmail.com',
+            password='password123')
+
+    def test_account_locked_after_failures(self):
+        """Test that an account is locked once it reaches its failure
+        limit and unlocks as the window slides past"""
+        for _ in range(3):
+            self.assertFalse(self.throttle.is_locked('Guarded@gmail.com'))
+            self.throttle.record_failure('guarded@gmail.com')
+
+        self.assertTrue(self.throttle.is_locked('guarded@gmail.com'))
+
+        self.now[0] += 60
+        self.assertTrue(self.throttle.is_locked('guarded@gmail.com'))
+        self.now[0] += 30
+        self.assertFalse(self.throttle.is_locked('guarded@gmail.com'))
+
+    def test_ip_locked_across_accounts(self):
+        """Test that one address failing against many accounts is locked
+        and a success only clears the account's failures"""
+        for number in range(5):
+            self.throttle.record_failure('user%d' % number, '10.0.0.1')
+        self.throttle.record_success('user4', '10.0.0.1')
+
+        self.assertTrue(self.throttle.is_locked('new', '10.0.0.1'))
+        self.assertFalse(self.throttle.is_locked('new', '10.0.0.2'))
+
+    def test_attempts_written_in_batches(self):
+        """Test that audit rows are queued and written by flush"""
+        self.throttle.record_failure('guarded@gmail.com', None, self.user.id)
+        self.throttle.record_success('guarded@gmail.com', None, self.user.id)
+        self.throttle.record_failure('unknown@gmail.com')
+
+        self.assertFalse(LoginAttempts.objects.exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.writer.flush(), 2)
+        self.assertEqual(
+            sorted(LoginAttempts.objects.values_list('login_status',
+                                                     flat=True)),
+            ['failed', 'success'])
+
+    def test_bad_attempt_dropped(self):
+        """Test that a batch that keeps failing is written row by row,
+        dropping only the rows that fail"""
+        bulk_create = LoginAttempts.objects.bulk_create
+
+        def refuse_deleted(attempts):
+            if any(attempt.user_id == self.user.id + 1
+                   for attempt in attempts):
+                raise IntegrityError('The user no longer exists')
+            return bulk_create(attempts)
+
+        self.writer.add(self.user.id, 'failed')
+        self.writer.add(self.user.id + 1, 'failed')
+        self.writer.add(self.user.id, 'success')
+        with mock.patch.object(LoginAttempts.objects, 'bulk_create',
+                               side_effect=refuse_deleted), \
+                self.assertLogs('Database.login_throttle', 'ERROR'):
+            self.assertEqual(self.writer.flush(), 2)
+
+        self.assertEqual(self.writer.flush(), 0)
+        self.assertEqual(LoginAttempts.objects.filter(
+            user=self.user).count(), 2)
+
+    def test_lost_connection_keeps_attempts(self):
+        """Test that attempts are queued again when the connection fails,
+        and the writer's thread replaces broken connections"""
+        self.writer.add(self.user.id, 'failed')
+        with mock.patch.object(LoginAttempts.objects, 'bulk_create',
+                               side_effect=OperationalError('Restarted')):
+            with self.assertRaises(OperationalError):
+                self.writer.flush()
+        self.assertEqual(self.writer.flush(), 1)
+
+        class Stop(Exception):
+            pass
+
+        with mock.patch('Database.login_throttle.time.sleep',
+                        side_effect=[None, Stop]), \
+                mock.patch('Database.login_throttle.close_old_connections') \
+                as close:
+            with self.assertRaises(Stop):
+                self.writer._run()
+        close.assert_called_once_with()
+
+    def test_backend_refuses_locked_accounts(self):
+        """Test that authenticate stops accepting a correct password once
+        the account is locked out"""
+        with mock.patch('Database.login_throttle.login_throttle',
+                        self.throttle):
+            self.assertEqual(authenticate(email='guarded@gmail.com',
+                                          password='password123'),
+                             self.user)
+            for _ in range(3):
+                self.assertIsNone(authenticate(email='guarded@gmail.com',
+                                               password='wrong'))
+
+            with self.assertRaises(PermissionDenied):
+                ThrottledModelBackend().authenticate(
+                    None, email='guarded@gmail.com', password='password123')
+            self.assertIsNone(authenticate(email='guarded@gmail.com',
+                                           password='password123'))
+
+        self.assertEqual(self.writer.flush(), 4)
+
+
+class LoginRetentionTests(TestCase):
+    """Tests to be performed on LoginAttempts retention"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='Retained', email='retained@gmail.com')
+
+    def attempt(self, when, status):
+        LoginAttempts.objects.create(user=self.user, login_status=status,
+                                     last_login=when)
+
+    def test_expire_compacts_old_months(self):
+        """Test that months past the retention period are rolled up into
+        daily counts and their detail rows removed"""
+        self.attempt(datetime(2020, 3, 2, 9, tzinfo=dt_timezone.utc),
+                     'failed')
+        self.attempt(datetime(2020, 3, 2, 10, tzinfo=dt_timezone.utc),
+                     'success')
+        self.attempt(datetime(2020, 4, 9, tzinfo=dt_timezone.utc), 'failed')
+        self.attempt(datetime(2020, 7, 1, tzinfo=dt_timezone.utc), 'success')
+
+        expired = expire(2, today=date(2020, 7, 16))
+
+        self.assertEqual(expired, [date(2020, 3, 1), date(2020, 4, 1)])
+        self.assertEqual(LoginAttempts.objects.count(), 1)
+        self.assertEqual(
+            list(LoginAttemptsDaily.objects.order_by('day').values_list(
+                'day', 'successes', 'failures')),
+            [(date(2020, 3, 2), 1, 1), (date(2020, 4, 9), 0, 1)])
+
+    def test_compaction_adds_to_existing_counts(self):
+        """Test that compacting a day again adds to its counts"""
+        when = datetime(2020, 1, 5, tzinfo=dt_timezone.utc)
+        self.attempt(when, 'failed')
+        expire(1, today=date(2020, 7, 1))
+        self.attempt(when, 'failed')
+        expire(1, today=date(2020, 7, 1))
+
+        self.assertEqual(LoginAttemptsDaily.objects.get().failures, 2)
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'LoginAttempts is only partitioned on PostgreSQL')
+    def test_partition_takes_rows_from_default(self):
+        """Test that a month's partition is created after rows for it fell
+        into the default partition, and takes them over"""
+        when = datetime(2031, 2, 3, tzinfo=dt_timezone.utc)
+        self.attempt(when, 'failed')
+        self.assertNotIn(date(2031, 2, 1), partitions())
+
+        created = create_partitions(0, today=date(2031, 2, 10))
+
+        self.assertEqual(created, [date(2031, 2, 1)])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM %s' % (
+                connection.ops.quote_name(DEFAULT_PARTITION)))
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute('SELECT count(*) FROM %s' % (
+                connection.ops.quote_name(partition_name(date(2031, 2, 1)))))
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(LoginAttempts.objects.get().last_login, when)
+
+
+class FriendGraphTests(TestCase):
+    """Tests to be performed on the friend graph"""
+
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            get_user_model().objects.create_user(
+                username='Friend%d' % number,
+                email='friend%d@gmail.com' % number)
+            for number in range(5)
+        ]
+
+    def relate(self, first, second, status):
+        return UserRelationships.objects.create(
+            user_first=self.users[first], user_second=self.users[second],
+            relationship_status=status)
+
+    def test_pairs_are_stored_in_canonical_order(self):
+        """Test that the lower user id is stored first and the user who
+        made the request is kept in action_by"""
+        relationship = self.relate(3, 1, 'pending')
+
+        self.assertEqual(relationship.user_first, self.users[1])
+        self.assertEqual(relationship.user_second, self.users[3])
+        self.assertEqual(relationship.action_by, self.users[3])
+
+    def test_reversed_pair_is_rejected(self):
+        """Test that a pair can only be stored once, in either order"""
+        self.relate(0, 1, 'pending')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.relate(1, 0, 'friends')
+
+    def test_lookups_work_in_both_directions(self):
+        """Test that friendship and blocks are seen from both users"""
+        self.relate(0, 1, 'friends')
+        self.relate(2, 0, 'blocked')
+        ids = [user.pk for user in self.users]
+
+        self.assertTrue(friend_graph.are_friends(ids[1], ids[0]))
+        self.assertTrue(friend_graph.is_blocked(ids[0], ids[2]))
+        self.assertTrue(friend_graph.is_blocked(ids[2], ids[0]))
+        self.assertFalse(friend_graph.is_blocked(ids[0], ids[1]))
+        with self.assertNumQueries(0):
+            friend_graph.are_friends(ids[0], ids[1])
+
+    def test_mutual_friends_and_suggestions(self):
+        """Test that friends of friends are suggested by how many friends
+        they share, leaving out anyone already related"""
+        self.relate(0, 1, 'friends')
+        self.relate(0, 2, 'friends')
+        self.relate(1, 3, 'friends')
+        self.relate(2, 3, 'friends')
+        self.relate(1, 4, 'friends')
+        ids = [user.pk for user in self.users]
+
+        self.assertEqual(friend_graph.mutual_friends(ids[0], ids[3]),
+                         {ids[1], ids[2]})
+        self.assertEqual(friend_graph.suggestions(ids[0]),
+                         [(ids[3], 2), (ids[4], 1)])
+
+        self.relate(4, 0, 'pending')
+        self.assertEqual(friend_graph.suggestions(ids[0]), [(ids[3], 2)])
+
+    def test_changes_invalidate_both_users(self):
+        """Test that saving or deleting a relationship is seen by both
+        users straight away"""
+        relationship = self.relate(0, 1, 'pending')
+        ids = [user.pk for user in self.users]
+        self.assertFalse(friend_graph.are_friends(ids[1], ids[0]))
+
+        relationship.relationship_status = 'friends'
+        relationship.save()
+        self.assertTrue(friend_graph.are_friends(ids[1], ids[0]))
+
+        relationship.delete()
+        self.assertFalse(friend_graph.are_friends(ids[0], ids[1]))
+
+    def test_process_copy_follows_generation(self):
+        """Test that a process checks its own copy of an adjacency
+        without reading it from the cache until a change elsewhere bumps
+        the user's generation"""
+        relationship = self.relate(0, 1, 'friends')
+        ids = [user.pk for user in self.users]
+        graph = FriendGraph()
+        self.assertTrue(graph.are_friends(ids[0], ids[1]))
+
+        with mock.patch('Database.friend_graph.cache', wraps=cache) as \
+                shared, self.assertNumQueries(0):
+            self.assertTrue(graph.are_friends(ids[0], ids[1]))
+        self.assertEqual(shared.method_calls, [])
+
+        relationship.delete()
+        self.assertFalse(graph.are_friends(ids[0], ids[1]))
+
+    def test_suggestions_read_friends_together(self):
+        """Test that suggestions read every friend's adjacency from the
+        cache with one get_many"""
+        for first, second in ((0, 1), (0, 2), (1, 3), (2, 4)):
+            self.relate(first, second, 'friends')
+        ids = [user.pk for user in self.users]
+        expected = friend_graph.suggestions(ids[0])
+
+        with mock.patch('Database.friend_graph.cache', wraps=cache) as \
+                shared, self.assertNumQueries(0):
+            self.assertEqual(FriendGraph().suggestions(ids[0]), expected)
+        self.assertEqual(shared.get_many.call_count, 2)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class AuthenticationTests(TransactionTestCase):
+    """Tests to be performed on the asynchronous login service"""
+
+    def setUp(self):
+        self.throttle = LoginThrottle(
+            LocalCounterStore(), writer=LoginAttemptWriter(background=False),
+            window=60, user_failures=3, ip_failures=5)
+        patcher = mock.patch('Database.authentication.login_throttle',
+                             self.throttle)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = asyncio.run(authentication.create_user(
+            'async@gmail.com', 'password123', username='Async'))
+
+    def login(self, body, content_type=b'application/json'):
+        sent = []
+        events = [{'type': 'http.request', 'body': body}]
+
+        async def receive():
+            return events.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(authentication.login_application(
+            {'type': 'http', 'method': 'POST', 'path': '/auth/login/',
+             'client': ('10.0.0.1', 1234),
+             'headers': [(b'content-type', content_type)]},
+            receive, send))
+
+        return sent[0]['status'], dict(sent[0]['headers']), \
+            json.loads(sent[1]['body'])
+
+    def test_create_user_hashes_password(self):
+        """Test that users created asynchronously can log in"""
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+        self.assertEqual(
+            asyncio.run(authentication.authenticate('async@gmail.com',
+                                                    'password123')),
+            self.user)
+        self.assertIsNone(asyncio.run(authentication.authenticate(
+            'async@gmail.com', 'wrong')))
+        self.assertIsNone(asyncio.run(authentication.authenticate(
+            'missing@gmail.com', 'password123')))
+        self.assertEqual(self.throttle.writer.flush(), 2)
+
+    def test_password_rehashed_when_cost_changes(self):
+        """Test that logging in upgrades a hash made with an out of date
+        iteration count"""
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            asyncio.run(authentication.authenticate('async@gmail.com',
+                                                    'password123'))
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(self.user.check_password('password123'))
+
+    def test_login_starts_session(self):
+        """Test that a successful login sets a session cookie the
+        WebSockets accept"""
+        status, headers, message = self.login(
+            b'{"email": "async@gmail.com", "password": "password123"}')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(message['id'], self.user.pk)
+        cookie = headers[b'set-cookie'].split(b';')[0]
+        self.assertEqual(
+            authenticated_user_id({'headers': [(b'cookie', cookie)]}),
+            self.user.pk)
+
+    def test_login_rejections(self):
+        """Test that bad requests, wrong passwords and locked accounts are
+        refused"""
+        self.assertEqual(self.login(b'{}')[0], 400)
+        self.assertEqual(self.login(b'{}', b'text/plain')[0], 415)
+        wrong = b'{"email": "async@gmail.com", "password": "wrong"}'
+        for _ in range(3):
+            self.assertEqual(self.login(wrong)[0], 401)
+        self.assertEqual(self.login(wrong)[0], 429)
+
+
+class AnsweredQuestionsTests(TransactionTestCase):
+    """Tests to be performed on the answered question sets"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='Veteran', email='veteran@gmail.com')
+        self.questions = []
+        for number in range(5):
+            question = Questions.objects.create(
+                category='history', difficulty='easy',
+                question_type='multiple', text='Question %d' % number)
+            Answers.objects.create(
+                question=question, correct_answer='right',
+                incorrect_answer='x', incorrect_answer2='y',
+                incorrect_answer3='z')
+            self.questions.append(question.id)
+
+    def test_question_set(self):
+        """Test membership, size and union of question sets"""
+        first = QuestionSet([1, 9, 300, 2 ** 40])
+        second = QuestionSet([2, 9])
+
+        self.assertIn(300, first)
+        self.assertIn(2 ** 40, first)
+        self.assertNotIn(301, first)
+        self.assertNotIn(100000, first)
+        self.assertEqual(len(first), 4)
+        self.assertEqual(list(first | second), [1, 2, 9, 300, 2 ** 40])
+
+        first.update(range(290, 310))
+        first.add(0)
+        self.assertEqual(len(first), 24)
+        self.assertEqual(list(first), sorted(first))
+
+    def test_sample_prefers_unseen_questions(self):
+        """Test that excluded questions are only picked once every other
+        question has been"""
+        pool = QuestionPool(random.Random(3))
+        seen = QuestionSet(self.questions[:3])
+
+        self.assertEqual(sorted(pool.sample(2, exclude=seen)),
+                         self.questions[3:])
+        picked = pool.sample(4, exclude=seen)
+        self.assertEqual(len(set(picked)), 4)
+        self.assertTrue(set(self.questions[3:]) <= set(picked))
+
+    def test_flushed_answers_update_set_in_place(self):
+        """Test that answers written by a recorder are added to a loaded
+        set without reading UserAnswers again"""
+        UserAnswers.objects.create(user=self.user,
+                                   question_id=self.questions[0],
+                                   result='correct', count_correct=1)
+        self.assertIn(self.questions[0],
+                      answered_questions.get(self.user.id))
+
+        recorder = AnswerRecorder()
+        recorder.record(self.user.id, self.questions[1], True)
+        recorder.flush()
+
+        with self.assertNumQueries(0):
+            answered = answered_questions.get(self.user.id)
+        self.assertIn(self.questions[1], answered)
+        self.assertNotIn(self.questions[2], answered)
+
+    def test_game_avoids_every_players_answers(self):
+        """Test that a game starts with questions none of its players
+        has answered"""
+        other = get_user_model().objects.create_user(
+            username='Other', email='other@gmail.com')
+        for user, question_id in ((self.user, self.questions[0]),
+                                  (self.user, self.questions[1]),
+                                  (other, self.questions[2])):
+            UserAnswers.objects.create(user=user, question_id=question_id,
+                                       result='correct', count_correct=1)
+        game = Games.objects.create(number_of_questions=2,
+                                    number_of_players=2, category='history',
+                                    created_by=self.user)
+
+        _, questions = start_game(game.id, user_ids=[self.user.id, other.id])
+
+        self.assertEqual(sorted(question['id'] for question in questions),
+                         self.questions[3:])
+
+
+class CalibrationTests(TestCase):
+    """Tests to be performed on difficulty calibration"""
+
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(
+            username='Answerer%d' % number,
+            email='answerer%d@gmail.com' % number,
+        ) for number in range(4)]
+        self.questions = [Questions.objects.create(
+            category='history', difficulty='medium',
+            question_type='multiple', text='Question %d' % number,
+        ) for number in range(3)]
+
+    def answer(self, question, correct, incorrect):
+        """Spreads the counts over the users, as one row per user"""
+        for number, user in enumerate(self.users):
+            UserAnswers.objects.create(
+                user=user, question=question, result='correct',
+                count_correct=correct // 4 + (number < correct % 4),
+                count_incorrect=incorrect // 4 + (number < incorrect % 4))
+
+    def test_full_calibration(self):
+        """Test that questions with enough answers are relabelled by
+        accuracy and every answered question gets its statistics"""
+        easy, hard, few = self.questions
+        self.answer(easy, 36, 4)
+        self.answer(hard, 10, 30)
+        self.answer(few, 0, 5)
+
+        self.assertEqual(calibrate(full=True),
+                         {'calibrated': 3, 'relabelled': 2})
+
+        easy.refresh_from_db()
+        hard.refresh_from_db()
+        few.refresh_from_db()
+        self.assertEqual((easy.difficulty, easy.answer_count), ('easy', 40))
+        self.assertAlmostEqual(easy.accuracy, 0.9)
+        self.assertEqual(hard.difficulty, 'hard')
+        self.assertGreater(hard.difficulty_score, 0)
+        self.assertLess(easy.difficulty_score, 0)
+        self.assertEqual(few.difficulty, 'medium')
+        self.assertEqual(few.accuracy, 0)
+        self.assertIsNotNone(few.calibrated_at)
+
+    def test_incremental_calibration(self):
+        """Test that a later run only recalibrates questions with answers
+        written since the previous run"""
+        first, second, _ = self.questions
+        self.answer(first, 36, 4)
+        self.answer(second, 20, 20)
+        calibrate()
+        long_ago = timezone.now() - timedelta(days=1)
+        UserAnswers.objects.update(
+            last_answered=long_ago - timedelta(hours=1))
+        Questions.objects.update(calibrated_at=long_ago)
+
+        answer = UserAnswers.objects.filter(question=second).first()
+        answer.count_incorrect += 40
+        answer.save()
+
+        self.assertEqual(calibrate(), {'calibrated': 1, 'relabelled': 1})
+        second.refresh_from_db()
+        self.assertEqual((second.difficulty, second.answer_count),
+                         ('hard', 80))
+
+
+class SessionTests(TestCase):
+    """Tests to be performed on the session engines and purging expired
+    sessions"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='Sessioned', email='sessioned@gmail.com')
+
+    def session_queries(self):
+        # A new client, as the middleware picks its engine when loaded
+        client = Client()
+        client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            client.get('/api/games/')
+
+        return [query for query in queries.captured_queries
+                if 'django_session' in query['sql']]
+
+    def test_session_engines_without_queries(self):
+        """Test that signed cookie and cache sessions are read without
+        querying django_session, unlike database sessions"""
+        for engine in ('signed_cookies', 'cache'):
+            with override_settings(SESSION_ENGINE='django.contrib.sessions.'
+                                   'backends.%s' % engine):
+                self.assertEqual(self.session_queries(), [])
+                self.assertTrue(authentication.start_session(self.user))
+        self.assertEqual(Session.objects.count(), 0)
+
+        with override_settings(
+                SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            self.assertEqual(len(self.session_queries()), 1)
+
+    def test_unknown_session_store_rejected(self):
+        """Test that a SESSION_STORE other than the known ones stops the
+        settings from loading"""
+        self.assertEqual(session_engine('cached_db'),
+                         'django.contrib.sessions.backends.cached_db')
+        with self.assertRaises(ImproperlyConfigured):
+            session_engine('redis')
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db')
+    def test_purge_expired_in_batches(self):
+        """Test that every expired session is deleted, a batch at a time,
+        and live ones are kept"""
+        now = timezone.now()
+        Session.objects.bulk_create(
+            Session(session_key='session%d' % number, session_data='',
+                    expire_date=now + timedelta(days=number - 5))
+            for number in range(8))
+
+        self.assertEqual(purge_expired(batch_size=2, now=now), 5)
+        self.assertEqual(
+            sorted(Session.objects.values_list('session_key', flat=True)),
+            ['session5', 'session6', 'session7'])
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_purge_without_database_sessions(self):
+        """Test that nothing is purged when sessions aren't stored in the
+        database"""
+        stdout = StringIO()
+        call_command('purge_sessions', stdout=stdout)
+
+        self.assertIn('expires sessions itself', stdout.getvalue())
+
+
+class GameWorkerTests(TestCase):
+    """Tests to be performed on the game worker's ASGI application"""
+
+    def test_other_http_requests_not_found(self):
+        """Test that HTTP requests besides logins are answered 404
+        without reaching Django's request handler"""
+        from Database.asgi_game import application
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(application(
+            {'type': 'http', 'path': '/api/games/', 'method': 'GET'},
+            None, send))
+
+        self.assertEqual(sent[0]['status'], 404)
+        self.assertEqual(sent[1]['body'], b'Not Found')
+
+
+class SQLMetricsTests(TestCase):
+    """Tests to be performed on the sampled per-view SQL metrics"""
+
+    def setUp(self):
+        sql_metrics.reset()
+        self.questions = [Questions.objects.create(
+            category='science', difficulty='easy', question_type='multiple',
+            text='Question %d' % number) for number in range(4)]
+
+    def test_fingerprint(self):
+        """Test that literals, placeholder lists and selected columns are
+        collapsed"""
+        self.assertEqual(
+            fingerprint("SELECT a, b FROM t WHERE id IN (%s, %s, %s) "
+                        "AND name = 'it''s'\n  LIMIT 21"),
+            "SELECT ... FROM t WHERE id IN (%s, ...) AND name = ? LIMIT ?")
+        self.assertEqual(
+            fingerprint('INSERT INTO t VALUES (%s, %s), (%s, %s)'),
+            fingerprint('INSERT INTO t VALUES (%s, %s, %s), (%s, %s, %s), '
+                        '(%s, %s, %s)'))
+
+    def test_duplicate_and_slowest_statements(self):
+        """Test that a statement repeated by one request is counted as a
+        duplicate and appears among the slowest"""
+        metrics = SQLMetrics(duplicate_threshold=3, slowest=1)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for question in self.questions:
+                Questions.objects.get(pk=question.pk)
+            UserAnswers.objects.count()
+        metrics.record('questions', recorder)
+
+        exposition = metrics.exposition()
+        self.assertEqual(recorder.count, 5)
+        self.assertIn('sql_queries_per_request_bucket{view="questions",'
+                      'le="5"} 1', exposition)
+        self.assertEqual(exposition.count('sql_duplicate_queries_total{'),
+                         1)
+        self.assertIn('WHERE \\"Database_questions\\".\\"id\\" = %s '
+                      'LIMIT ?"} 4\n', exposition)
+        self.assertEqual(
+            exposition.count('sql_slowest_statement_seconds{'), 1)
+
+    @override_settings(SQL_METRICS_TOKEN='scraper')
+    def test_sampled_requests_exported_with_token(self):
+        """Test that sampled requests are exported by view to requests
+        with the token only, and unsampled ones aren't recorded"""
+        with override_settings(SQL_METRICS_SAMPLE_RATE=1):
+            client = Client()
+            client.get('/api/games/')
+            metrics = client.get('/metrics/',
+                                 HTTP_AUTHORIZATION='Bearer scraper')
+            remote = client.get('/metrics/')
+            wrong = client.get('/metrics/', HTTP_AUTHORIZATION='Bearer x')
+        with override_settings(SQL_METRICS_SAMPLE_RATE=0):
+            Client().get('/api/questions/')
+
+        self.assertEqual(metrics['Content-Type'],
+                         'text/plain; version=0.0.4')
+        text = metrics.content.decode()
+        self.assertIn('sql_sampled_requests_total{view="game-list"} 1', text)
+        self.assertIn('sql_queries_per_request_count{view="game-list"} 1',
+                      text)
+        self.assertEqual(remote.status_code, 404)
+        self.assertEqual(wrong.status_code, 404)
+        self.assertNotIn('question-list', sql_metrics.exposition())
+
+
+class LoadGeneratorTests(TestCase):
+    """Tests to be performed on the synthetic load-test data generator"""
+
+    def snapshot(self):
+        return (
+            list(get_user_model().objects.order_by('id')
+                 .values_list('id', 'username')),
+            list(Games.objects.order_by('id').values_list(
+                'id', 'category', 'number_of_players', 'winner_id')),
+            list(Placements.objects.order_by('result_id', 'position')
+                 .values_list('result_id', 'user_id', 'position')),
+            list(UserScores.objects.order_by('id').values_list(
+                'user_id', 'base_score', 'bonus_score', 'total_score')),
+            list(UserAnswers.objects.order_by('id').values_list(
+                'user_id', 'question_id', 'count_correct',
+                'count_incorrect')),
+        )
+
+    def test_consistent_rows(self):
+        """Test that every game is finished, with a result and a
+        placement and score per player, and that users have the given
+        password"""
+        written = generate(make_plan(50, 40, 5, questions=30, seed=1),
+                           chunk_size=16)
+
+        self.assertEqual(written['questions'], 30)
+        self.assertEqual(written['answers'], UserAnswers.objects.count())
+        self.assertEqual(Answers.objects.count(), 30)
+        self.assertEqual(Results.objects.count(), 40)
+        players = sum(Games.objects.values_list('number_of_players',
+                                                flat=True))
+        self.assertEqual(Placements.objects.count(), players)
+        self.assertEqual(UserScores.objects.count(), players)
+        for game in Games.objects.select_related('winner'):
+            placements = list(Placements.objects.filter(
+                result_id=game.winner_id).order_by('position'))
+            self.assertEqual(len(placements), game.number_of_players)
+            self.assertEqual(placements[0].user_id, game.winner.winner_id)
+            self.assertEqual(game.created_by_id, game.winner.winner_id)
+            self.assertEqual(game.finished_at, game.start_time)
+        self.assertTrue(get_user_model().objects.earliest('id')
+                        .check_password('password123'))
+
+    def test_deterministic(self):
+        """Test that the same seed generates the same rows"""
+        generate(make_plan(0, 0, 0, questions=20))
+        snapshots = []
+        for _ in range(2):
+            generate(make_plan(30, 25, 4, seed=5), chunk_size=7)
+            snapshots.append(self.snapshot())
+            for model in (UserAnswers, UserScores, Placements, Games,
+                          Results):
+                model.objects.all().delete()
+            get_user_model().objects.all().delete()
+
+        self.assertEqual(snapshots[0][2:], snapshots[1][2:])
+        offset = snapshots[1][0][0][0] - snapshots[0][0][0][0]
+        self.assertEqual([(id + offset, name) for id, name in
+                          snapshots[0][0]], snapshots[1][0])
+
+
+class HistoryExportTests(TransactionTestCase):
+    """Tests to be performed on exporting a user's history in parts"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='Exported', email='exported@gmail.com')
+        Practice.objects.bulk_create([
+            Practice(user=self.user, score=score, time_taken_seconds='1')
+            for score in range(5)])
+
+    def test_command_writes_parts(self):
+        """Test that the command writes each record once, however many
+        parts it is split into"""
+        output = StringIO()
+        call_command('export_history', self.user.id, chunk_size=2,
+                     stdout=output)
+
+        records = [json.loads(line)
+                   for line in output.getvalue().splitlines()]
+        self.assertEqual([record['score'] for record in records],
+                         list(range(5)))
+
+    def test_streamed_off_the_event_loop(self):
+        """Test that the ASGI handler can stream a response that queries
+        the database as it goes"""
+        def rows():
+            for practice in Practice.objects.order_by('id').iterator(
+                    chunk_size=2):
+                yield '%d\n' % practice.score
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(StreamingASGIHandler().send_response(
+            StreamingHttpResponse(rows()), send))
+
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(b''.join(message.get('body', b'')
+                                  for message in sent[1:]), b'0\n1\n2\n3\n4\n')
+        self.assertNotIn('more_body', sent[-1])
+
+    def test_stream_outlives_other_requests(self):
+        """Test that requests starting and finishing while a response
+        streams don't run on its thread or close its connection"""
+        streamed_on = []
+
+        def rows():
+            for practice in Practice.objects.order_by('id').iterator(
+                    chunk_size=1):
+                streamed_on.append(threading.get_ident())
+                yield '%d\n' % practice.score
+
+        shared = sync_to_async(threading.get_ident, thread_sensitive=True)
+        other_request = sync_to_async(
+            lambda: (request_started.send(sender=None),
+                     request_finished.send(sender=None)),
+            thread_sensitive=True)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+            await other_request()
+
+        async def stream():
+            await StreamingASGIHandler().send_response(
+                StreamingHttpResponse(rows()), send)
+            return await shared()
+
+        shared_thread = asyncio.run(stream())
+
+        self.assertEqual(b''.join(message.get('body', b'')
+                                  for message in sent[1:]), b'0\n1\n2\n3\n4\n')
+        self.assertEqual(len(set(streamed_on)), 1)
+        self.assertNotEqual(streamed_on[0], shared_thread)
+
+
+class UserStatsTests(TestCase):
+    """Tests to be performed on the running per-user statistics"""
+
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(
+            username='Stats%d' % number, email='stats%d@gmail.com' % number,
+        ) for number in range(3)]
+        self.question = Questions.objects.create(
+            category='art', difficulty='easy', question_type='multiple',
+            text='?')
+        leaderboard = mock.patch('Database.leaderboard.leaderboards')
+        leaderboard.start()
+        self.addCleanup(leaderboard.stop)
+        recorders = mock.patch('Database.answer_recorder._recorders',
+                               weakref.WeakSet())
+        recorders.start()
+        self.addCleanup(recorders.stop)
+
+    def play(self, category, standings):
+        game = Games.objects.create(
+            number_of_questions=10, number_of_players=len(standings),
+            category=category, created_by_id=standings[0])
+        recorder = AnswerRecorder()
+        recorder.record(standings[0], self.question.id, True)
+        recorder.record(standings[-1], self.question.id, False)
+        finish_game(game, [Standing(user_id) for user_id in standings],
+                    recorder)
+
+    def test_totals_kept_as_games_finish(self):
+        """Test that finished games, practice matches and answers add to
+        the totals in the transaction recording them"""
+        first, second, third = [user.id for user in self.users]
+        self.play('art', [first, second, third])
+        self.play('science', [second, first])
+        self.play('science', [first])
+        finish_practice(first, 6, 30)
+        finish_practice(first, 4, 30)
+
+        stats = UserStats.objects.get(user_id=first)
+        self.assertEqual((stats.games_played, stats.placed_games, stats.wins,
+                          stats.practice_played, stats.best_practice_score),
+                         (3, 2, 1, 2, 6))
+        self.assertEqual(stats.average_position, 1.5)
+        art = UserCategoryStats.objects.get(user_id=first, category='art')
+        self.assertEqual((art.games_played, art.wins, art.correct,
+                          art.incorrect), (1, 1, 2, 2))
+        self.assertEqual(
+            UserCategoryStats.objects.get(user_id=second,
+                                          category='science').wins, 1)
+        self.assertEqual(check(), [])
+
+    def test_rebuild_and_check(self):
+        """Test that the checker finds totals that drifted and a rebuild,
+        chunk by chunk, restores them"""
+        first, second, _ = [user.id for user in self.users]
+        self.play('art', [first, second])
+        finish_practice(second, 3, 10)
+        UserStats.objects.filter(user_id=first).update(wins=5)
+        UserCategoryStats.objects.filter(user_id=second).delete()
+
+        differences = {(user_id, category): (stored, live)
+                       for user_id, category, stored, live in check()}
+        self.assertEqual(sorted(differences),
+                         [(first, None), (second, 'art')])
+        self.assertEqual(differences[(first, None)][0]['wins'], 5)
+        self.assertEqual(differences[(first, None)][1]['wins'], 1)
+
+        self.assertEqual(rebuild(chunk_size=1), 2)
+        self.assertEqual(check(), [])
+        self.assertEqual(UserStats.objects.get(user_id=second)
+                         .best_practice_score, 3)
+
+
+class MatchmakingTests(TestCase):
+    """Tests to be performed on the matchmaking queues"""
+
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(
+            username='Queued%d' % number, email='queued%d@gmail.com' % number,
+        ) for number in range(4)]
+        self.now = 0
+        self.matchmaker = Matchmaker(
+            window=100, widen_per_second=10, max_window=300,
+            sweep_seconds=1, clock=lambda: self.now, rng=random.Random(1))
+
+    def test_close_skills_matched_when_room_fills(self):
+        """Test that a room opens, with its game, only once enough players
+        within each other's windows are queued, picking the closest"""
+        first, second, third, _ = [user.id for user in self.users]
+        self.assertIsNone(self.matchmaker.join(first, 'art', 2, 1500))
+        self.assertIsNone(self.matchmaker.join(second, 'art', 3, 1510))
+        self.assertEqual(Games.objects.count(), 0)
+
+        room = self.matchmaker.join(third, 'art', 2, 1550)
+        self.assertEqual(room.user_ids, [first, third])
+        self.assertEqual(self.matchmaker.poll(first), room)
+        self.assertEqual(len(self.matchmaker), 1)
+        game = Games.objects.get(id=room.game_id)
+        self.assertEqual((game.category, game.number_of_players,
+                          game.created_by_id), ('art', 2, first))
+
+    def test_windows_widen_while_waiting(self):
+        """Test that players too far apart are matched by a sweep once
+        their windows have widened, and never beyond the widest window"""
+        first, second, third, fourth = [user.id for user in self.users]
+        self.matchmaker.join(first, 'art', 2, 1000)
+        self.matchmaker.join(second, 'art', 2, 1250)
+        self.matchmaker.join(third, 'history', 2, 2000)
+        self.matchmaker.join(fourth, 'history', 2, 2400)
+
+        self.now = 10
+        self.assertEqual(self.matchmaker.sweep(), [])
+        self.now = 16
+        rooms = self.matchmaker.sweep()
+        self.assertEqual([room.user_ids for room in rooms],
+                         [[first, second]])
+        self.now = 1000
+        self.assertEqual(self.matchmaker.sweep(), [])
+        self.assertIsNone(self.matchmaker.poll(third))
+
+    def test_sweep_checks_only_due_players(self):
+        """Test that a sweep checks nobody until a run of players will
+        fit, and then only the players around it"""
+        first, second, third, fourth = [user.id for user in self.users]
+        for user_id, skill in ((first, 1000), (second, 1250),
+                               (third, 2000), (fourth, 2400)):
+            self.matchmaker.join(user_id, 'art', 2, skill)
+
+        with mock.patch.object(self.matchmaker, '_groups_around',
+                               wraps=self.matchmaker._groups_around) \
+                as checked:
+            self.now = 14
+            self.assertEqual(self.matchmaker.sweep(), [])
+            self.assertEqual(checked.call_count, 0)
+            self.now = 15
+            rooms = self.matchmaker.sweep()
+        self.assertEqual([room.user_ids for room in rooms],
+                         [[first, second]])
+        self.assertEqual(checked.call_count, 2)
+
+        self.matchmaker.leave(fourth)
+        self.matchmaker.join(fourth, 'art', 2, 2250)
+        self.now = 1000
+        self.assertEqual(len(self.matchmaker.sweep()), 1)
+        self.assertEqual(len(self.matchmaker), 0)
+
+    def test_leaving_and_failed_rooms(self):
+        """Test that players can leave the queue, and are put back in it
+        when their game can't be created"""
+        first, second, _, _ = [user.id for user in self.users]
+        self.matchmaker.join(first, 'art', 2)
+        self.assertTrue(self.matchmaker.leave(first))
+        self.assertFalse(self.matchmaker.leave(first))
+        with self.assertRaises(KeyError):
+            self.matchmaker.poll(first)
+        with self.assertRaises(ValueError):
+            self.matchmaker.join(first, 'art', 1)
+
+        self.matchmaker.join(first, 'art', 2)
+        with mock.patch.object(self.matchmaker, '_create_game',
+                               side_effect=IntegrityError), \
+                self.assertLogs('Database.matchmaking', 'ERROR'):
+            self.assertIsNone(self.matchmaker.join(second, 'art', 2))
+        self.assertEqual(len(self.matchmaker), 2)
+        self.now = 1
+        self.assertEqual(len(self.matchmaker.sweep()), 1)
+        self.assertEqual(Games.objects.count(), 1)
+
+
+class RatingsTests(TestCase):
+    """Tests to be performed on the Elo ratings"""
+
+    def setUp(self):
+        self.users = [get_user_model().objects.create_user(
+            username='Rated%d' % number, email='rated%d@gmail.com' % number,
+        ) for number in range(4)]
+        leaderboard = mock.patch('Database.leaderboard.leaderboards')
+        leaderboard.start()
+        self.addCleanup(leaderboard.stop)
+
+    def play(self, *user_ids):
+        game = Games.objects.create(
+            number_of_questions=10, number_of_players=len(user_ids),
+            category='art', created_by_id=user_ids[0])
+        return finish_game(game, [Standing(user_id) for user_id in user_ids])
+
+    def test_replay_matches_game_by_game(self):
+        """Test that replaying games a round at a time gives the ratings
+        of applying them one by one"""
+        rng = numpy.random.RandomState(5)
+        users = 12
+        seats = numpy.full((300, 6), -1)
+        for row in seats:
+            players = rng.randint(2, 7)
+            row[:players] = rng.choice(users, players, replace=False)
+
+        expected = numpy.full(users, float(ratings.DEFAULT_RATING))
+        games = numpy.zeros(users, dtype=int)
+        for row in seats:
+            players = row[row >= 0]
+            expected[players] += ratings.changes(
+                expected[players][None], games[players][None],
+                numpy.ones((1, len(players)), dtype=bool))[0]
+            games[players] += 1
+
+        self.assertEqual(
+            ratings.game_changes([1500, 1620, 1400], [3, 30, 0]),
+            ratings.changes(numpy.array([[1500., 1620., 1400.]]),
+                            numpy.array([[3, 30, 0]]),
+                            numpy.ones((1, 3), dtype=bool))[0].tolist())
+        replayed, counted, last = ratings.replay(seats, users)
+        numpy.testing.assert_allclose(replayed, expected)
+        numpy.testing.assert_array_equal(counted, games)
+        self.assertEqual(last[seats[-1, 0]], len(seats) - 1)
+
+    def test_numpy_not_loaded_at_startup(self):
+        """Test that setting Django up, which connects the rating
+        receiver, doesn't import numpy"""
+        loaded = subprocess.run(
+            [sys.executable, '-c', 'import django, sys; django.setup(); '
+                                   'print("numpy" in sys.modules)'],
+            cwd=settings.BASE_DIR, stdout=subprocess.PIPE, check=True,
+            universal_newlines=True).stdout
+
+        self.assertEqual(loaded.strip(), 'False')
+
+    def test_results_committed_out_of_order_rated(self):
+        """Test that a result committed after a later one sharing a player
+        is still rated, and a rebuild marks late results to be rated"""
+        first, second, third, _ = [user.id for user in self.users]
+        earlier = Results.objects.create(winner_id=first,
+                                         second_place_id=second)
+        later = Results.objects.create(winner_id=second,
+                                       second_place_id=third)
+
+        self.assertTrue(ratings.record_result(later))
+        self.assertTrue(ratings.record_result(earlier))
+        self.assertFalse(ratings.record_result(earlier))
+        self.assertEqual(Ratings.objects.get(user_id=second).games, 2)
+
+        with mock.patch.object(ratings, 'load', return_value=(
+                numpy.array([later.id]),
+                numpy.array([[second, third, 0, 0, 0, 0]]))):
+            ratings.rebuild()
+        self.assertEqual(Ratings.objects.get(user_id=second).games, 2)
+        self.assertEqual(Results.objects.filter(rated=True).count(), 2)
+
+    def test_finished_games_rated(self):
+        """Test that finishing a game updates its players' ratings, only
+        once, and a rebuild from Results gives the same ratings"""
+        first, second, third, fourth = [user.id for user in self.users]
+        result = self.play(first, second)
+        self.assertEqual(ratings.rating_of(first),
+                         ratings.DEFAULT_RATING + 24)
+        self.assertEqual(ratings.rating_of(second),
+                         ratings.DEFAULT_RATING - 24)
+        self.assertEqual(ratings.rating_of(third), ratings.DEFAULT_RATING)
+        self.assertFalse(ratings.record_result(result))
+        self.assertEqual(Ratings.objects.get(user_id=first).games, 1)
+
+        self.play(second, third, first, fourth)
+        self.play(fourth, first)
+        stored = {rating.user_id: (rating.rating, rating.games,
+                                   rating.last_result_id)
+                  for rating in Ratings.objects.all()}
+        self.assertAlmostEqual(sum(rating for rating, _, _ in
+                                   stored.values()),
+                               4 * ratings.DEFAULT_RATING)
+
+        Ratings.objects.filter(user_id=first).update(rating=0)
+        self.assertEqual(ratings.rebuild(chunk_size=2), 4)
+        for rating in Ratings.objects.all():
+            self.assertAlmostEqual(rating.rating, stored[rating.user_id][0])
+            self.assertEqual((rating.games, rating.last_result_id),
+                             stored[rating.user_id][1:])
@@ -14,8 +14,12 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
+
+from Database.sql_metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('API.urls')),
+    path('metrics/', metrics_view, name='metrics'),
 ]
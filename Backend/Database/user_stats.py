@@ -0,0 +1,264 @@
+"""Per-user statistics kept as running totals.
+
+UserStats and UserCategoryStats are added to in the transaction that
+records what they count: a finished game, through the game_finished
+signal, a practice match, and the answers a recorder flushes. The
+totals are those the live aggregates below would compute from
+UserScores, Placements, Practice and UserAnswers, so `rebuild` can
+recompute them from scratch, a chunk of users at a time on a process
+pool, and `check` can compare a sample of users with the live tables."""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import random
+
+import django
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from Database.bulk import insert, upsert
+from Database.models import Placements, Practice, Questions, \
+    UserAnswers, UserCategoryStats, UserScores, UserStats
+from Database.signals import game_finished
+
+
+CHUNK_SIZE = 5000
+STATS = ('games_played', 'placed_games', 'position_total', 'wins',
+         'practice_played', 'best_practice_score')
+CATEGORY_STATS = ('games_played', 'wins', 'correct', 'incorrect')
+
+
+def _add_stats(rows):
+    """Adds {stat: value} to each user's totals, keeping the best
+    practice score. The upsert bypasses the fields' defaults, so every
+    column is given a value"""
+    if not rows:
+        return
+    upsert(UserStats, ['user_id'] + list(STATS), [
+        (user_id,) + tuple(values.get(column, 0) for column in STATS[:-1]) +
+        (values.get('best_practice_score'),)
+        for user_id, values in rows
+    ], conflict=['user_id'], increment=STATS[:-1],
+        greatest=['best_practice_score'])
+
+
+def _add_category_stats(rows):
+    """Adds {stat: value} to each (user id, category)'s totals"""
+    if not rows:
+        return
+    upsert(UserCategoryStats, ['user_id', 'category'] + list(CATEGORY_STATS),
+           [key + tuple(values.get(column, 0) for column in CATEGORY_STATS)
+            for key, values in rows],
+           conflict=['user_id', 'category'], increment=CATEGORY_STATS)
+
+
+def record_game(game, result, standings):
+    _add_stats([
+        (standing.user_id, {
+            'games_played': 1,
+            'placed_games': 1 if result else 0,
+            'position_total': position if result else 0,
+            'wins': 1 if result and position == 1 else 0,
+        })
+        for position, standing in enumerate(standings, 1)
+    ])
+    if result is not None:
+        _add_category_stats([
+            ((standing.user_id, game.category),
+             {'games_played': 1, 'wins': 1 if position == 1 else 0})
+            for position, standing in enumerate(standings, 1)
+        ])
+
+
+def record_practice(practice):
+    _add_stats([(practice.user_id, {
+        'practice_played': 1,
+        'best_practice_score': practice.score,
+    })])
+
+
+def record_answers(pending):
+    """Adds a recorder's flushed answers, a mapping of (user id,
+    question id) to [correct, incorrect, latest result], to the totals
+    of their questions' categories"""
+    categories = dict(Questions.objects.filter(
+        id__in={question_id for _, question_id in pending},
+    ).values_list('id', 'category'))
+    totals = {}
+    for (user_id, question_id), (correct, incorrect, _) in pending.items():
+        if question_id not in categories:
+            continue
+        counts = totals.setdefault((user_id, categories[question_id]),
+                                   {'correct': 0, 'incorrect': 0})
+        counts['correct'] += correct
+        counts['incorrect'] += incorrect
+
+    _add_category_stats(list(totals.items()))
+
+
+@receiver(game_finished)
+def count_finished_game(sender, game, result, standings, **kwargs):
+    record_game(game, result, standings)
+
+
+@receiver(post_save, sender=Practice)
+def count_practice(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        record_practice(instance)
+
+
+def live_stats(**users):
+    """Returns the totals, computed from the tables they count, of the
+    users matching the `user_id` lookups `users`: {user id: {stat:
+    value}} and {(user id, category): {stat: value}}, leaving out users
+    and categories with nothing to count"""
+    stats, category_stats = {}, {}
+
+    def add(totals, key, values):
+        totals.setdefault(key, {}).update(values)
+
+    for row in UserScores.objects.filter(**users).order_by() \
+            .values('user_id').annotate(games_played=Count('id')):
+        add(stats, row.pop('user_id'), row)
+    for row in Placements.objects.filter(**users).order_by() \
+            .values('user_id').annotate(
+                placed_games=Count('id'), position_total=Sum('position'),
+                wins=Count('id', filter=Q(position=1))):
+        add(stats, row.pop('user_id'), row)
+    for row in Practice.objects.filter(**users).order_by() \
+            .values('user_id').annotate(practice_played=Count('id'),
+                                        best_practice_score=Max('score')):
+        add(stats, row.pop('user_id'), row)
+
+    for row in Placements.objects.filter(
+            result__games__isnull=False, **users).order_by() \
+            .values('user_id', 'result__games__category').annotate(
+                games_played=Count('id'),
+                wins=Count('id', filter=Q(position=1))):
+        add(category_stats, (row.pop('user_id'),
+                             row.pop('result__games__category')), row)
+    for row in UserAnswers.objects.filter(**users).order_by() \
+            .values('user_id', 'question__category').annotate(
+                correct=Sum('count_correct'),
+                incorrect=Sum('count_incorrect')):
+        add(category_stats, (row.pop('user_id'),
+                             row.pop('question__category')), row)
+
+    return stats, category_stats
+
+
+def stored_stats(**users):
+    """Returns the stored totals of the users matching the `user_id`
+    lookups `users`, in the form `live_stats` returns them"""
+    stats = {
+        row.pop('user_id'): row for row in UserStats.objects.filter(
+            **users).values('user_id', *STATS)
+    }
+    category_stats = {
+        (row.pop('user_id'), row.pop('category')): row
+        for row in UserCategoryStats.objects.filter(**users)
+        .values('user_id', 'category', *CATEGORY_STATS)
+    }
+
+    return stats, category_stats
+
+
+def rebuild_users(**users):
+    """Replaces the stored totals of the users matching the `user_id`
+    lookups `users` with the live ones and returns how many users have
+    totals"""
+    with transaction.atomic():
+        stats, category_stats = live_stats(**users)
+        UserStats.objects.filter(**users).delete()
+        UserCategoryStats.objects.filter(**users).delete()
+        insert(UserStats, [
+            UserStats(user_id=user_id, **values)
+            for user_id, values in stats.items()
+        ])
+        insert(UserCategoryStats, [
+            UserCategoryStats(user_id=user_id, category=category, **values)
+            for (user_id, category), values in category_stats.items()
+        ])
+
+    return len(stats)
+
+
+def _id_range():
+    ids = get_user_model().objects.aggregate(first=Min('id'),
+                                             last=Max('id'))
+    return ids['first'], ids['last']
+
+
+def _rebuild_range(first, last):
+    return rebuild_users(user_id__gte=first, user_id__lt=last)
+
+
+def rebuild(chunk_size=CHUNK_SIZE, workers=1, progress=None):
+    """Recomputes every user's totals in chunks of `chunk_size` user ids,
+    on `workers` processes, calling `progress(users)` as chunks finish,
+    and returns how many users have totals. Games finishing meanwhile
+    may be counted twice or not at all for users in the chunk being
+    rebuilt, which `check` would show"""
+    first, last = _id_range()
+    if first is None:
+        return 0
+    bounds = [(start, start + chunk_size)
+              for start in range(first, last + 1, chunk_size)]
+
+    # Spawned rather than forked, so no worker shares this process's
+    # database connection
+    pool = ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup) if workers > 1 else None
+    try:
+        if pool is None:
+            counts = (_rebuild_range(*bound) for bound in bounds)
+        else:
+            counts = pool.map(_rebuild_range, *zip(*bounds))
+        total = 0
+        for count in counts:
+            total += count
+            if progress is not None:
+                progress(count)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return total
+
+
+def check(sample=1000, rng=random):
+    """Compares the stored totals of up to `sample` random users with the
+    live ones and returns a list of (user id, category or None, stored,
+    live) for every difference"""
+    first, last = _id_range()
+    if first is None:
+        return []
+    sampled = rng.sample(range(first, last + 1),
+                         min(sample, last + 1 - first))
+    zeros = dict.fromkeys(STATS, 0)
+    zeros['best_practice_score'] = None
+    category_zeros = dict.fromkeys(CATEGORY_STATS, 0)
+
+    differences = []
+    for start in range(0, len(sampled), CHUNK_SIZE):
+        chunk = sampled[start:start + CHUNK_SIZE]
+        with transaction.atomic():
+            stored, stored_categories = stored_stats(user_id__in=chunk)
+            live, live_categories = live_stats(user_id__in=chunk)
+
+        # A user or category with nothing to count may have no row
+        for user_id in set(stored) | set(live):
+            values = dict(zeros, **stored.get(user_id, {}))
+            expected = dict(zeros, **live.get(user_id, {}))
+            if values != expected:
+                differences.append((user_id, None, values, expected))
+        for key in set(stored_categories) | set(live_categories):
+            values = dict(category_zeros, **stored_categories.get(key, {}))
+            expected = dict(category_zeros, **live_categories.get(key, {}))
+            if values != expected:
+                differences.append(key + (values, expected))
+
+    return differences
@@ -0,0 +1,92 @@
+"""ASGI application for the game WebSockets at /ws/games/<game id>/.
+
+Messages are JSON objects. Clients send
+{"type": "answer", "round": <n>, "answer": <text>} and receive the
+"joined", "start", "question", "round_result" and "finished" messages
+broadcast by the room."""
+from http.cookies import SimpleCookie
+from importlib import import_module
+import json
+import re
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.exceptions import ObjectDoesNotExist
+
+from Database.game_engine import rooms
+
+
+GAME_PATH = re.compile(r'^/ws/games/(?P<game_id>\d+)/$')
+CLOSE_NOT_FOUND = 4404
+CLOSE_UNAUTHORISED = 4401
+
+
+def authenticated_user_id(scope):
+    """Returns the id of the user logged in to the session named by the
+    connection's cookies, or None"""
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookies.load(value.decode('latin-1'))
+
+    morsel = cookies.get(settings.SESSION_COOKIE_NAME)
+    if morsel is None:
+        return None
+
+    engine = import_module(settings.SESSION_ENGINE)
+    user = get_user(SimpleNamespace(
+        session=engine.SessionStore(morsel.value)))
+
+    return user.pk if user.is_authenticated else None
+
+
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    match = GAME_PATH.match(scope['path'])
+    if match is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    user_id = await sync_to_async(authenticated_user_id)(scope)
+    if user_id is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORISED})
+        return
+
+    try:
+        room = await rooms.open(int(match.group('game_id')))
+    except (ObjectDoesNotExist, ValueError):
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    await send({'type': 'websocket.accept'})
+
+    async def send_json(message):
+        await send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    try:
+        await room.join(user_id, send_json)
+    except ValueError:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+
+    try:
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+
+            try:
+                message = json.loads(event.get('text') or '')
+            except ValueError:
+                continue
+            if isinstance(message, dict) and \
+                    message.get('type') == 'answer':
+                room.answer(user_id, message.get('round'),
+                            message.get('answer'))
+    finally:
+        room.leave(user_id)